@@ -1,9 +1,10 @@
 from django.contrib import admin
-from Blog.models import Post, Hashtag, Comment, Report, Group, Image, User, Rating, Follow
+from Blog.models import Post, Hashtag, Comment, Report, Group, Image, User, Rating, Follow, Like, JoinRequest, Task
+from Blog import moderation
+from Blog.paginators import EstimatedCountPaginator
 from django.utils.html import mark_safe
 from django import forms
 from ckeditor_uploader.widgets import CKEditorUploadingWidget
-import cloudinary
 
 
 class PostForm(forms.ModelForm):
@@ -13,24 +14,160 @@ class PostForm(forms.ModelForm):
         fields: '__all__'
 
 
-class PostAdmin(admin.ModelAdmin):
-    list_display = [field.name for field in Post._meta.fields]
+class BaseAdmin(admin.ModelAdmin):
+    # Changelist chạy một số query cố định: không COUNT(*) toàn bảng lần hai, đếm ước lượng với bảng lớn
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class AllObjectsAdmin(BaseAdmin):
+    # Admin cần thấy cả bản ghi đã bị ẩn (active=False)
+    def get_queryset(self, request):
+        queryset = self.model.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+
+class PostAdmin(AllObjectsAdmin):
+    list_display = ['id', 'title', 'user', 'start_time', 'end_time', 'starting_point', 'end_point',
+                    'cost', 'status', 'active', 'created_date']
+    list_filter = ['active', 'status']
+    list_select_related = ['user']
+    search_fields = ['title']
+    autocomplete_fields = ['user', 'hashtags']
+    actions = ['activate_posts', 'deactivate_posts']
     form = PostForm
 
+    @admin.action(description='Activate selected posts')
+    def activate_posts(self, request, queryset):
+        updated = queryset.update(active=True)
+        self.message_user(request, f'{updated} post(s) activated.')
+
+    @admin.action(description='Deactivate selected posts')
+    def deactivate_posts(self, request, queryset):
+        updated = queryset.update(active=False)
+        self.message_user(request, f'{updated} post(s) deactivated.')
+
     def my_image(self, Post):
         if Post.image:
-            if type(Post.image) is cloudinary.CloudinaryResource:
-                return mark_safe(f"<img width='300' src='{Post.image.url}' />")
-            return mark_safe(f"<img width='300' src='/static/{Post.image.name}' />")
+            return mark_safe(f"<img width='300' src='{Post.image.url}' />")
 
 
-admin.site.register(Post, PostAdmin)
-admin.site.register(Comment)
-admin.site.register(Hashtag)
-admin.site.register(Rating)
-admin.site.register(Report)
-admin.site.register(Image)
-admin.site.register(User)
-admin.site.register(Group)
-admin.site.register(Follow)
+class CommentAdmin(AllObjectsAdmin):
+    list_display = ['id', 'user', 'post', 'content', 'confirmed', 'active', 'created_date']
+    list_filter = ['confirmed', 'active']
+    list_select_related = ['user', 'post']
+    raw_id_fields = ['user', 'post', 'parent_comment']
+    actions = ['confirm_comments', 'unconfirm_comments', 'moderate_comments']
+
+    @admin.action(description='Confirm selected comments')
+    def confirm_comments(self, request, queryset):
+        updated = queryset.update(confirmed=True)
+        self.message_user(request, f'{updated} comment(s) confirmed.')
+
+    @admin.action(description='Unconfirm selected comments')
+    def unconfirm_comments(self, request, queryset):
+        updated = queryset.update(confirmed=False)
+        self.message_user(request, f'{updated} comment(s) unconfirmed.')
+
+    @admin.action(description='Run moderation rules on selected comments')
+    def moderate_comments(self, request, queryset):
+        for comment_id in queryset.filter(confirmed=False, active=True).values_list('id', flat=True):
+            moderation.moderate_comment(comment_id)
+        self.message_user(request, 'Moderation finished.')
+
+
+class UserAdmin(BaseAdmin):
+    list_display = ['id', 'username', 'first_name', 'last_name', 'email', 'role', 'report_count', 'is_active']
+    list_filter = ['is_active', 'role']
+    search_fields = ['username', 'first_name', 'last_name', 'email']
+    actions = ['block_users', 'unblock_users']
+
+    @admin.action(description='Block selected users')
+    def block_users(self, request, queryset):
+        updated = queryset.update(is_active=False)
+        self.message_user(request, f'{updated} user(s) blocked.')
+
+    @admin.action(description='Unblock selected users')
+    def unblock_users(self, request, queryset):
+        updated = queryset.update(is_active=True)
+        self.message_user(request, f'{updated} user(s) unblocked.')
+
+
+class HashtagAdmin(AllObjectsAdmin):
+    list_display = ['id', 'hashtag', 'active']
+    search_fields = ['hashtag']
+
+
+class RatingAdmin(BaseAdmin):
+    list_display = ['id', 'rater', 'post', 'stars']
+    list_select_related = ['rater', 'post']
+    raw_id_fields = ['rater', 'post']
 
+
+class ReportAdmin(BaseAdmin):
+    list_display = ['id', 'reporter', 'reported_user', 'content', 'created_date']
+    list_select_related = ['reporter', 'reported_user']
+    raw_id_fields = ['reporter', 'reported_user']
+
+
+class ImageAdmin(BaseAdmin):
+    list_display = ['id', 'post', 'image']
+    list_select_related = ['post']
+    raw_id_fields = ['post']
+
+
+class GroupAdmin(AllObjectsAdmin):
+    list_display = ['post', 'creator', 'capacity', 'seats_taken', 'active']
+    list_select_related = ['post', 'creator']
+    raw_id_fields = ['post', 'creator']
+    autocomplete_fields = ['members']
+
+
+class FollowAdmin(BaseAdmin):
+    list_display = ['id', 'follower', 'following', 'created_date']
+    list_select_related = ['follower', 'following']
+    raw_id_fields = ['follower', 'following']
+
+
+class LikeAdmin(AllObjectsAdmin):
+    list_display = ['id', 'user', 'post', 'active', 'created_date']
+    list_select_related = ['user', 'post']
+    raw_id_fields = ['user', 'post']
+
+
+class JoinRequestAdmin(BaseAdmin):
+    list_display = ['id', 'group', 'user', 'status', 'created_date']
+    list_filter = ['status']
+    list_select_related = ['group__post', 'user']
+    raw_id_fields = ['group', 'user']
+
+
+class TaskAdmin(BaseAdmin):
+    list_display = ['id', 'name', 'status', 'attempts', 'run_at', 'finished_date', 'locked_by']
+    list_filter = ['status', 'name']
+    readonly_fields = ['created_date', 'started_date', 'finished_date', 'last_error']
+    actions = ['retry']
+
+    @admin.action(description='Retry selected tasks')
+    def retry(self, request, queryset):
+        from django.utils import timezone
+
+        queryset.exclude(status=Task.RUNNING).update(status=Task.QUEUED, attempts=0, run_at=timezone.now())
+
+
+admin.site.register(Post, PostAdmin)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Hashtag, HashtagAdmin)
+admin.site.register(Rating, RatingAdmin)
+admin.site.register(Report, ReportAdmin)
+admin.site.register(Image, ImageAdmin)
+admin.site.register(User, UserAdmin)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Follow, FollowAdmin)
+admin.site.register(Like, LikeAdmin)
+admin.site.register(JoinRequest, JoinRequestAdmin)
+admin.site.register(Task, TaskAdmin)
@@ -4,4 +4,10 @@ from django.apps import AppConfig
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Blog'
-    
\ No newline at end of file
+
+    def ready(self):
+        import cloudinary
+        from django.conf import settings
+        from Blog import signals  # noqa: F401
+
+        cloudinary.config(**settings.CLOUDINARY)
@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import serializers as django_serializers
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from Blog.models import (Post, Comment, Image, Rating, Like, PostViewSketch, Group, GroupMessage, JoinRequest,
+                         GroupReadReceipt, ArchivedPost, ArchivedComment, ArchivedImage, ArchivedRating, ArchivedLike,
+                         ArchivedPostViewSketch, ArchivedGroup, ArchivedGroupMessage, ArchivedJoinRequest,
+                         ArchivedGroupReadReceipt)
+
+# Mọi bảng bị xoá theo (cascade) khi xoá post: (model, field trỏ tới post, bảng archive).
+# Group dùng post làm khoá chính nên các bảng của group trỏ tới post qua group
+RELATED = [
+    (Comment, 'post', ArchivedComment),
+    (Image, 'post', ArchivedImage),
+    (Rating, 'post', ArchivedRating),
+    (Like, 'post', ArchivedLike),
+    (PostViewSketch, 'post', ArchivedPostViewSketch),
+    (Group, 'post', ArchivedGroup),
+    (GroupMessage, 'group', ArchivedGroupMessage),
+    (JoinRequest, 'group', ArchivedJoinRequest),
+    (GroupReadReceipt, 'group', ArchivedGroupReadReceipt),
+]
+
+
+def archivable_posts(now=None):
+    # Bài đăng đã bị ẩn hoặc chuyến đi đã kết thúc quá ARCHIVE_AFTER_DAYS ngày
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=getattr(settings, 'ARCHIVE_AFTER_DAYS', 30))
+    return Post.all_objects.filter(Q(active=False) | Q(end_time__lt=cutoff))
+
+
+def _rows(queryset):
+    # Dùng serializer 'python' của Django để các field đặc biệt (file, bytes, m2m) thành giá trị JSON được
+    return [(obj['pk'], obj['fields']) for obj in django_serializers.serialize('python', queryset)]
+
+
+def archive_batch(post_ids):
+    with transaction.atomic():
+        posts = Post.all_objects.filter(id__in=post_ids)
+        ArchivedPost.objects.bulk_create(
+            [ArchivedPost(id=pk, user_id=fields['user'], active=fields['active'], data=fields)
+             for pk, fields in _rows(posts)],
+            ignore_conflicts=True)
+        for model, field, archive_model in RELATED:
+            manager = getattr(model, 'all_objects', model._default_manager)
+            rows = _rows(manager.filter(**{f'{field}_id__in': post_ids}))
+            # Với Group, post là khoá chính nên không nằm trong fields
+            archive_model.objects.bulk_create(
+                [archive_model(id=pk, post_id=fields.get(field, pk), data=fields) for pk, fields in rows],
+                ignore_conflicts=True)
+        # Mọi dòng bị cascade khi xoá post đều đã được chép sang bảng archive ở trên
+        posts.delete()
+    return len(post_ids)
+
+
+def archive_posts(batch_size=500, max_batches=None, now=None):
+    queryset = archivable_posts(now).order_by('id')
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        post_ids = list(queryset.values_list('id', flat=True)[:batch_size])
+        if not post_ids:
+            break
+        archived += archive_batch(post_ids)
+        batches += 1
+    return archived
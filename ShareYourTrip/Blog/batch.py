@@ -0,0 +1,92 @@
+from django.db import connections
+from django.db.models import Avg, Count, F, Prefetch, prefetch_related_objects
+from django.db.models.functions import RowNumber
+from django.db.models.expressions import Window
+
+from Blog.models import Comment, Follow, Hashtag, Like, Post, Rating, Report, User
+
+
+def counts_by(model, field, ids):
+    # {id: số dòng} bằng một query GROUP BY trên một bảng
+    return dict(model.objects.filter(**{f'{field}__in': ids})
+                .values(field).annotate(n=Count('id')).values_list(field, 'n'))
+
+
+def set_follower_counts(users):
+    # Một query GROUP BY cho số follower của mọi user, gán vào followers_count (xem serializers.related_count)
+    users = list(users)
+    counts = counts_by(Follow, 'following_id', {user.id for user in users})
+    for user in users:
+        user.followers_count = counts.get(user.id, 0)
+
+
+def prefetch_replies(comments):
+    # Mỗi tầng reply một query thay vì một query cho mỗi comment khi RecursiveField duyệt cây
+    level = list(comments)
+    replies = Comment.objects.filter(confirmed=True).select_related('user')
+    while level:
+        prefetch_related_objects(level, Prefetch('replies', queryset=replies))
+        level = [reply for comment in level for reply in comment.replies.all()]
+
+
+def first_comment_pages(post_ids, page_size):
+    # Trang đầu comment gốc của từng post (mới nhất trước, như /posts/{id}/comments/) trong một query
+    # Như các view đọc công khai: chỉ comment đã được kiểm duyệt
+    roots = Comment.objects.filter(post_id__in=post_ids, parent_comment__isnull=True, confirmed=True)
+    if connections[roots.db].features.supports_over_clause:
+        comments = list(roots
+                        .annotate(position=Window(RowNumber(), partition_by=F('post_id'), order_by=F('id').desc()))
+                        .filter(position__lte=page_size)
+                        .select_related('user')
+                        .order_by('post_id', '-id'))
+    else:
+        # Window function cần MySQL 8.0+ (hoặc MariaDB 10.2+); bản cũ hơn: mỗi post một query LIMIT
+        comments = [comment for post_id in post_ids
+                    for comment in roots.filter(post_id=post_id).select_related('user').order_by('-id')[:page_size]]
+    counts = dict(roots.values('post_id').annotate(n=Count('id')).values_list('post_id', 'n'))
+    prefetch_replies(comments)
+    pages = {post_id: [] for post_id in post_ids}
+    for comment in comments:
+        pages[comment.post_id].append(comment)
+    return pages, counts
+
+
+def load_posts(post_ids, user, page_size):
+    posts = (Post.objects.filter(id__in=post_ids).select_related('user')
+             .prefetch_related(Prefetch('hashtags', queryset=Hashtag.objects.all()), 'images').in_bulk())
+    # Giữ thứ tự id client gửi lên
+    posts = [posts[post_id] for post_id in post_ids if post_id in posts]
+    ids = [post.id for post in posts]
+    ratings = {row['post_id']: row for row in Rating.objects.filter(post_id__in=ids)
+               .values('post_id').annotate(average=Avg('stars'), count=Count('id'))}
+    comments, comment_counts = first_comment_pages(ids, page_size)
+
+    authors = [post.user for post in posts]
+
+    def walk(nodes):
+        for comment in nodes:
+            yield comment.user
+            yield from walk(comment.replies.all())
+
+    set_follower_counts(authors + [author for page in comments.values() for author in walk(page)])
+    liked = set()
+    if user.is_authenticated:
+        liked = set(Like.objects.filter(user=user, post_id__in=ids).values_list('post_id', flat=True))
+    return posts, {'comments': comments, 'comment_counts': comment_counts, 'ratings': ratings, 'liked': liked}
+
+
+def load_users(user_ids):
+    # Mỗi loại đếm một query GROUP BY riêng. Annotate cả 4 Count trên cùng query sẽ JOIN 4 bảng và tạo
+    # tích chéo followers × following × reports cho mỗi user trước khi DISTINCT
+    users = list(User.objects.filter(id__in=user_ids, is_active=True))
+    ids = [user.id for user in users]
+    counts = {
+        'followers_count': counts_by(Follow, 'following_id', ids),
+        'following_count': counts_by(Follow, 'follower_id', ids),
+        'reported_user_count': counts_by(Report, 'reported_user_id', ids),
+        'reporter_count': counts_by(Report, 'reporter_id', ids),
+    }
+    for user in users:
+        for name, by_user in counts.items():
+            setattr(user, name, by_user.get(user.id, 0))
+    return users
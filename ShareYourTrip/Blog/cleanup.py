@@ -0,0 +1,69 @@
+import time
+from datetime import timedelta
+
+from django.contrib.sessions.models import Session
+from django.db.models import Q
+from django.utils import timezone
+from oauth2_provider.models import get_access_token_model, get_grant_model, get_id_token_model, get_refresh_token_model
+from oauth2_provider.settings import oauth2_settings
+
+
+def expired_querysets(now=None):
+    # Cùng điều kiện với oauth2_provider.models.clear_expired, thêm session hết hạn và refresh token đã bị
+    # thu hồi (logout) quá thời gian grace period
+    now = now or timezone.now()
+    access_token_model = get_access_token_model()
+    refresh_token_model = get_refresh_token_model()
+    querysets = []
+
+    revoked_before = now - timedelta(seconds=oauth2_settings.REFRESH_TOKEN_GRACE_PERIOD_SECONDS or 0)
+    expire_seconds = oauth2_settings.REFRESH_TOKEN_EXPIRE_SECONDS
+    if expire_seconds:
+        if not isinstance(expire_seconds, timedelta):
+            expire_seconds = timedelta(seconds=expire_seconds)
+        refresh_expire_at = now - expire_seconds
+        querysets.append(('expired refresh tokens', refresh_token_model.objects.filter(
+            Q(revoked__lt=min(revoked_before, refresh_expire_at)) |
+            Q(access_token__expires__lt=refresh_expire_at))))
+    else:
+        querysets.append(('revoked refresh tokens', refresh_token_model.objects.filter(revoked__lt=revoked_before)))
+
+    querysets += [
+        ('access tokens', access_token_model.objects.filter(refresh_token__isnull=True, expires__lt=now)),
+        ('id tokens', get_id_token_model().objects.filter(access_token__isnull=True, expires__lt=now)),
+        ('grants', get_grant_model().objects.filter(expires__lt=now)),
+        ('sessions', Session.objects.filter(expire_date__lt=now)),
+    ]
+    return querysets
+
+
+def purge(queryset, batch_size=1000, dry_run=False, max_batches=None, pause=0):
+    # Duyệt theo khoá chính: mỗi batch là một câu SELECT theo range pk và một câu DELETE theo danh sách pk,
+    # không giữ lock lâu và bộ nhớ chỉ tỉ lệ với batch_size. Cột expires của oauth2_provider không có index,
+    # nên quét theo pk tăng dần để tổng chi phí tuyến tính thay vì quét lại cả bảng ở mỗi batch
+    model = queryset.model
+    cursor = None
+    purged = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        page = queryset if cursor is None else queryset.filter(pk__gt=cursor)
+        ids = list(page.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        cursor = ids[-1]
+        if not dry_run:
+            model._default_manager.filter(pk__in=ids).delete()
+        purged += len(ids)
+        batches += 1
+        if pause:
+            time.sleep(pause)
+    return purged
+
+
+def purge_expired(batch_size=1000, dry_run=False, max_batches=None, pause=0, now=None):
+    results = []
+    for label, queryset in expired_querysets(now):
+        start = time.perf_counter()
+        rows = purge(queryset, batch_size=batch_size, dry_run=dry_run, max_batches=max_batches, pause=pause)
+        results.append((label, rows, time.perf_counter() - start))
+    return results
@@ -0,0 +1,99 @@
+import atexit
+import threading
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+
+class CounterBuffer:
+    # Gom các thay đổi (+1/-1) của một cột đếm trong bộ nhớ rồi ghi xuống DB theo lô:
+    # mỗi giá trị delta khác nhau chỉ tốn một câu UPDATE ... SET col = col + delta WHERE id IN (...)
+    # model là label dạng 'Blog.Post' để module này không phải import models
+    def __init__(self, model, field):
+        self.model_label = model
+        self.field = field
+        self.deltas = defaultdict(int)
+        self.lock = threading.Lock()
+        self.timer = None
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    @property
+    def interval(self):
+        # 0: ghi ngay lập tức (dùng cho test)
+        return getattr(settings, 'COUNTER_FLUSH_INTERVAL', 5)
+
+    def add(self, pk, delta=1):
+        interval = self.interval
+        with self.lock:
+            self.deltas[pk] += delta
+            if interval and self.timer is None:
+                self._schedule(interval)
+        if not interval:
+            self.flush()
+
+    def pending(self, pk):
+        with self.lock:
+            return self.deltas.get(pk, 0)
+
+    def _schedule(self, interval):
+        self.timer = threading.Timer(interval, self._flush_in_timer)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _flush_in_timer(self):
+        with self.lock:
+            self.timer = None
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        with self.lock:
+            deltas, self.deltas = self.deltas, defaultdict(int)
+        if not deltas:
+            return 0
+        by_delta = defaultdict(list)
+        for pk, delta in deltas.items():
+            if delta:
+                by_delta[delta].append(pk)
+        model = self.model
+        manager = getattr(model, 'all_objects', model._default_manager)
+        try:
+            with transaction.atomic():
+                for delta, pks in by_delta.items():
+                    manager.filter(pk__in=pks).update(**{self.field: F(self.field) + delta})
+        except Exception:
+            # Không ghi được thì trả các delta về buffer để lần flush sau ghi lại, không làm mất
+            self._restore(deltas)
+            raise
+        return len(deltas)
+
+    def _restore(self, deltas):
+        with self.lock:
+            for pk, delta in deltas.items():
+                self.deltas[pk] += delta
+
+
+_buffers = []
+
+
+def register(buffer):
+    _buffers.append(buffer)
+    return buffer
+
+
+def flush_all():
+    return sum(buffer.flush() for buffer in _buffers)
+
+
+atexit.register(flush_all)
+
+like_counter = register(CounterBuffer('Blog.Post', 'like_count'))
+view_counter = register(CounterBuffer('Blog.Post', 'view_count'))
@@ -0,0 +1,247 @@
+import csv
+import math
+import re
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+
+from django.db.models import F, FloatField, Func, Q
+from django.db.models.functions import ASin, Coalesce, Cos, Power, Radians, Sin, Sqrt
+
+GAZETTEER_PATH = Path(__file__).resolve().parent / 'data' / 'gazetteer.csv'
+EARTH_RADIUS_KM = 6371.0
+GEOHASH_PRECISION = 8
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Độ dài tối đa của một đoạn tuyến khi lọc theo hành lang (xem route_position)
+ROUTE_SEGMENT_KM = 50
+
+
+def normalize(text):
+    # "TP. Hồ Chí Minh" -> "tp ho chi minh"
+    text = unicodedata.normalize('NFD', (text or '').lower().replace('đ', 'd'))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', text).split())
+
+
+@lru_cache(maxsize=None)
+def gazetteer():
+    # Bảng tra offline: alias đã normalize -> (lat, lng), alias dài được thử trước
+    places = {}
+    with open(GAZETTEER_PATH, encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            point = (float(row['lat']), float(row['lng']))
+            for alias in [row['name']] + row['aliases'].split('|'):
+                places.setdefault(normalize(alias), point)
+    return sorted(places.items(), key=lambda item: -len(item[0]))
+
+
+@lru_cache(maxsize=4096)
+def geocode(place):
+    # Tên địa điểm tự do ("Chợ Bến Thành, Sài Gòn") -> (lat, lng) nếu tìm được alias nằm trong chuỗi
+    text = f' {normalize(place)} '
+    if not text.strip():
+        return None
+    for alias, point in gazetteer():
+        if f' {alias} ' in text:
+            return point
+    return None
+
+
+def encode(lat, lng, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    # Kích thước (độ) của một ô geohash: (lat, lng)
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def grid(min_lat, max_lat, min_lng, max_lng, precision):
+    # Các ô geohash độ chính xác precision giao với bounding box
+    lat_deg, lng_deg = cell_size(precision)
+    lat_rows = range(math.floor((min_lat + 90) / lat_deg), math.floor((max_lat + 90) / lat_deg) + 1)
+    lng_cols = range(math.floor((min_lng + 180) / lng_deg), math.floor((max_lng + 180) / lng_deg) + 1)
+    return lat_rows, lng_cols, lat_deg, lng_deg
+
+
+def covering_cells(points, radius_km, max_cells=32):
+    # Tập prefix geohash phủ vòng tròn bán kính radius_km quanh mỗi điểm, dùng độ chính xác cao nhất
+    # mà số ô không vượt quá max_cells để range scan trên index đọc ít dòng thừa nhất
+    boxes = [bbox(lat, lng, radius_km) for lat, lng in points]
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        cells = set()
+        for min_lat, max_lat, min_lng, max_lng in boxes:
+            lat_rows, lng_cols, lat_deg, lng_deg = grid(max(min_lat, -90), min(max_lat, 89.999999),
+                                                        max(min_lng, -180), min(max_lng, 179.999999), precision)
+            if len(lat_rows) * len(lng_cols) > max_cells:
+                break
+            for row in lat_rows:
+                for col in lng_cols:
+                    cells.add(encode((row + 0.5) * lat_deg - 90, (col + 0.5) * lng_deg - 180, precision))
+            if len(cells) > max_cells:
+                break
+        else:
+            return cells
+    return set(BASE32)
+
+
+def next_cell(cell):
+    # Ô geohash kế tiếp cùng độ dài theo thứ tự BASE32, vd: 'w3g' -> 'w3h', 'w3z' -> 'w4'
+    while cell and cell[-1] == BASE32[-1]:
+        cell = cell[:-1]
+    if not cell:
+        return None
+    return cell[:-1] + BASE32[BASE32.index(cell[-1]) + 1]
+
+
+def prefix_filter(field, cells):
+    # Mỗi prefix là một range [cell, ô kế tiếp) thay vì LIKE 'prefix%', để DB nào cũng quét được
+    # bằng index của cột geohash (SQLite không dùng index cho LIKE ... ESCAPE)
+    condition = Q()
+    for cell in cells:
+        upper = next_cell(cell)
+        bounds = {f'{field}__gte': cell}
+        if upper:
+            bounds[f'{field}__lt'] = upper
+        condition |= Q(**bounds)
+    return condition
+
+
+def bbox(lat, lng, radius_km):
+    # Bounding box chính xác của vòng tròn trên mặt cầu: độ rộng kinh độ lớn nhất đạt được ở phía gần cực
+    # hơn tâm, nên dùng asin(sin(d) / cos(lat)) thay vì chia theo cos(lat) của tâm
+    angular = radius_km / EARTH_RADIUS_KM
+    dlat = math.degrees(angular)
+    ratio = math.sin(angular) / max(math.cos(math.radians(lat)), 1e-9)
+    dlng = math.degrees(math.asin(ratio)) if ratio < 1 else 180.0
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def distance_expression(lat_field, lng_field, lat, lng):
+    # Khoảng cách haversine (km) tính trong DB
+    dlat = Radians(F(lat_field) - lat)
+    dlng = Radians(F(lng_field) - lng)
+    a = (Power(Sin(dlat / 2), 2) +
+         Cos(Radians(F(lat_field))) * math.cos(math.radians(lat)) * Power(Sin(dlng / 2), 2))
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(a), output_field=FloatField())
+
+
+def within_radius(queryset, prefix, lat, lng, radius_km):
+    # Lọc 3 bước: prefix geohash (index) -> bounding box -> khoảng cách chính xác
+    min_lat, max_lat, min_lng, max_lng = bbox(lat, lng, radius_km)
+    distance = f'{prefix}_distance'
+    return (queryset
+            .filter(prefix_filter(f'{prefix}_geohash', covering_cells([(lat, lng)], radius_km)))
+            .filter(**{f'{prefix}_lat__range': (min_lat, max_lat), f'{prefix}_lng__range': (min_lng, max_lng)})
+            .annotate(**{distance: distance_expression(f'{prefix}_lat', f'{prefix}_lng', lat, lng)})
+            .filter(**{f'{distance}__lte': radius_km}))
+
+
+def densify(route, step_km):
+    # Thêm điểm trên từng đoạn của tuyến đường để khoảng cách giữa hai điểm liên tiếp không quá step_km
+    points = [route[0]]
+    for (lat1, lng1), (lat2, lng2) in zip(route, route[1:]):
+        steps = max(1, math.ceil(haversine(lat1, lng1, lat2, lng2) / step_km))
+        for i in range(1, steps + 1):
+            points.append((lat1 + (lat2 - lat1) * i / steps, lng1 + (lng2 - lng1) * i / steps))
+    return points
+
+
+class SegmentPosition(Func):
+    # i + t nếu điểm (cột lat, lng) cách đoạn thứ i của tuyến không quá corridor_km, t in [0, 1] là vị trí
+    # hình chiếu của điểm trên đoạn; NULL nếu nằm ngoài hành lang. Đoạn ngắn (ROUTE_SEGMENT_KM) nên khoảng cách
+    # tính trên phép chiếu equirectangular quanh đoạn: chỉ có phép nhân/cộng, DB nào cũng tính native (SQLite
+    # chạy hàm lượng giác bằng hàm Python). SQL được sinh trực tiếp với các hằng số tính sẵn, tuyến vài chục đoạn
+    # không thành cây expression hàng nghìn node phải resolve ở mỗi query
+    output_field = FloatField()
+
+    def __init__(self, lat, lng, index, start, end, corridor_km):
+        super().__init__(lat, lng)
+        self.index, self.start, self.end, self.corridor_km = index, start, end, corridor_km
+
+    def as_sql(self, compiler, connection, **extra_context):
+        lat, lat_params = compiler.compile(self.source_expressions[0])
+        lng, lng_params = compiler.compile(self.source_expressions[1])
+        if lat_params or lng_params:
+            raise ValueError('SegmentPosition expects plain column references.')
+        (lat1, lng1), (lat2, lng2) = self.start, self.end
+        ky = math.radians(EARTH_RADIUS_KM)
+        kx = ky * math.cos(math.radians((lat1 + lat2) / 2))
+        bx, by = (lng2 - lng1) * kx, (lat2 - lat1) * ky
+        length = bx * bx + by * by
+        # Hằng số luôn nằm trong ngoặc để số âm không ghép với dấu trừ thành "--"
+        px = f'(({lng} - ({lng1!r})) * ({kx!r}))'
+        py = f'(({lat} - ({lat1!r})) * ({ky!r}))'
+        u = f'(({px} * ({bx!r}) + {py} * ({by!r})) / ({length!r}))' if length else '(0.0)'
+        t = f'(CASE WHEN {u} <= 0 THEN 0.0 WHEN {u} >= 1 THEN 1.0 ELSE {u} END)'
+        distance = (f'(CASE WHEN {u} <= 0 THEN {px} * {px} + {py} * {py} '
+                    f'WHEN {u} >= 1 THEN ({px} - ({bx!r})) * ({px} - ({bx!r})) + ({py} - ({by!r})) * ({py} - ({by!r})) '
+                    f'ELSE {px} * {px} + {py} * {py} - {u} * {u} * ({length!r}) END)')
+        box1, box2 = bbox(lat1, lng1, self.corridor_km), bbox(lat2, lng2, self.corridor_km)
+        sql = (f'CASE WHEN {lat} BETWEEN ({min(box1[0], box2[0])!r}) AND ({max(box1[1], box2[1])!r}) '
+               f'AND {lng} BETWEEN ({min(box1[2], box2[2])!r}) AND ({max(box1[3], box2[3])!r}) '
+               f'AND {distance} <= ({self.corridor_km ** 2!r}) THEN {t} + {self.index} END')
+        return sql, []
+
+
+def route_position(prefix, points, corridor_km, last=False):
+    # Vị trí của điểm đi/đến trên tuyến: theo đoạn đầu tiên (hoặc cuối cùng) có hành lang chứa điểm
+    positions = [SegmentPosition(f'{prefix}_lat', f'{prefix}_lng', i, start, end, corridor_km)
+                 for i, (start, end) in enumerate(zip(points, points[1:]))]
+    if last:
+        positions.reverse()
+    return Coalesce(*positions) if len(positions) > 1 else positions[0]
+
+
+def along_route(queryset, route, corridor_km):
+    # Chuyến đi có điểm đi và điểm đến cùng nằm trong hành lang quanh tuyến, và đi cùng chiều với tuyến
+    # (vị trí của điểm đi không đứng sau vị trí của điểm đến). Toàn bộ phép so sánh chạy trong DB
+    segment_points = densify(route, ROUTE_SEGMENT_KM)
+    # Phủ hành lang bằng các vòng tròn quanh điểm cách nhau corridor_km: điểm cách tuyến không quá corridor_km
+    # thì cách một trong các điểm đó không quá hypot(corridor_km, corridor_km / 2)
+    cells = covering_cells(densify(route, corridor_km), math.hypot(corridor_km, corridor_km / 2), max_cells=128)
+    return (queryset
+            .filter(prefix_filter('start_geohash', cells), prefix_filter('end_geohash', cells))
+            .alias(route_start=route_position('start', segment_points, corridor_km),
+                   route_end=route_position('end', segment_points, corridor_km, last=True))
+            .filter(route_start__lte=F('route_end')))
+
+
+def parse_point(value):
+    lat, lng = (float(part) for part in value.split(','))
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError(value)
+    return lat, lng
+
+
+def parse_route(value):
+    # "lat,lng;lat,lng;..."
+    points = [parse_point(part) for part in value.split(';') if part.strip()]
+    if len(points) < 2:
+        raise ValueError(value)
+    return points
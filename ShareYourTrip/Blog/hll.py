@@ -0,0 +1,87 @@
+import hashlib
+import math
+import zlib
+
+DEFAULT_PRECISION = 11
+
+
+def hash64(value):
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'big')
+
+
+def position(value, precision=DEFAULT_PRECISION):
+    # (register, rank): precision bit đầu của hash chọn register, rank = số bit 0 đứng đầu phần còn lại + 1
+    h = hash64(value)
+    bits = 64 - precision
+    w = h & ((1 << bits) - 1)
+    return h >> bits, bits - w.bit_length() + 1
+
+
+def standard_error(n, precision=DEFAULT_PRECISION):
+    # Sai số chuẩn tương đối của count() với n phần tử. Khi n nhỏ count() dùng linear counting, sai số
+    # chuẩn là sqrt(m(e^t - t - 1)) / n với t = n / m (Whang và cộng sự, 1990), nhỏ hơn nhiều so với 1.04 / sqrt(m)
+    m = 1 << precision
+    if not n:
+        return 0.0
+    if n <= 2.5 * m:
+        t = n / m
+        return math.sqrt(m * (math.exp(t) - t - 1)) / n
+    return 1.04 / math.sqrt(m)
+
+
+def alpha(m):
+    return {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+
+
+class HyperLogLog:
+    # Ước lượng số phần tử khác nhau với 2^precision register 1 byte, sai số chuẩn ~1.04 / sqrt(2^precision).
+    # Hai sketch gộp được bằng max từng register, nên sketch theo ngày cộng lại thành tuần/tháng
+    def __init__(self, precision=DEFAULT_PRECISION, registers=None):
+        if not 4 <= precision <= 16:
+            raise ValueError(f'precision must be between 4 and 16, got {precision}')
+        self.precision = precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(1 << precision)
+
+    def add(self, value):
+        self.set(*position(value, self.precision))
+
+    def set(self, index, rank):
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.precision > self.precision:
+            other = other.reduce(self.precision)
+        elif other.precision < self.precision:
+            self.registers, self.precision = self.reduce(other.precision).registers, other.precision
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def reduce(self, precision):
+        # Hạ độ chính xác để gộp với sketch cũ hơn: các bit index bị bỏ trở thành bit đầu của phần còn lại
+        shift = self.precision - precision
+        reduced = HyperLogLog(precision)
+        for index, rank in enumerate(self.registers):
+            if not rank:
+                continue
+            low = index & ((1 << shift) - 1)
+            reduced.set(index >> shift, shift - low.bit_length() + 1 if low else shift + rank)
+        return reduced
+
+    def count(self):
+        m = len(self.registers)
+        estimate = alpha(m) * m * m / sum(2.0 ** -rank for rank in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Ít phần tử: dùng linear counting trên số register còn trống
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def to_bytes(self):
+        # 1 byte precision + register đã nén, sketch ít phần tử (đa số register = 0) chỉ còn vài chục byte
+        return bytes([self.precision]) + zlib.compress(bytes(self.registers), 9)
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = bytes(data)
+        return cls(data[0], zlib.decompress(data[1:]))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from Blog import archive
+
+
+class Command(BaseCommand):
+    help = 'Move expired or inactive posts with their comments, images and ratings into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--max-batches', type=int, default=None)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = archive.archivable_posts().count()
+            self.stdout.write(f'{count} post(s) would be archived.')
+            return
+        archived = archive.archive_posts(batch_size=options['batch_size'], max_batches=options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} post(s).'))
@@ -0,0 +1,95 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from Blog import geo
+from Blog.models import Post, User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark radius and along-route trip search against text search on generated trips'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--queries', type=int, default=20)
+        parser.add_argument('--radius', type=float, default=30)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--keep', action='store_true', help='Keep generated trips instead of rolling back')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            self.stdout.write('Generated trips rolled back.')
+
+    def timed(self, label, make_queryset, repeat):
+        timings, rows = [], 0
+        for i in range(repeat):
+            start = time.perf_counter()
+            queryset = make_queryset(i)
+            rows = queryset.count()
+            list(queryset.values_list('id', flat=True)[:20])
+            timings.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(f'  {label:<34} {statistics.median(timings):9.2f} ms  ({rows} rows matched)')
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        places = [(alias, point) for alias, point in geo.gazetteer() if len(alias) > 4]
+        user = User.objects.create(username=f'bench-geo-{time.time_ns()}')
+        now = timezone.now()
+
+        start = time.perf_counter()
+        batch = []
+        for i in range(options['count']):
+            points = []
+            for _ in range(2):
+                name, (lat, lng) = rng.choice(places)
+                lat, lng = lat + rng.uniform(-0.2, 0.2), lng + rng.uniform(-0.2, 0.2)
+                points.append((name, lat, lng))
+            (start_name, start_lat, start_lng), (end_name, end_lat, end_lng) = points
+            batch.append(Post(title=f'Trip {i}', user=user, description='', start_time=now,
+                              end_time=now + timedelta(days=2), starting_point=start_name, end_point=end_name,
+                              start_lat=start_lat, start_lng=start_lng, start_geohash=geo.encode(start_lat, start_lng),
+                              end_lat=end_lat, end_lng=end_lng, end_geohash=geo.encode(end_lat, end_lng)))
+            if len(batch) >= options['batch_size']:
+                Post.all_objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Post.all_objects.bulk_create(batch)
+        self.stdout.write(f'Inserted {options["count"]} trips in {time.perf_counter() - start:.1f}s')
+
+        repeat = options['queries']
+        queryset = Post.objects.all()
+        centres = [rng.choice(places) for _ in range(repeat)]
+        radius = options['radius']
+        self.stdout.write(f'Median of {repeat} queries:')
+        self.timed('text icontains (old ?q=)',
+                   lambda i: queryset.filter(Q(starting_point__icontains=centres[i][0])), repeat)
+        self.timed(f'full scan haversine {radius:g} km',
+                   lambda i: queryset.annotate(d=geo.distance_expression('start_lat', 'start_lng', *centres[i][1]))
+                   .filter(d__lte=radius), repeat)
+        self.timed(f'geohash radius {radius:g} km',
+                   lambda i: geo.within_radius(queryset, 'start', *centres[i][1], radius), repeat)
+        # TP.HCM -> Đà Lạt
+        route = [(10.7769, 106.7009), (11.5480, 107.8077), (11.9404, 108.4583)]
+        self.timed('along route HCM -> Da Lat (10 km)',
+                   lambda i: geo.along_route(queryset, route, 10), max(1, repeat // 5))
+        # Hà Nội -> TP.HCM theo QL1A, ~1450 km: hành lang phủ phần lớn các trip được sinh ra
+        route = [(21.0285, 105.8542), (18.6796, 105.6813), (16.4637, 107.5909), (16.0544, 108.2022),
+                 (13.7820, 109.2190), (12.2388, 109.1967), (10.9289, 108.1021), (10.7769, 106.7009)]
+        self.timed('along route Ha Noi -> HCM (10 km)',
+                   lambda i: geo.along_route(queryset, route, 10), max(1, repeat // 5))
@@ -0,0 +1,69 @@
+import statistics
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from Blog.models import User
+
+PROFILE = {'first_name': 'Trực', 'last_name': 'Nguyễn', 'email': 'truc@example.com', 'address': 'Quận 1, TP.HCM',
+           'gender': 'men', 'date_of_birth': '2003-01-01'}
+
+
+def payload(data, i):
+    # Đổi giá trị mỗi lần để các cột thực sự thay đổi
+    changed = {k: f'{v} {i}' for k, v in data.items() if k in ('first_name', 'last_name', 'address')}
+    return dict(data, email=f'user{i}@example.com', **changed)
+
+
+def legacy_patch(user, data):
+    # Cách cũ của UserViewSet.current_user: mỗi key một lần hash password và một lần save cả row
+    for k, v in data.items():
+        setattr(user, k, v)
+        user.password = make_password(data.get('password'))
+        user.save()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark PATCH /users/current-user/ latency and queries for a 6-field profile edit'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def measure(self, label, edit, repeat):
+        timings, queries = [], 0
+        for i in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                edit(i)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries = len([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')])
+        self.stdout.write(f'  {label:<36} {statistics.median(timings):9.2f} ms  {queries} UPDATE(s)')
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        with transaction.atomic():
+            user = User(username=f'bench-profile-{time.time_ns()}')
+            user.set_password('old-password')
+            user.save()
+            client = APIClient()
+            client.force_authenticate(user)
+
+            def patch(data):
+                def edit(i):
+                    response = client.patch('/users/current-user/', payload(data, i), format='multipart')
+                    assert response.status_code == 200, response.content
+                return edit
+
+            self.stdout.write('Median per edit:')
+            self.measure('legacy loop (6 fields)',
+                         lambda i: legacy_patch(User.objects.get(pk=user.pk), payload(PROFILE, i)), repeat)
+            self.measure('legacy loop (6 fields + password)',
+                         lambda i: legacy_patch(User.objects.get(pk=user.pk),
+                                                payload(dict(PROFILE, password='new-password'), i)), repeat)
+            self.measure('PATCH profile (6 fields)', patch(PROFILE), repeat)
+            self.measure('PATCH profile + password', patch(dict(PROFILE, password='new-password')), repeat)
+            transaction.set_rollback(True)
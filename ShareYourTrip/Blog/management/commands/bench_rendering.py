@@ -0,0 +1,87 @@
+import gzip
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from Blog.renderers import FastJSONRenderer, MessagePackRenderer, orjson, msgpack
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def make_post(i):
+    # Cùng dạng với output của PostSerializer
+    return {
+        'id': i, 'title': f'Trip number {i} to the mountains', 'starting_point': 'Ho Chi Minh City',
+        'end_point': 'Da Lat', 'hashtags': [1, 2, 3],
+        'hashtags_read': [{'id': 1, 'hashtag': 'dalat'}, {'id': 2, 'hashtag': 'camping'}, {'id': 3, 'hashtag': 'summer'}],
+        'user': {'id': i % 17, 'first_name': 'Nguyen', 'last_name': 'Van A',
+                 'avatar': 'https://res.cloudinary.com/demo/image/upload/sample.jpg', 'followers': 42},
+        'start_time': '2024-06-12T14:09:00Z', 'end_time': '2024-06-15T14:09:00Z', 'cost': 1500000.0,
+        'excerpt': 'A three day trip through the highlands with stops at waterfalls and coffee farms. ' * 3,
+        'like_count': i * 3, 'liked': i % 2 == 0,
+    }
+
+
+def make_comment_tree(nodes, fanout=4):
+    # Cây comment nodes phần tử, mỗi comment có tối đa fanout reply
+    counter = iter(range(1, nodes + 1))
+
+    def build(remaining):
+        comment_id = next(counter)
+        comment = {'id': comment_id, 'content': f'Comment {comment_id}: sounds like a great trip!',
+                   'confirmed': True, 'created_date': '2024-06-12T14:09:00Z', 'updated_date': '2024-06-12T14:09:00Z',
+                   'user': {'id': comment_id % 23, 'first_name': 'Tran', 'last_name': 'Thi B', 'avatar': None,
+                            'followers': 7},
+                   'replies': [], 'parent_comment': None}
+        remaining -= 1
+        children = min(fanout, remaining)
+        for c in range(children):
+            share = remaining // (children - c)
+            if share <= 0:
+                break
+            comment['replies'].append(build(share))
+            remaining -= share
+        return comment
+
+    roots = []
+    remaining = nodes
+    while remaining > 0:
+        share = min(remaining, 50)
+        roots.append(build(share))
+        remaining -= share
+    return roots
+
+
+class Command(BaseCommand):
+    help = 'Benchmark encode time and response size for the JSON/MessagePack renderers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        payloads = {
+            '50-post page': {'count': 1000, 'next': None, 'previous': None,
+                             'results': [make_post(i) for i in range(50)]},
+            '500-node comment tree': make_comment_tree(500),
+        }
+        renderers = [('stdlib json', JSONRenderer())]
+        if orjson is not None:
+            renderers.append(('orjson', FastJSONRenderer()))
+        if msgpack is not None:
+            renderers.append(('msgpack', MessagePackRenderer()))
+
+        for name, data in payloads.items():
+            self.stdout.write(name)
+            for renderer_name, renderer in renderers:
+                start = time.perf_counter()
+                for _ in range(options['repeat']):
+                    body = renderer.render(data)
+                elapsed = (time.perf_counter() - start) / options['repeat'] * 1000
+                sizes = f'raw={len(body)}B gzip={len(gzip.compress(body))}B'
+                if brotli is not None:
+                    sizes += f' br={len(brotli.compress(body, quality=5))}B'
+                self.stdout.write(f'  {renderer_name:<12} {elapsed:8.3f} ms/encode  {sizes}')
@@ -0,0 +1,55 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Chạy trong một process Python mới để đo đúng thời gian khởi động nguội
+SCRIPT = '''
+import json, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+ready = time.perf_counter()
+from django.test import Client
+response = Client().get(%(path)r, HTTP_ACCEPT='application/json')
+done = time.perf_counter()
+print(json.dumps({'status': response.status_code, 'startup': (ready - start) * 1000, 'first_request': (done - ready) * 1000}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure cold-start import time and first-request latency against a budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--path', default='/')
+        parser.add_argument('--startup-budget', type=float,
+                            default=getattr(settings, 'STARTUP_BUDGET_MS', 1500))
+        parser.add_argument('--first-request-budget', type=float,
+                            default=getattr(settings, 'FIRST_REQUEST_BUDGET_MS', 300))
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'ShareYourTrip.settings'))
+        startup, first_request = [], []
+        for _ in range(options['runs']):
+            result = subprocess.run([sys.executable, '-c', SCRIPT % {'path': options['path']}],
+                                    cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise CommandError(result.stderr)
+            timings = json.loads(result.stdout.strip().splitlines()[-1])
+            startup.append(timings['startup'])
+            first_request.append(timings['first_request'])
+
+        startup_ms = statistics.median(startup)
+        first_request_ms = statistics.median(first_request)
+        self.stdout.write(f'startup:       {startup_ms:8.1f} ms (budget {options["startup_budget"]} ms)')
+        self.stdout.write(f'first request: {first_request_ms:8.1f} ms (budget {options["first_request_budget"]} ms)')
+        if startup_ms > options['startup_budget'] or first_request_ms > options['first_request_budget']:
+            raise CommandError('Startup budget exceeded.')
+        self.stdout.write(self.style.SUCCESS('Within budget.'))
@@ -0,0 +1,74 @@
+import math
+import statistics
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Blog import hll, viewstats
+
+
+class Command(BaseCommand):
+    help = 'Check HyperLogLog unique-viewer error bounds, merge accuracy and bytes stored per post per day'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trials', type=int, default=20)
+        parser.add_argument('--max-cardinality', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        precision = viewstats.precision()
+        trials = options['trials']
+        sigma = 1.04 / math.sqrt(2 ** precision)
+        self.stdout.write(f'precision {precision}: {2 ** precision} registers, expected standard error {sigma:.2%}')
+        self.stdout.write(f'{"viewers":>9} {"std err":>9} {"mean err":>9} {"max err":>9} {"stored":>9} {"pending":>9}')
+
+        failures = []
+        cardinality = 10
+        while cardinality <= options['max_cardinality']:
+            errors, stored, pending = [], [], []
+            for trial in range(trials):
+                sketch = hll.HyperLogLog(precision)
+                registers = {}
+                for i in range(cardinality):
+                    viewer = f'user:{trial}:{i}'
+                    sketch.add(viewer)
+                    index, rank = hll.position(viewer, precision)
+                    registers = viewstats.add_position(registers, index, rank)
+                errors.append(abs(sketch.count() - cardinality) / cardinality)
+                stored.append(len(sketch.to_bytes()))
+                # Bộ nhớ SketchBuffer giữ cho một (post, ngày) trước khi flush
+                pending.append(sys.getsizeof(registers.registers if isinstance(registers, hll.HyperLogLog)
+                                             else registers))
+            mean_error, max_error = statistics.mean(errors), max(errors)
+            expected = hll.standard_error(cardinality, precision)
+            self.stdout.write(f'{cardinality:>9} {expected:>9.2%} {mean_error:>9.2%} {max_error:>9.2%} '
+                              f'{statistics.mean(stored):>8.0f}B {statistics.mean(pending):>8.0f}B')
+            # Trung bình sai số tuyệt đối ~0.8 sai số chuẩn. Với n nhỏ sai số là số va chạm register (gần phân phối
+            # Poisson, đuôi dày hơn phân phối chuẩn) nên lần đo tệ nhất được phép tới 5 lần sai số chuẩn.
+            # count() làm tròn về số nguyên: một va chạm đã lệch 1/n, nên cộng thêm 1/n
+            rounding = 1 / cardinality
+            if mean_error > 1.5 * expected + rounding or max_error > 5 * expected + rounding:
+                failures.append(cardinality)
+            cardinality *= 10
+
+        # Gộp sketch theo ngày thành tuần phải cho cùng kết quả với một sketch đếm cả tuần
+        week, merged = hll.HyperLogLog(precision), hll.HyperLogLog(precision)
+        for day in range(7):
+            daily = hll.HyperLogLog(precision)
+            for i in range(day * 1000, day * 1000 + 3000):
+                daily.add(f'user:{i}')
+                week.add(f'user:{i}')
+            merged.merge(hll.HyperLogLog.from_bytes(daily.to_bytes()))
+        if merged.registers != week.registers:
+            failures.append('merge')
+        self.stdout.write(f'7 daily sketches merged: {merged.count()} (single weekly sketch {week.count()}, exact 9000)')
+
+        start = time.perf_counter()
+        sketch = hll.HyperLogLog(precision)
+        for i in range(100000):
+            sketch.add(i)
+        self.stdout.write(f'add: {(time.perf_counter() - start) * 10:.2f} µs per view')
+
+        if failures:
+            raise CommandError(f'Error bound exceeded for: {failures}')
+        self.stdout.write(self.style.SUCCESS('Error bounds and merge check passed.'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from ShareYourTrip import schema
+
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI schema artifact served at /swagger.json for the current code version'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Also write the schema to this path')
+
+    def handle(self, *args, **options):
+        content = schema.generate_schema()
+        version = schema.code_version()
+        path = schema.write_artifact(content, version)
+        self.stdout.write(self.style.SUCCESS(f'Wrote schema version {version} to {path}'))
+        if options['output']:
+            with open(options['output'], 'wb') as f:
+                f.write(content)
+            self.stdout.write(f'Wrote schema to {options["output"]}')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from Blog import cleanup
+
+
+class Command(BaseCommand):
+    help = 'Delete expired OAuth tokens, grants and sessions in bounded batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--max-batches', type=int, default=None, help='Per table')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        results = cleanup.purge_expired(batch_size=options['batch_size'], dry_run=options['dry_run'],
+                                        max_batches=options['max_batches'], pause=options['pause'])
+        verb = 'would be deleted' if options['dry_run'] else 'deleted'
+        for label, rows, seconds in results:
+            rate = rows / seconds if seconds else 0
+            self.stdout.write(f'{label:<24} {rows:>10} {verb}  {seconds:8.2f}s  {rate:10.0f} rows/s')
+        total = sum(rows for _, rows, _ in results)
+        self.stdout.write(self.style.SUCCESS(f'{total} row(s) {verb}.'))
@@ -0,0 +1,80 @@
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils.module_loading import import_module
+
+from Blog import tasks
+
+
+def work(batch_size, poll_interval, burst, stop):
+    # Mỗi process con mở connection riêng, không dùng lại connection của process cha
+    connections.close_all()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    processed = 0
+    last_maintenance = 0
+    try:
+        while not stop.is_set():
+            if time.monotonic() - last_maintenance > poll_interval * 10:
+                tasks.requeue_stale()
+                tasks.enqueue_periodic()
+                last_maintenance = time.monotonic()
+            count = tasks.run_once(batch_size)
+            processed += count
+            if count == 0:
+                if burst:
+                    break
+                stop.wait(poll_interval)
+    finally:
+        connections.close_all()
+    return processed
+
+
+def _child(batch_size, poll_interval, burst, stop):
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    work(batch_size, poll_interval, burst, stop)
+
+
+class Command(BaseCommand):
+    help = 'Run background task workers against the database-backed queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=getattr(settings, 'TASK_WORKER_CONCURRENCY', 2))
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--poll-interval', type=float, default=getattr(settings, 'TASK_POLL_INTERVAL', 1))
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        for module in getattr(settings, 'TASK_MODULES', []):
+            import_module(module)
+        concurrency = max(1, options['concurrency'])
+        stop = multiprocessing.Event()
+        worker_args = (options['batch_size'], options['poll_interval'], options['burst'], stop)
+        if concurrency == 1:
+            signal.signal(signal.SIGTERM, lambda *args: stop.set())
+            try:
+                processed = work(*worker_args)
+            except KeyboardInterrupt:
+                stop.set()
+                processed = 0
+            self.stdout.write(f'Processed {processed} tasks.')
+            return
+
+        connections.close_all()
+        processes = [multiprocessing.Process(target=_child, args=worker_args, name=f'task-worker-{i}')
+                     for i in range(concurrency)]
+        for process in processes:
+            process.start()
+        self.stdout.write(f'Started {concurrency} workers: {", ".join(str(p.pid) for p in processes)}')
+        signal.signal(signal.SIGTERM, lambda *args: stop.set())
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            stop.set()
+            for process in processes:
+                process.join()
+        self.stdout.write(self.style.SUCCESS('Workers stopped.'))
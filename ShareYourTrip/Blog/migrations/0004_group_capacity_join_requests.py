@@ -0,0 +1,50 @@
+# Generated by Django 5.0.4 on 2026-10-19 17:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_seats_taken(apps, schema_editor):
+    # Nhóm đã có thành viên trước khi thêm capacity: số chỗ đã chiếm = số thành viên hiện tại
+    Group = apps.get_model('Blog', 'Group')
+    members = (Group.members.through.objects.filter(group_id=OuterRef('pk')).order_by()
+               .values('group_id').annotate(n=Count('pk')).values('n'))
+    Group._base_manager.update(seats_taken=Coalesce(Subquery(members), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Blog', '0003_group_messages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='seats_taken',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_seats_taken, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='JoinRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected')], default='pending', max_length=10)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='join_requests', to='Blog.group')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='join_requests', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['group', 'status'], name='joinrequest_group_status_idx')],
+                'unique_together': {('group', 'user')},
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.4 on 2026-10-19 17:10
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def fill_like_count(apps, schema_editor):
+    # Đếm lại like đang active cho các bài đăng có sẵn, mỗi lô BATCH_SIZE bài một câu UPDATE
+    Post = apps.get_model('Blog', 'Post')
+    Like = apps.get_model('Blog', 'Like')
+    likes = (Like._base_manager.filter(post_id=OuterRef('pk'), active=True).order_by()
+             .values('post_id').annotate(n=Count('pk')).values('n'))
+    post_ids = Post._base_manager.order_by('pk').values_list('pk', flat=True)
+    last_id = 0
+    while True:
+        ids = list(post_ids.filter(pk__gt=last_id)[:BATCH_SIZE])
+        if not ids:
+            break
+        Post._base_manager.filter(pk__in=ids).update(like_count=Coalesce(Subquery(likes), Value(0)))
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Blog', '0005_active_managers_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_like_count, migrations.RunPython.noop),
+    ]
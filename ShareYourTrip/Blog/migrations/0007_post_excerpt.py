@@ -0,0 +1,37 @@
+# Generated by Django 5.0.4 on 2026-10-19 17:11
+
+from html import unescape
+
+from django.db import migrations, models
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+
+def fill_excerpts(apps, schema_editor):
+    Post = apps.get_model('Blog', 'Post')
+    batch = []
+    for post in Post.objects.only('id', 'description').iterator(chunk_size=500):
+        text = ' '.join(unescape(strip_tags(post.description or '')).split())
+        post.excerpt = Truncator(text).chars(280)
+        batch.append(post)
+        if len(batch) >= 500:
+            Post.objects.bulk_update(batch, ['excerpt'])
+            batch = []
+    if batch:
+        Post.objects.bulk_update(batch, ['excerpt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Blog', '0006_post_like_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(blank=True, default='', max_length=300),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
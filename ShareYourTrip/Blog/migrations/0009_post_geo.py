@@ -0,0 +1,73 @@
+# Generated by Django 5.0.4 on 2026-10-19 17:31
+
+from django.db import migrations, models
+
+
+def fill_coordinates(apps, schema_editor):
+    from Blog import geo
+
+    Post = apps.get_model('Blog', 'Post')
+    fields = ['start_lat', 'start_lng', 'start_geohash', 'end_lat', 'end_lng', 'end_geohash']
+    batch = []
+    for post in Post.objects.only('id', 'starting_point', 'end_point').iterator(chunk_size=500):
+        for prefix, place in (('start', post.starting_point), ('end', post.end_point)):
+            point = geo.geocode(place)
+            if point:
+                setattr(post, f'{prefix}_lat', point[0])
+                setattr(post, f'{prefix}_lng', point[1])
+                setattr(post, f'{prefix}_geohash', geo.encode(*point))
+        batch.append(post)
+        if len(batch) >= 500:
+            Post.objects.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        Post.objects.bulk_update(batch, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Blog', '0008_task_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='end_geohash',
+            field=models.CharField(blank=True, default='', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='end_lat',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='end_lng',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='start_geohash',
+            field=models.CharField(blank=True, default='', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='start_lat',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='start_lng',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['start_geohash'], name='post_start_geohash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['end_geohash'], name='post_end_geohash_idx'),
+        ),
+        migrations.RunPython(fill_coordinates, migrations.RunPython.noop),
+    ]
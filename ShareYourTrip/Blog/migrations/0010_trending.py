@@ -0,0 +1,27 @@
+# Generated by Django 5.0.4 on 2026-10-19 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Blog', '0009_post_geo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('bucket', models.IntegerField()),
+                ('score', models.FloatField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'bucket'], name='trending_kind_bucket_idx')],
+                'unique_together': {('kind', 'object_id', 'bucket')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.4 on 2026-10-19 17:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Blog', '0010_trending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='view_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='PostViewSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sketch', models.BinaryField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_sketches', to='Blog.post')),
+            ],
+            options={
+                'unique_together': {('post', 'day')},
+            },
+        ),
+    ]
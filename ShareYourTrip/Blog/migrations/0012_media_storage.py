@@ -0,0 +1,38 @@
+# Generated by Django 5.0.4 on 2026-10-19 17:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Blog', '0011_post_views'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='image',
+            name='image',
+            field=models.FileField(max_length=255, upload_to='posts'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to='avatars'),
+        ),
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('storage', models.CharField(max_length=100)),
+                ('digest', models.CharField(max_length=64)),
+                ('name', models.CharField(max_length=255)),
+                ('size', models.BigIntegerField()),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['storage', 'name'], name='mediablob_storage_name_idx')],
+                'unique_together': {('storage', 'digest')},
+            },
+        ),
+    ]
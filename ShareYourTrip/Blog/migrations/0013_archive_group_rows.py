@@ -0,0 +1,98 @@
+# Generated by Django 5.0.4 on 2026-10-19 18:08
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+def fill_active(apps, schema_editor):
+    # Bài đăng đã archive khi đang bị ẩn: lấy cờ active từ data
+    ArchivedPost = apps.get_model('Blog', 'ArchivedPost')
+    ArchivedPost.objects.filter(data__active=False).update(active=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Blog', '0012_media_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedGroup',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('archived_date', models.DateTimeField(auto_now_add=True)),
+                ('post_id', models.BigIntegerField(db_index=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedGroupMessage',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('archived_date', models.DateTimeField(auto_now_add=True)),
+                ('post_id', models.BigIntegerField(db_index=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedGroupReadReceipt',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('archived_date', models.DateTimeField(auto_now_add=True)),
+                ('post_id', models.BigIntegerField(db_index=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedJoinRequest',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('archived_date', models.DateTimeField(auto_now_add=True)),
+                ('post_id', models.BigIntegerField(db_index=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedLike',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('archived_date', models.DateTimeField(auto_now_add=True)),
+                ('post_id', models.BigIntegerField(db_index=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedPostViewSketch',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('archived_date', models.DateTimeField(auto_now_add=True)),
+                ('post_id', models.BigIntegerField(db_index=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='archivedpost',
+            name='active',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.RunPython(fill_active, migrations.RunPython.noop),
+    ]
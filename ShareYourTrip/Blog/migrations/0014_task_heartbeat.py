@@ -0,0 +1,26 @@
+# Generated by Django 5.0.4 on 2026-10-19 18:12
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_heartbeat(apps, schema_editor):
+    # Task đang chạy lúc migrate: coi lần bắt đầu chạy là heartbeat cuối
+    Task = apps.get_model('Blog', 'Task')
+    Task.objects.filter(status='running').update(heartbeat_date=F('started_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Blog', '0013_archive_group_rows'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='heartbeat_date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_heartbeat, migrations.RunPython.noop),
+    ]
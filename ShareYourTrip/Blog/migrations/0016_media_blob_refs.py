@@ -0,0 +1,44 @@
+# Generated by Django 5.0.4 on 2026-10-19 18:42
+
+from collections import Counter
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def fill_refs(apps, schema_editor):
+    # File đã upload trước khi đếm tham chiếu: mỗi ảnh bài đăng/avatar trỏ tới tên đó là một tham chiếu.
+    # Upload của ckeditor nằm trong HTML nên không đếm được, tối thiểu là 1
+    MediaBlob = apps.get_model('Blog', 'MediaBlob')
+    Image = apps.get_model('Blog', 'Image')
+    User = apps.get_model('Blog', 'User')
+    blobs = MediaBlob.objects.order_by('pk')
+    last_id = 0
+    while True:
+        batch = list(blobs.filter(pk__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        names = [blob.name for blob in batch]
+        counts = Counter(Image.objects.filter(image__in=names).values_list('image', flat=True))
+        counts.update(User.objects.filter(avatar__in=names).values_list('avatar', flat=True))
+        for blob in batch:
+            if counts[blob.name] > 1:
+                MediaBlob.objects.filter(pk=blob.pk).update(refs=counts[blob.name])
+        last_id = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Blog', '0015_default_all_objects_manager'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediablob',
+            name='refs',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.RunPython(fill_refs, migrations.RunPython.noop),
+    ]
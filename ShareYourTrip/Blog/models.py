@@ -1,9 +1,81 @@
-from django.db import models
+import copy
+from django.core.exceptions import ValidationError
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q, Case, When, Value
 from django.contrib.auth.models import AbstractUser
-from cloudinary.models import CloudinaryField
 from ckeditor.fields import RichTextField
+from django.core.serializers.json import DjangoJSONEncoder
+from html import unescape
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
 
-class User(AbstractUser):
+
+class DirtyFieldsMixin(models.Model):
+    # Ghi nhớ giá trị các cột lúc load từ DB để save() chỉ UPDATE những cột đã thay đổi
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._take_snapshot()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        # Chỉ các cột vừa đọc lại mới khớp DB; cột khác đã sửa mà chưa save vẫn là dirty
+        self._take_snapshot(fields)
+
+    @staticmethod
+    def _snapshot_value(field, value):
+        # So sánh theo giá trị sẽ ghi xuống DB (FieldFile -> tên file) chứ không theo object trong __dict__:
+        # FieldFile bị đổi tên tại chỗ vẫn là cùng một object. Giá trị mutable (JSON) được copy
+        value = field.get_prep_value(value)
+        return copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+
+    def _take_snapshot(self, fields=None):
+        # Cột bị defer (.only()/.defer()) không có trong snapshot
+        loaded = getattr(self, '_loaded_values', None)
+        if fields is None or loaded is None:
+            loaded = self._loaded_values = {}
+        for f in self._meta.concrete_fields:
+            if f.attname in self.__dict__ and (fields is None or f.name in fields or f.attname in fields):
+                loaded[f.attname] = self._snapshot_value(f, self.__dict__[f.attname])
+
+    def _is_dirty(self, field, loaded):
+        if field.attname not in loaded:
+            return True
+        try:
+            return loaded[field.attname] != self._snapshot_value(field, self.__dict__[field.attname])
+        except (TypeError, ValueError, ValidationError):
+            # Giá trị không hợp lệ: để save() báo lỗi như bình thường
+            return True
+
+    def get_dirty_fields(self):
+        # {tên field: giá trị lúc load (dạng ghi xuống DB)}; object chưa có trong DB thì mọi field đều dirty
+        loaded = getattr(self, '_loaded_values', None)
+        dirty = {}
+        for field in self._meta.concrete_fields:
+            if loaded is None:
+                dirty[field.name] = None
+            elif field.attname in self.__dict__ and self._is_dirty(field, loaded):
+                dirty[field.name] = loaded.get(field.attname)
+        return dirty
+
+    def save(self, *args, **kwargs):
+        if (not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert')
+                and not self._state.adding and getattr(self, '_loaded_values', None) is not None):
+            dirty = self.get_dirty_fields()
+            if not dirty:
+                return
+            if self._meta.pk.name not in dirty:
+                auto_now = {f.name for f in self._meta.concrete_fields if getattr(f, 'auto_now', False)}
+                kwargs['update_fields'] = set(dirty) | auto_now
+        super().save(*args, **kwargs)
+        self._take_snapshot()
+
+
+class User(AbstractUser, DirtyFieldsMixin):
     GENDER_CHOICES = [
         ('men', 'Men'),
         ('women', 'Women'),
@@ -15,7 +87,7 @@ class User(AbstractUser):
         ('admin', 'Admin')
     ]
     report_count = models.IntegerField(default=0)
-    avatar = CloudinaryField('avatar', null=True, blank=True)
+    avatar = models.FileField(upload_to='avatars', max_length=255, null=True, blank=True)
     phone_number = models.CharField(max_length=10, null=True, unique=True, blank=True)
     date_of_birth = models.DateField(null=True)
     gender = models.CharField(max_length=6, choices=GENDER_CHOICES, null=True, blank=True)
@@ -35,11 +107,21 @@ class User(AbstractUser):
 
 
 
-class BaseModel(models.Model):
+class ActiveManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(active=True)
+
+
+class BaseModel(DirtyFieldsMixin, models.Model):
     created_date = models.DateTimeField(auto_now_add=True)
     updated_date = models.DateTimeField(auto_now=True)
     active = models.BooleanField(default=True)
 
+    # all_objects khai báo trước nên là default manager (validate_unique, UniqueValidator của DRF, quan hệ ngược
+    # thấy cả bản ghi đã ẩn). Chỗ đọc cho người dùng gọi rõ objects: chỉ trả về bản ghi active
+    all_objects = models.Manager()
+    objects = ActiveManager()
+
     class Meta:
         abstract = True
 
@@ -73,13 +155,59 @@ class Post(BaseModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=False)
     hashtags = models.ManyToManyField('Hashtag', blank=True)
     description = RichTextField()
+    # Đoạn trích text thuần của description, dùng cho danh sách bài đăng
+    excerpt = models.CharField(max_length=300, blank=True, default='')
+    # Được cập nhật theo lô từ Blog.counters.like_counter
+    like_count = models.IntegerField(default=0)
+    # Được cập nhật theo lô từ Blog.counters.view_counter
+    view_count = models.IntegerField(default=0)
+    # Toạ độ tra từ starting_point/end_point bằng gazetteer offline (Blog.geo), null nếu không tìm được
+    start_lat = models.FloatField(null=True, blank=True)
+    start_lng = models.FloatField(null=True, blank=True)
+    start_geohash = models.CharField(max_length=12, blank=True, default='')
+    end_lat = models.FloatField(null=True, blank=True)
+    end_lng = models.FloatField(null=True, blank=True)
+    end_geohash = models.CharField(max_length=12, blank=True, default='')
+
+    EXCERPT_LENGTH = 280
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['start_geohash'], name='post_start_geohash_idx'),
+            models.Index(fields=['end_geohash'], name='post_end_geohash_idx'),
+        ]
+
+    @staticmethod
+    def make_excerpt(description):
+        text = ' '.join(unescape(strip_tags(description or '')).split())
+        return Truncator(text).chars(Post.EXCERPT_LENGTH)
+
+    def locate(self):
+        from Blog import geo
+
+        for prefix, place in (('start', self.starting_point), ('end', self.end_point)):
+            point = geo.geocode(place)
+            lat, lng = point if point else (None, None)
+            setattr(self, f'{prefix}_lat', lat)
+            setattr(self, f'{prefix}_lng', lng)
+            setattr(self, f'{prefix}_geohash', geo.encode(lat, lng) if point else '')
+
+    def save(self, *args, **kwargs):
+        # Chỉ tính lại excerpt/toạ độ khi cột nguồn thay đổi, tránh load lại các cột đang bị defer
+        dirty = self.get_dirty_fields()
+        if 'description' in dirty:
+            self.excerpt = self.make_excerpt(self.description)
+        if 'starting_point' in dirty or 'end_point' in dirty:
+            self.locate()
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title
 
 
 class Image(models.Model):
-    image = CloudinaryField()
+    # Lưu qua STORAGES['default'] (Blog/storage.py), giá trị cũ của CloudinaryField vẫn đọc được
+    image = models.FileField(upload_to='posts', max_length=255)
     post = models.ForeignKey(Post, related_name='images', on_delete=models.CASCADE)
 
 
@@ -99,6 +227,10 @@ class Comment(Interaction):
     class Meta:
         ordering = ['-created_date', '-updated_date']
         get_latest_by = ['created_date']
+        indexes = [
+            models.Index(fields=['post', 'active', 'confirmed'], name='comment_post_confirmed_idx'),
+            models.Index(fields=['user', 'created_date'], name='comment_user_created_idx'),
+        ]
 
 
 
@@ -125,6 +257,22 @@ class Like(Interaction):
     class Meta:
         unique_together = ('user', 'post')
 
+    @classmethod
+    def like(cls, user, post):
+        # Trả về 1 nếu trạng thái thay đổi, 0 nếu đã like từ trước (idempotent)
+        if cls.all_objects.filter(user=user, post=post, active=False).update(active=True):
+            return 1
+        try:
+            with transaction.atomic():
+                cls.all_objects.create(user=user, post=post)
+        except IntegrityError:
+            return 0
+        return 1
+
+    @classmethod
+    def unlike(cls, user, post):
+        return cls.objects.filter(user=user, post=post).update(active=False)
+
     def __str__(self):
         return f'Like by {self.user.username} on {self.post.title}'
 
@@ -133,10 +281,97 @@ class Group(BaseModel):
     creator = models.ForeignKey(User, related_name='created_groups', on_delete=models.CASCADE)
     post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True)
     members = models.ManyToManyField(User, related_name='group_members')  # Thay đổi related_name thành 'group_members'
+    capacity = models.PositiveIntegerField(null=True, blank=True)  # null: không giới hạn
+    seats_taken = models.PositiveIntegerField(default=0)
+
+    def take_seat(self):
+        # Cập nhật có điều kiện trong một câu UPDATE, không cần khoá đọc-rồi-ghi
+        taken = Group.objects.filter(
+            Q(capacity__isnull=True) | Q(seats_taken__lt=F('capacity')), pk=self.pk
+        ).update(seats_taken=F('seats_taken') + 1)
+        return taken == 1
+
+    @classmethod
+    def release_seats(cls, group_ids, count=1):
+        # Giảm có điều kiện: không bao giờ xuống dưới 0 (MySQL báo lỗi khi trừ cột UNSIGNED ra số âm)
+        return cls.all_objects.filter(pk__in=group_ids, seats_taken__gt=0).update(
+            seats_taken=Case(When(seats_taken__gte=count, then=F('seats_taken') - count), default=Value(0)))
 
     def __str__(self):
         return f'Group for post: {self.post.title}'
 
+
+class JoinRequest(models.Model):
+    PENDING = 'pending'
+    APPROVED = 'approved'
+    REJECTED = 'rejected'
+    FULL = 'full'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (APPROVED, 'Approved'),
+        (REJECTED, 'Rejected'),
+    ]
+    group = models.ForeignKey(Group, related_name='join_requests', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name='join_requests', on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    created_date = models.DateTimeField(auto_now_add=True, null=False)
+
+    class Meta:
+        unique_together = ('group', 'user')
+        indexes = [
+            models.Index(fields=['group', 'status'], name='joinrequest_group_status_idx'),
+        ]
+
+    def approve(self):
+        # Trả về APPROVED nếu giành được chỗ, FULL nếu nhóm đã đủ người (request vẫn pending),
+        # None nếu request đã được xử lý trước đó
+        with transaction.atomic():
+            claimed = JoinRequest.objects.filter(pk=self.pk, status=self.PENDING).update(status=self.APPROVED)
+            if not claimed:
+                return None
+            if not self.group.take_seat():
+                transaction.set_rollback(True)
+                return self.FULL
+            self.group.members.add(self.user_id)
+        self.status = self.APPROVED
+        return self.APPROVED
+
+    def reject(self):
+        rejected = JoinRequest.objects.filter(pk=self.pk, status=self.PENDING).update(status=self.REJECTED)
+        if not rejected:
+            return None
+        self.status = self.REJECTED
+        return self.REJECTED
+
+    def __str__(self):
+        return f'{self.user_id} wants to join group {self.group_id}: {self.status}'
+
+class GroupMessage(models.Model):
+    # Bảng chỉ ghi thêm (append-only), đọc theo (group, id)
+    group = models.ForeignKey(Group, related_name='messages', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name='group_messages', on_delete=models.CASCADE)
+    content = models.TextField(max_length=2000)
+    created_date = models.DateTimeField(auto_now_add=True, null=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['group', 'id'], name='groupmessage_group_id_idx'),
+        ]
+
+    def __str__(self):
+        return f'Message {self.id} in group {self.group_id}'
+
+
+class GroupReadReceipt(models.Model):
+    # Mỗi thành viên chỉ lưu id tin nhắn cuối cùng đã đọc (high-water mark)
+    group = models.ForeignKey(Group, related_name='read_receipts', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name='group_read_receipts', on_delete=models.CASCADE)
+    last_read_id = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('group', 'user')
+
+
 class Report(models.Model):
     created_date = models.DateTimeField(auto_now_add=True, null=False)
     content = models.TextField(max_length=1000)
@@ -145,3 +380,139 @@ class Report(models.Model):
 
     class Meta:
         unique_together = ('reporter', 'reported_user')
+
+
+class ArchiveModel(models.Model):
+    # Bản ghi đã được chuyển khỏi bảng chính, giữ nguyên id cũ và dữ liệu dạng JSON
+    id = models.BigIntegerField(primary_key=True)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    archived_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        abstract = True
+
+
+class ArchivedPost(ArchiveModel):
+    user_id = models.BigIntegerField(db_index=True)
+    # Bài đăng bị ẩn (admin/moderator) vẫn bị ẩn sau khi archive
+    active = models.BooleanField(default=True)
+
+    def to_representation(self, fields):
+        # Chỉ trả các field có trong fields (tập field của PostDetailSerializer)
+        return {'id': self.id, **{k: v for k, v in self.data.items() if k in fields}, 'archived': True}
+
+
+class ArchivedComment(ArchiveModel):
+    post_id = models.BigIntegerField(db_index=True)
+
+
+class ArchivedImage(ArchiveModel):
+    post_id = models.BigIntegerField(db_index=True)
+
+
+class ArchivedRating(ArchiveModel):
+    post_id = models.BigIntegerField(db_index=True)
+
+
+class ArchivedLike(ArchiveModel):
+    post_id = models.BigIntegerField(db_index=True)
+
+
+class ArchivedPostViewSketch(ArchiveModel):
+    post_id = models.BigIntegerField(db_index=True)
+
+
+class ArchivedGroup(ArchiveModel):
+    # id là id của post (Group dùng post làm khoá chính), data giữ cả danh sách members
+    post_id = models.BigIntegerField(db_index=True)
+
+
+class ArchivedGroupMessage(ArchiveModel):
+    post_id = models.BigIntegerField(db_index=True)
+
+
+class ArchivedJoinRequest(ArchiveModel):
+    post_id = models.BigIntegerField(db_index=True)
+
+
+class ArchivedGroupReadReceipt(ArchiveModel):
+    post_id = models.BigIntegerField(db_index=True)
+
+
+class Task(models.Model):
+    # Hàng đợi công việc nền lưu trong DB, xem Blog/tasks.py
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    name = models.CharField(max_length=255)
+    args = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    kwargs = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True, unique=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_at = models.DateTimeField()
+    created_date = models.DateTimeField(auto_now_add=True)
+    started_date = models.DateTimeField(null=True, blank=True)
+    finished_date = models.DateTimeField(null=True, blank=True)
+    heartbeat_date = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='task_status_run_at_idx'),
+            models.Index(fields=['status', 'finished_date'], name='task_status_finished_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
+
+
+class TrendingBucket(models.Model):
+    # Điểm trending đã cộng dồn của một post/hashtag trong một khung giờ (bucket = số giờ kể từ epoch),
+    # xem Blog/trending.py
+    kind = models.CharField(max_length=10)
+    object_id = models.BigIntegerField()
+    bucket = models.IntegerField()
+    score = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ('kind', 'object_id', 'bucket')
+        indexes = [
+            models.Index(fields=['kind', 'bucket'], name='trending_kind_bucket_idx'),
+        ]
+
+
+class PostViewSketch(models.Model):
+    # HyperLogLog người xem khác nhau của một post trong một ngày, lưu dạng bytes (xem Blog/hll.py, Blog/viewstats.py)
+    post = models.ForeignKey(Post, related_name='view_sketches', on_delete=models.CASCADE)
+    day = models.DateField()
+    sketch = models.BinaryField()
+
+    class Meta:
+        unique_together = ('post', 'day')
+
+
+class MediaBlob(models.Model):
+    # Mỗi nội dung file (sha256) chỉ được lưu một lần trên mỗi storage, xem Blog/storage.py
+    storage = models.CharField(max_length=100)
+    digest = models.CharField(max_length=64)
+    name = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    # Số lần save() trả về tên này mà chưa được delete(), file chỉ bị xoá khi về 0
+    refs = models.PositiveIntegerField(default=1)
+    created_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('storage', 'digest')
+        indexes = [
+            models.Index(fields=['storage', 'name'], name='mediablob_storage_name_idx'),
+        ]
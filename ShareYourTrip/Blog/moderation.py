@@ -0,0 +1,153 @@
+import re
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+from Blog.models import Comment
+
+# Kết quả của một rule: duyệt, chờ admin xem lại, hoặc từ chối (ẩn comment)
+APPROVE = 'approve'
+REVIEW = 'review'
+REJECT = 'reject'
+
+DEFAULTS = {
+    'RULES': [
+        'Blog.moderation.BlocklistRule',
+        'Blog.moderation.RateLimitRule',
+    ],
+    'BLOCKLIST_WORDS': [],
+    'BLOCKLIST_PATTERNS': [],
+    # Tối đa RATE_LIMIT[0] comment trong RATE_LIMIT[1] giây cho mỗi user
+    'RATE_LIMIT': (5, 60),
+    'WORKERS': 2,
+    'ASYNC': True,
+    'QUEUE': 'thread',
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'COMMENT_MODERATION', {}))
+    return config
+
+
+class Rule:
+    def __init__(self, config):
+        self.config = config
+
+    def check(self, comment):
+        return APPROVE
+
+
+def normalize(text):
+    # Dấu tiếng Việt có thể được gõ dạng tổ hợp (u + dấu hỏi rời) hoặc dựng sẵn (ủ): đưa về NFC để "ngủ" gõ
+    # kiểu nào cũng là một từ, \b không tách giữa chữ và dấu rời
+    return unicodedata.normalize('NFC', text)
+
+
+class BlocklistRule(Rule):
+    # Gộp toàn bộ từ khoá và regex thành một pattern duy nhất để chỉ quét nội dung một lần
+    def __init__(self, config):
+        super().__init__(config)
+        parts = [r'\b%s\b' % re.escape(normalize(word)) for word in config['BLOCKLIST_WORDS']]
+        parts += ['(?:%s)' % normalize(pattern) for pattern in config['BLOCKLIST_PATTERNS']]
+        self.matcher = re.compile('|'.join(parts), re.IGNORECASE) if parts else None
+
+    def check(self, comment):
+        if self.matcher is not None and self.matcher.search(normalize(comment.content or '')):
+            return REJECT
+        return APPROVE
+
+
+class RateLimitRule(Rule):
+    def __init__(self, config):
+        super().__init__(config)
+        self.limit, self.window = config['RATE_LIMIT']
+
+    def check(self, comment):
+        since = comment.created_date - timedelta(seconds=self.window)
+        # Đếm cả comment đã bị từ chối (active=False)
+        recent = Comment.all_objects.filter(user_id=comment.user_id,
+                                             created_date__gte=since,
+                                             created_date__lte=comment.created_date).count()
+        if recent > self.limit:
+            return REVIEW
+        return APPROVE
+
+
+_rules = None
+_executor = None
+_lock = threading.Lock()
+
+
+def get_rules():
+    global _rules
+    if _rules is None:
+        config = get_config()
+        _rules = [import_string(path)(config) for path in config['RULES']]
+    return _rules
+
+
+def reset():
+    # Dùng khi settings thay đổi (vd: trong test) để build lại các rule
+    global _rules
+    _rules = None
+
+
+def moderate(comment):
+    decision = APPROVE
+    for rule in get_rules():
+        result = rule.check(comment)
+        if result == REJECT:
+            return REJECT
+        if result == REVIEW:
+            decision = REVIEW
+    return decision
+
+
+def moderate_comment(comment_id):
+    comment = Comment.objects.filter(pk=comment_id, confirmed=False).first()
+    if comment is None:
+        return None
+    decision = moderate(comment)
+    if decision == APPROVE:
+        Comment.objects.filter(pk=comment_id).update(confirmed=True)
+    elif decision == REJECT:
+        Comment.objects.filter(pk=comment_id).update(active=False)
+    return decision
+
+
+def _run_in_worker(comment_id):
+    try:
+        moderate_comment(comment_id)
+    finally:
+        # Mỗi thread giữ connection riêng, đóng lại để không rò rỉ connection
+        connection.close()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=get_config()['WORKERS'],
+                                           thread_name_prefix='moderation')
+        return _executor
+
+
+def submit(comment):
+    if not get_config()['ASYNC']:
+        moderate_comment(comment.id)
+        return
+    comment_id = comment.id
+    if get_config()['QUEUE'] == 'tasks':
+        from Blog import tasks
+
+        tasks.moderate_comment.delay(comment_id)
+        return
+    # Chỉ đưa vào hàng đợi sau khi transaction commit để worker đọc được comment
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_worker, comment_id))
@@ -1,4 +1,9 @@
 from rest_framework import pagination
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
 
 class PostPaginator(pagination.PageNumberPagination):
     page_size = 5
@@ -7,4 +12,37 @@ class CommentPaginator(pagination.PageNumberPagination):
     page_size = 5
 
 class ItemPaginator(pagination.PageNumberPagination):
-    page_size = 2
\ No newline at end of file
+    page_size = 2
+
+
+class MessagePaginator(pagination.CursorPagination):
+    # Keyset pagination theo id, dùng index (group, id)
+    page_size = 20
+    ordering = '-id'
+
+
+class EstimatedCountPaginator(Paginator):
+    # Dùng cho admin: bảng lớn không lọc thì lấy số dòng ước lượng từ thống kê của DB thay vì COUNT(*)
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimate = estimate_table_rows(queryset)
+            if estimate is not None and estimate >= getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 100000):
+                return estimate
+        return super().count
+
+
+def estimate_table_rows(queryset):
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute('SELECT TABLE_ROWS FROM information_schema.TABLES '
+                           'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s', [table])
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
@@ -1,4 +1,6 @@
 from rest_framework import permissions
+from django.conf import settings
+from django.core.cache import cache
 
 from rest_framework.permissions import BasePermission
 
@@ -26,4 +28,28 @@ class CommentOwner(permissions.IsAuthenticated):
     
 class PostOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, post):
-        return object.post.user == request.user
\ No newline at end of file
+        return object.post.user == request.user
+
+
+def group_member_cache_key(group_id, user_id):
+    return f'group_member:{group_id}:{user_id}'
+
+
+def is_group_member(group, user):
+    # Kết quả kiểm tra thành viên được cache, bị xoá khi members thay đổi (xem signals.py)
+    key = group_member_cache_key(group.pk, user.pk)
+    result = cache.get(key)
+    if result is None:
+        result = group.creator_id == user.pk or group.members.filter(pk=user.pk).exists()
+        cache.set(key, result, getattr(settings, 'GROUP_MEMBER_CACHE_TIMEOUT', 300))
+    return result
+
+
+class GroupMember(permissions.IsAuthenticated):
+    def has_object_permission(self, request, view, group):
+        return super().has_permission(request, view) and is_group_member(group, request.user)
+
+
+class GroupOwner(permissions.IsAuthenticated):
+    def has_object_permission(self, request, view, group):
+        return super().has_permission(request, view) and request.user.pk == group.creator_id
@@ -0,0 +1,48 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+_encoder = JSONEncoder()
+
+
+def default(obj):
+    # Các kiểu orjson/msgpack không tự xử lý (lazy string, Decimal, ...) dùng lại encoder của DRF
+    return _encoder.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    # Dùng orjson nếu được cài, nếu không thì quay về JSONRenderer mặc định của DRF
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        option = orjson.OPT_NON_STR_KEYS
+        if self.get_indent(accepted_media_type, renderer_context):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=default, option=option)
+
+
+class MessagePackRenderer(BaseRenderer):
+    # Client mobile gửi Accept: application/msgpack hoặc ?format=msgpack
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if msgpack is None:
+            raise RuntimeError('msgpack is not installed.')
+        return msgpack.packb(data, default=default, use_bin_type=True)
@@ -0,0 +1,84 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+
+REPLICA = 'replica'
+# Token đánh dấu "vừa ghi" được ký và gửi về client (cookie và header), không lưu trong cache của process:
+# request đọc tiếp theo rơi vào process nào cũng nhận ra được
+STICKY_COOKIE = 'replica_sticky'
+STICKY_HEADER = 'X-Replica-Sticky'
+STICKY_SALT = 'Blog.routers.sticky'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA in connections.settings
+
+
+def sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+
+
+def mark_sticky(request, response):
+    # Sau khi user ghi dữ liệu, các lần đọc của user đó đi thẳng vào primary trong một khoảng thời gian
+    # để luôn thấy được dữ liệu mình vừa ghi (read-your-writes) dù replica còn trễ.
+    # Client không giữ cookie (app mobile) gửi lại giá trị header X-Replica-Sticky
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return
+    token = signing.TimestampSigner(salt=STICKY_SALT).sign(str(user.pk))
+    response.set_cookie(STICKY_COOKIE, token, max_age=sticky_seconds(), httponly=True, samesite='Lax',
+                        secure=request.is_secure())
+    response[STICKY_HEADER] = token
+
+
+def is_sticky(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return False
+    token = request.COOKIES.get(STICKY_COOKIE) or request.headers.get(STICKY_HEADER)
+    if not token:
+        return False
+    try:
+        user_id = signing.TimestampSigner(salt=STICKY_SALT).unsign(token, max_age=sticky_seconds())
+    except signing.BadSignature:
+        return False
+    return user_id == str(user.pk)
+
+
+def set_use_replica(value):
+    return _use_replica.set(value)
+
+
+def reset_use_replica(token):
+    _use_replica.reset(token)
+
+
+@contextmanager
+def use_replica(value=True):
+    token = set_use_replica(value)
+    try:
+        yield
+    finally:
+        reset_use_replica(token)
+
+
+class ReadReplicaRouter:
+    # Chỉ đọc từ replica khi view đã bật use_replica (list/retrieve) và replica được cấu hình
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and replica_configured():
+            return REPLICA
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
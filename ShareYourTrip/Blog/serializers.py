@@ -1,12 +1,66 @@
 from rest_framework import serializers
-from Blog.models import Post, Rating, Report, Comment, Hashtag, User, Image, Group, Follow
+from Blog.models import Post, Rating, Report, Comment, Hashtag, User, Image, Group, Follow, GroupMessage, JoinRequest, Like
+from django.db import models
 from django.db.models import Avg
 
 
+class SparseFieldsMixin:
+    # ?fields=id,title chỉ trả về các field được chọn, ?expand=ratings bật các field nặng trong expandable_fields
+    expandable_fields = []
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', None) or set()
+        super().__init__(*args, **kwargs)
+        for name in self.expandable_fields:
+            if name not in expand:
+                self.fields.pop(name, None)
+        if fields:
+            allowed = set(fields) | set(expand) | {'id'}
+            for name in list(self.fields):
+                if name not in allowed and not self.fields[name].write_only:
+                    self.fields.pop(name)
+
+    def model_columns(self):
+        # Các cột cần load cho .only(), tính từ source của các field sẽ được trả về
+        opts = self.Meta.model._meta
+        concrete = {f.name for f in opts.concrete_fields}
+        columns = {opts.pk.name}
+        for field in self.fields.values():
+            if field.write_only:
+                continue
+            root = field.source.split('.')[0]
+            if root in concrete:
+                columns.add(root)
+        return columns
+
+
+def related_count(obj, name):
+    # Dùng số đếm đã gán sẵn (vd: <name>_count từ /posts/batch/) nếu có, tránh một query COUNT cho mỗi object
+    count = getattr(obj, f'{name}_count', None)
+    return count if count is not None else getattr(obj, name).count()
+
+
+class ActiveListSerializer(serializers.ListSerializer):
+    # Quan hệ ngược/m2m dùng default manager (gồm cả bản ghi đã ẩn): bỏ các bản ghi active=False khi trả về.
+    # Lọc trên kết quả đã load nên vẫn dùng được dữ liệu prefetch, không thêm query
+    def to_representation(self, data):
+        items = data.all() if isinstance(data, models.manager.BaseManager) else data
+        return super().to_representation([item for item in items if getattr(item, 'active', True)])
+
+
+class ConfirmedListSerializer(ActiveListSerializer):
+    # Reply lồng trong comment: chỉ trả về reply đã được kiểm duyệt
+    def to_representation(self, data):
+        items = data.all() if isinstance(data, models.manager.BaseManager) else data
+        return super().to_representation([item for item in items if item.confirmed])
+
+
 class HashtagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Hashtag
         fields = ['id', 'hashtag']
+        list_serializer_class = ActiveListSerializer
 
 class ImageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -33,27 +87,55 @@ class PostUserSerializer(serializers.ModelSerializer):
 
         return rep
     def get_followers(self, obj):
-        return obj.followers.count()
+        return related_count(obj, 'followers')
 
 class RatingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Rating
         fields = ['id', 'rater', 'post', 'stars']
 
-class PostSerializer(serializers.ModelSerializer):
+class LikedMixin(serializers.Serializer):
+    liked = serializers.SerializerMethodField()
+
+    def get_liked(self, obj):
+        # View list truyền sẵn tập id đã like của cả trang để không phải query từng post
+        liked_post_ids = self.context.get('liked_post_ids')
+        if liked_post_ids is not None:
+            return obj.id in liked_post_ids
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            return False
+        return Like.objects.filter(user=request.user, post=obj).exists()
+
+class PostSerializer(SparseFieldsMixin, LikedMixin, serializers.ModelSerializer):
     hashtags = serializers.PrimaryKeyRelatedField(many=True, queryset=Hashtag.objects.all())
     hashtags_read = HashtagSerializer(many=True, read_only=True, source='hashtags')
     user = PostUserSerializer(read_only=True)
     ratings = RatingSerializer(many=True, read_only=True)
+    distance = serializers.SerializerMethodField()
+    expandable_fields = ['ratings']
     class Meta:
         model = Post
+        # description (HTML đầy đủ) chỉ dùng khi tạo bài, danh sách trả về excerpt
         fields = ['id', 'title', 'starting_point', 'end_point', 'hashtags',
                   'hashtags_read', 'user', 'start_time', 'end_time', 'cost',
-                  'description', 'ratings']
+                  'description', 'excerpt', 'ratings', 'like_count', 'liked',
+                  'start_lat', 'start_lng', 'end_lat', 'end_lng', 'distance']
+        read_only_fields = ['like_count', 'excerpt', 'start_lat', 'start_lng', 'end_lat', 'end_lng']
+        extra_kwargs = {
+            'description': {'write_only': True}
+        }
+
+    def get_distance(self, obj):
+        # Chỉ có khi lọc theo ?near= hoặc ?near_end= (km)
+        distance = getattr(obj, 'start_distance', None)
+        if distance is None:
+            distance = getattr(obj, 'end_distance', None)
+        return round(distance, 2) if distance is not None else None
 
     def to_representation(self, instance):
         rep = super().to_representation(instance)
-        if instance.user.avatar:
+        if 'user' in rep and instance.user.avatar:
             rep['user']['avatar'] = instance.user.avatar.url
 
         return rep
@@ -64,13 +146,16 @@ class PostSerializer(serializers.ModelSerializer):
         post.hashtags.set(hashtags_data)
         return post
 
-class PostDetailSerializer(serializers.ModelSerializer):
+class PostDetailSerializer(SparseFieldsMixin, LikedMixin, serializers.ModelSerializer):
     hashtags = serializers.PrimaryKeyRelatedField(many=True, queryset=Hashtag.objects.all())
     hashtags_read = HashtagSerializer(many=True, read_only=True, source='hashtags')
     user = PostUserSerializer(read_only=True)
     class Meta:
         model = Post
-        fields = '__all__'
+        # view_count chỉ chủ bài đăng xem được qua /posts/{id}/stats/
+        exclude = ['view_count']
+        read_only_fields = ['like_count', 'excerpt', 'start_lat', 'start_lng', 'start_geohash',
+                            'end_lat', 'end_lng', 'end_geohash']
 
     def create(self, validated_data):
         hashtags_data = validated_data.pop('hashtags')
@@ -80,12 +165,12 @@ class PostDetailSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         rep = super().to_representation(instance)
-        if instance.user.avatar:
+        if 'user' in rep and instance.user.avatar:
             rep['user']['avatar'] = instance.user.avatar.url
 
         return rep
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     reported_user = serializers.SerializerMethodField()
     reporter = serializers.SerializerMethodField()
@@ -100,10 +185,22 @@ class UserSerializer(serializers.ModelSerializer):
         user.save()
         return user
 
+    def update(self, instance, validated_data):
+        # Một lần save cho cả profile, password chỉ hash khi client gửi password mới
+        password = validated_data.pop('password', None)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        if password:
+            instance.set_password(password)
+        instance.save()
+        return instance
+
     class Meta:
         model = User
         fields = ['id', 'username', 'password', 'first_name', 'last_name', 'email', 'phone_number', 'gender', 'avatar',
                   'address', 'date_of_birth', 'reported_user', 'reporter', 'following', 'followers', 'role']
+        # role chỉ đổi được trong admin, user không tự cấp quyền qua đăng ký hay /users/current-user/
+        read_only_fields = ['role']
         extra_kwargs = {
             'password': {
                 'write_only': True
@@ -111,27 +208,55 @@ class UserSerializer(serializers.ModelSerializer):
         }
 
     def get_reported_user(self, obj):
-        return obj.reported_user.count()
+        return related_count(obj, 'reported_user')
 
     def get_reporter(self, obj):
-        return obj.reporter.count()
+        return related_count(obj, 'reporter')
 
     def get_following(self, obj):
-        return obj.following.count()
+        return related_count(obj, 'following')
 
     def get_followers(self, obj):
-        return obj.followers.count()
+        return related_count(obj, 'followers')
 
     def to_representation(self, instance):
         rep = super().to_representation(instance)
-        if instance.avatar:
+        if 'avatar' in rep and instance.avatar:
             rep['avatar'] = instance.avatar.url
         return rep
 
 class GroupSerializer(serializers.ModelSerializer):
+    post = serializers.PrimaryKeyRelatedField(queryset=Post.objects.all())
+
     class Meta:
         model = Group
         fields = '__all__'
+        # Thành viên chỉ được thêm qua luồng join request, creator là user tạo nhóm
+        read_only_fields = ['creator', 'members', 'seats_taken']
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # Nhóm gắn cố định với bài đăng, không đổi được khi cập nhật
+        if self.instance is not None:
+            fields['post'].read_only = True
+        return fields
+
+    def validate_post(self, post):
+        if post.user_id != self.context['request'].user.pk:
+            raise serializers.ValidationError("You can only create a group for your own post.")
+        return post
+
+class JoinRequestSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = JoinRequest
+        fields = ['id', 'group', 'user', 'status', 'created_date']
+        read_only_fields = fields
+
+class GroupMessageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GroupMessage
+        fields = ['id', 'group', 'user', 'content', 'created_date']
+        read_only_fields = ['id', 'group', 'user', 'created_date']
 
 class ReportSerializer(serializers.ModelSerializer):
     reported_user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
@@ -156,7 +281,7 @@ class FollowSerializer(serializers.ModelSerializer):
         fields = ['id', 'follower_id', 'following_id', 'created_date']
 
 
-class ImageSerializer(serializers.ModelSerializer):
+class ImageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Image
         fields = ['id', 'image', 'post']
@@ -164,7 +289,7 @@ class ImageSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         rep = super().to_representation(instance)
-        if instance.image:
+        if 'image' in rep and instance.image:
             rep['image'] = instance.image.url
 
         return rep
@@ -176,12 +301,15 @@ class ImageSerializer(serializers.ModelSerializer):
 # context: là 1 dict chứa các thông tin cần thiết trong qtrinh serialization: request, view, parameter,... -> đảm bảo dữ liệu cần thiết được truyền đúng cách từ serializer cha xuống con
 
 class RecursiveField(serializers.Serializer):
+    class Meta:
+        list_serializer_class = ConfirmedListSerializer
+
     def to_representation(self, value):
         serializer = self.parent.parent.__class__(value, context=self.context)
         return serializer.data
     
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     replies = RecursiveField(many=True)
     user = PostUserSerializer(read_only=True)
     parent_comment = serializers.PrimaryKeyRelatedField(queryset=Comment.objects.all(), allow_null=True, required=False)
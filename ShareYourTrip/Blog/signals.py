@@ -1,10 +1,67 @@
 # myapp/signals.py
-from django.db.models.signals import pre_save
+from django.conf import settings
+from django.db.models.signals import pre_save, pre_delete, m2m_changed
 from django.dispatch import receiver
-from django.contrib.auth.models import User
-from django.contrib.auth.hashers import make_password
+from django.contrib.auth.hashers import identify_hasher, UNUSABLE_PASSWORD_PREFIX
+from django.core.cache import cache
+from Blog.models import Group
+from Blog.perms import group_member_cache_key
 
-@receiver(pre_save, sender=User)
+
+def is_hashed(password):
+    if not password or password.startswith(UNUSABLE_PASSWORD_PREFIX):
+        return True
+    try:
+        identify_hasher(password)
+    except ValueError:
+        return False
+    return True
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
 def hash_user_password(sender, instance, **kwargs):
-    if instance.pk is None or 'password' in instance.get_dirty_fields():
-        instance.password = make_password(instance.password)
+    # Chỉ hash khi password thay đổi và còn là mật khẩu thô (set_password() đã hash sẵn thì bỏ qua)
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and 'password' not in update_fields:
+        return
+    if 'password' in instance.get_dirty_fields() and not is_hashed(instance.password):
+        instance.set_password(instance.password)
+
+
+@receiver(m2m_changed, sender=Group.members.through)
+def invalidate_group_member_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        # instance là User, pk_set là các group
+        group_ids = pk_set if pk_set is not None else instance.group_members.values_list('pk', flat=True)
+        keys = [group_member_cache_key(group_id, instance.pk) for group_id in group_ids]
+    else:
+        user_ids = pk_set if pk_set is not None else instance.members.values_list('pk', flat=True)
+        keys = [group_member_cache_key(instance.pk, user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+
+
+@receiver(m2m_changed, sender=Group.members.through)
+def release_group_seats(sender, instance, action, reverse, pk_set, **kwargs):
+    # Trả lại chỗ khi thành viên rời nhóm. pk_set của remove gồm cả id không phải thành viên,
+    # nên đếm các dòng thật sự bị xoá ở pre_* rồi mới trả chỗ ở post_*
+    if action in ('pre_remove', 'pre_clear'):
+        rows = sender.objects.filter(**{'user' if reverse else 'group': instance.pk})
+        if pk_set is not None:
+            rows = rows.filter(**{'group__in' if reverse else 'user__in': pk_set})
+        instance._released_seats = list(rows.values_list('group_id', flat=True))
+    elif action in ('post_remove', 'post_clear'):
+        group_ids = instance.__dict__.pop('_released_seats', [])
+        if not group_ids:
+            return
+        if reverse:
+            Group.release_seats(group_ids)
+        else:
+            Group.release_seats([instance.pk], count=len(group_ids))
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def release_seats_of_deleted_user(sender, instance, **kwargs):
+    # Xoá user thì các dòng members bị cascade mà không phát m2m_changed
+    Group.release_seats(Group.members.through.objects.filter(user=instance.pk).values_list('group_id', flat=True))
@@ -0,0 +1,181 @@
+import hashlib
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+from urllib.request import urlopen
+
+import cloudinary
+import cloudinary.uploader
+from cloudinary.models import CLOUDINARY_FIELD_DB_RE
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, Storage
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils.deconstruct import deconstructible
+
+
+def digest_of(content):
+    # sha256 của nội dung upload, đọc theo chunk để file lớn không bị load hết vào bộ nhớ
+    sha = hashlib.sha256()
+    size = 0
+    for chunk in content.chunks():
+        sha.update(chunk)
+        size += len(chunk)
+    return sha.hexdigest(), size
+
+
+class ContentAddressedMixin:
+    # Tên file = sha256 nội dung, vd: posts/3f/3fa9...c2.jpg. Upload trùng nội dung tra MediaBlob và trả lại
+    # tên đã lưu, không ghi/upload (và không để Cloudinary xử lý) lần nữa
+    @property
+    def label(self):
+        return f'{self.__class__.__module__}.{self.__class__.__name__}'
+
+    @property
+    def blobs(self):
+        return apps.get_model('Blog.MediaBlob').objects.filter(storage=self.label)
+
+    def hashed_name(self, name, digest):
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        ext = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + ext)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest, size = digest_of(content)
+        # Mỗi lần save giữ một tham chiếu (refs) tới nội dung, delete() trả lại một tham chiếu
+        stored = self.blobs.filter(digest=digest)
+        if stored.update(refs=F('refs') + 1):
+            return stored.values_list('name', flat=True).first()
+        name = self._save(self.hashed_name(name, digest), content)
+        # Hai upload cùng nội dung chạy song song: bản ghi đầu tiên thắng, tên của nó được dùng
+        blob, created = apps.get_model('Blog.MediaBlob').objects.get_or_create(
+            storage=self.label, digest=digest, defaults={'name': name, 'size': size})
+        if not created:
+            stored.update(refs=F('refs') + 1)
+        return blob.name
+
+    def get_available_name(self, name, max_length=None):
+        # Cùng tên nghĩa là cùng nội dung, không cần thêm hậu tố
+        return name
+
+    def stored(self, name):
+        return self.blobs.filter(name=name)
+
+    def delete(self, name):
+        # Upload trùng nội dung (ảnh bài đăng, avatar, ckeditor) dùng chung một tên: chỉ xoá file khi tham chiếu
+        # cuối cùng được trả lại. Dòng MediaBlob bị khoá tới khi file đã xoá xong, save() cùng nội dung chạy
+        # song song phải chờ rồi lưu lại file mới thay vì trả về tên sắp bị xoá
+        with transaction.atomic():
+            blob = self.stored(name).select_for_update().first()
+            if blob is not None and blob.refs > 1:
+                self.blobs.filter(pk=blob.pk).update(refs=F('refs') - 1)
+                return
+            self._delete(name)
+            if blob is not None:
+                blob.delete()
+
+    def _delete(self, name):
+        super().delete(name)
+
+
+@deconstructible
+class LocalMediaStorage(ContentAddressedMixin, FileSystemStorage):
+    # Lưu trong MEDIA_ROOT, dùng cho staging/CI không có mạng. File được phục vụ bởi views.serve_media
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return name
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # Ghi ra file tạm rồi link sang tên thật: file chỉ xuất hiện khi đã ghi xong, và hai process
+        # cùng ghi một nội dung không làm hỏng file của nhau
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            os.chmod(tmp_path, self.file_permissions_mode or 0o644)
+            try:
+                os.link(tmp_path, full_path)
+            except FileExistsError:
+                pass
+        finally:
+            os.unlink(tmp_path)
+        return name
+
+
+@deconstructible
+class CloudinaryStorage(ContentAddressedMixin, Storage):
+    # Upload lên Cloudinary với public_id là tên đã hash. Tên lưu trong DB giữ định dạng của CloudinaryField
+    # nên ảnh upload trước khi đổi sang storage này vẫn hiển thị đúng
+    def _save(self, name, content):
+        content.seek(0)
+        result = cloudinary.uploader.upload(content, public_id=posixpath.splitext(name)[0],
+                                            resource_type='auto', overwrite=False)
+        stored = f"{result['resource_type']}/{result['type']}/v{result['version']}/{result['public_id']}"
+        return f"{stored}.{result['format']}" if result.get('format') else stored
+
+    def resource(self, name):
+        # name dạng image/upload/v1716288080/abc.jpg như CloudinaryField, hoặc chỉ abc.jpg (đường dẫn trả về
+        # bởi listdir)
+        match = re.match(CLOUDINARY_FIELD_DB_RE, name)
+        return cloudinary.CloudinaryResource(public_id=match.group('public_id'), format=match.group('format'),
+                                             version=match.group('version'),
+                                             type=match.group('type') or 'upload',
+                                             resource_type=match.group('resource_type') or 'image')
+
+    def public_path(self, name):
+        # image/upload/v1716288080/posts/ab/abc.jpg -> posts/ab/abc.jpg
+        resource = self.resource(name)
+        return f'{resource.public_id}.{resource.format}' if resource.format else resource.public_id
+
+    def stored(self, name):
+        # Tên đầy đủ đã lưu, hoặc đường dẫn public_id từ listdir (tên file là sha256 nên không trùng nhau)
+        return self.blobs.filter(Q(name=name) | Q(name__endswith=f'/{self.public_path(name)}'))
+
+    def url(self, name):
+        return self.resource(name).url
+
+    def exists(self, name):
+        return self.stored(name).exists()
+
+    def size(self, name):
+        return self.stored(name).values_list('size', flat=True).first()
+
+    def _open(self, name, mode='rb'):
+        # Chỉ đọc: tải file từ URL của Cloudinary về file tạm (giữ trong bộ nhớ nếu nhỏ)
+        if mode != 'rb':
+            raise ValueError(f'CloudinaryStorage files can only be opened in "rb" mode, got "{mode}".')
+        tmp = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        with urlopen(self.url(name), timeout=30) as response:
+            shutil.copyfileobj(response, tmp)
+        tmp.seek(0)
+        return File(tmp, name)
+
+    def listdir(self, path):
+        # Cloudinary không có thư mục: dựng cây thư mục theo public_id của các file đã upload qua storage này
+        # (MediaBlob). Trả về đường dẫn public_id, url()/exists()/open() đều nhận dạng tên này
+        prefix = path.strip('/') + '/' if path.strip('/') else ''
+        directories, files = set(), []
+        for name in self.blobs.filter(name__contains=prefix).values_list('name', flat=True).iterator():
+            relative = self.public_path(name)
+            if not relative.startswith(prefix):
+                continue
+            head, _, tail = relative[len(prefix):].partition('/')
+            if tail:
+                directories.add(head)
+            else:
+                files.append(head)
+        return sorted(directories), sorted(files)
+
+    def _delete(self, name):
+        resource = self.resource(name)
+        cloudinary.uploader.destroy(resource.public_id, resource_type=resource.resource_type, type=resource.type,
+                                    invalidate=True)
@@ -0,0 +1,252 @@
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from Blog.models import Task
+
+# Tên task -> hàm xử lý. Worker chỉ chạy được các task đã đăng ký ở đây
+registry = {}
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+class TaskFunction:
+    def __init__(self, func, name, max_attempts):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        return enqueue(self.name, args=args, kwargs=kwargs, max_attempts=self.max_attempts)
+
+    def delay_with(self, args=(), kwargs=None, idempotency_key=None, countdown=0):
+        return enqueue(self.name, args=args, kwargs=kwargs, idempotency_key=idempotency_key,
+                       countdown=countdown, max_attempts=self.max_attempts)
+
+
+def task(name=None, max_attempts=None):
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        attempts = max_attempts or get_setting('TASK_MAX_ATTEMPTS', 3)
+        registry[task_name] = TaskFunction(func, task_name, attempts)
+        return registry[task_name]
+    return decorator
+
+
+def _insert(name, args, kwargs, idempotency_key, countdown, max_attempts):
+    try:
+        # savepoint riêng để lỗi trùng idempotency_key không làm hỏng transaction bên ngoài
+        with transaction.atomic():
+            return Task.objects.create(name=name, args=list(args), kwargs=kwargs or {},
+                                       idempotency_key=idempotency_key, max_attempts=max_attempts,
+                                       run_at=timezone.now() + timedelta(seconds=countdown))
+    except IntegrityError:
+        # Task cùng idempotency_key đã có trong hàng đợi
+        return None
+
+
+def enqueue(name, args=(), kwargs=None, idempotency_key=None, countdown=0, max_attempts=None):
+    if name not in registry:
+        raise ValueError(f'Unknown task: {name}')
+    max_attempts = max_attempts or registry[name].max_attempts
+    # Chỉ ghi task khi transaction của request commit; rollback thì side effect cũng bị huỷ
+    transaction.on_commit(lambda: _insert(name, args, kwargs, idempotency_key, countdown, max_attempts))
+
+
+def enqueue_periodic(now=None):
+    # TASK_SCHEDULE = {tên task: chu kỳ (giây)}. Khoá idempotency theo chu kỳ nên dù nhiều worker cùng gọi,
+    # mỗi chu kỳ chỉ có một task được đưa vào hàng đợi
+    timestamp = (now or timezone.now()).timestamp()
+    for name, interval in get_setting('TASK_SCHEDULE', {}).items():
+        enqueue(name, idempotency_key=f'periodic:{name}:{int(timestamp // interval)}')
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def backoff(attempts):
+    # 2^n giây (tính theo TASK_RETRY_BACKOFF), tối đa TASK_RETRY_BACKOFF_MAX
+    base = get_setting('TASK_RETRY_BACKOFF', 2)
+    return min(base ** attempts, get_setting('TASK_RETRY_BACKOFF_MAX', 3600))
+
+
+def claim(limit, locked_by, now=None):
+    now = now or timezone.now()
+    ids = list(Task.objects.filter(status=Task.QUEUED, run_at__lte=now)
+               .order_by('run_at').values_list('id', flat=True)[:limit * 2])
+    claimed = []
+    for task_id in ids:
+        # UPDATE có điều kiện: nhiều worker cùng thấy một task nhưng chỉ một worker nhận được
+        if Task.objects.filter(pk=task_id, status=Task.QUEUED).update(
+                status=Task.RUNNING, locked_by=locked_by, started_date=now, heartbeat_date=now,
+                attempts=F('attempts') + 1):
+            claimed.append(task_id)
+            if len(claimed) >= limit:
+                break
+    return list(Task.objects.filter(pk__in=claimed).order_by('run_at'))
+
+
+def leased(job):
+    # Task vẫn thuộc về worker đã claim nó. Nếu requeue_stale đã trả task về hàng đợi và worker khác nhận,
+    # kết quả của worker cũ bị bỏ qua thay vì ghi đè trạng thái của lần chạy mới
+    return Task.objects.filter(pk=job.pk, status=Task.RUNNING, locked_by=job.locked_by)
+
+
+class Heartbeat:
+    # Trong lúc task chạy, cập nhật heartbeat_date mỗi TASK_VISIBILITY_TIMEOUT / 3 giây để requeue_stale
+    # phân biệt task chạy lâu với task của worker đã chết
+    def __init__(self, job):
+        self.job = job
+        self.interval = get_setting('TASK_VISIBILITY_TIMEOUT', 300) / 3
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop.set()
+        self.thread.join()
+
+    def _run(self):
+        try:
+            while not self.stop.wait(self.interval):
+                leased(self.job).update(heartbeat_date=timezone.now())
+        finally:
+            connection.close()
+
+
+def execute(job):
+    func = registry.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f'Unknown task: {job.name}')
+        with Heartbeat(job):
+            func(*job.args, **job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            leased(job).update(status=Task.QUEUED, locked_by='', last_error=error,
+                               run_at=now + timedelta(seconds=backoff(job.attempts)))
+        else:
+            leased(job).update(status=Task.FAILED, finished_date=now, last_error=error)
+        return False
+    return bool(leased(job).update(status=Task.DONE, finished_date=timezone.now()))
+
+
+def requeue_stale(now=None):
+    # Task RUNNING không có heartbeat quá TASK_VISIBILITY_TIMEOUT giây coi như worker đã chết. Lần chạy dở
+    # đã được tính vào attempts lúc claim: còn lượt thì trả lại hàng đợi, hết lượt thì đánh dấu FAILED
+    now = now or timezone.now()
+    deadline = now - timedelta(seconds=get_setting('TASK_VISIBILITY_TIMEOUT', 300))
+    stale = Task.objects.filter(status=Task.RUNNING, heartbeat_date__lt=deadline)
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Task.FAILED, finished_date=now, last_error='Worker stopped sending heartbeats.')
+    return stale.filter(attempts__lt=F('max_attempts')).update(status=Task.QUEUED, locked_by='', run_at=now)
+
+
+def run_once(limit=10, locked_by=None):
+    jobs = claim(limit, locked_by or worker_id())
+    for job in jobs:
+        execute(job)
+    return len(jobs)
+
+
+def purge_finished(now=None):
+    now = now or timezone.now()
+    before = now - timedelta(seconds=get_setting('TASK_RESULT_TTL', 7 * 24 * 3600))
+    deleted, _ = Task.objects.filter(status=Task.DONE, finished_date__lt=before).delete()
+    return deleted
+
+
+def task_metrics(window=60, now=None):
+    now = now or timezone.now()
+    since = now - timedelta(seconds=window)
+    counts = dict(Task.objects.values_list('status').annotate(n=models.Count('id')).order_by())
+    finished = Task.objects.filter(status__in=[Task.DONE, Task.FAILED], finished_date__gte=since)
+    latency = finished.aggregate(
+        queue=models.Avg(models.ExpressionWrapper(F('started_date') - F('run_at'),
+                                                  output_field=models.DurationField())),
+        run=models.Avg(models.ExpressionWrapper(F('finished_date') - F('started_date'),
+                                                output_field=models.DurationField())),
+    )
+    oldest = (Task.objects.filter(status=Task.QUEUED, run_at__lte=now)
+              .order_by('run_at').values_list('run_at', flat=True).first())
+    done = finished.filter(status=Task.DONE).count()
+    return {
+        'window_seconds': window,
+        'queued': counts.get(Task.QUEUED, 0),
+        'running': counts.get(Task.RUNNING, 0),
+        'done': counts.get(Task.DONE, 0),
+        'failed': counts.get(Task.FAILED, 0),
+        'throughput_per_second': round(done / window, 3),
+        'avg_queue_latency_ms': latency['queue'].total_seconds() * 1000 if latency['queue'] else None,
+        'avg_run_time_ms': latency['run'].total_seconds() * 1000 if latency['run'] else None,
+        'oldest_queued_age_seconds': (now - oldest).total_seconds() if oldest else 0,
+    }
+
+
+@task(name='cleanup_user_tokens')
+def cleanup_user_tokens(user_id):
+    # Dọn token của user sau khi logout: access token hết hạn và refresh token đã bị thu hồi
+    from oauth2_provider.models import AccessToken, RefreshToken
+
+    now = timezone.now()
+    AccessToken.objects.filter(user_id=user_id, expires__lt=now).delete()
+    RefreshToken.objects.filter(user_id=user_id, revoked__isnull=False).delete()
+
+
+@task(name='moderate_comment')
+def moderate_comment(comment_id):
+    from Blog import moderation
+
+    moderation.moderate_comment(comment_id)
+
+
+@task(name='purge_expired_tokens', max_attempts=1)
+def purge_expired_tokens():
+    from Blog import cleanup
+
+    cleanup.purge_expired(batch_size=get_setting('TOKEN_PURGE_BATCH_SIZE', 1000))
+
+
+@task(name='purge_finished_tasks', max_attempts=1)
+def purge_finished_tasks():
+    purge_finished()
+
+
+@task(name='refresh_trending', max_attempts=1)
+def refresh_trending():
+    from Blog import trending
+
+    for kind in trending.KINDS:
+        trending.refresh(kind)
+
+
+@task(name='compact_trending', max_attempts=1)
+def compact_trending():
+    from Blog import trending
+
+    trending.compact()
+
+
+@task(name='archive_posts', max_attempts=1)
+def archive_posts():
+    from Blog import archive
+
+    archive.archive_posts(batch_size=get_setting('ARCHIVE_BATCH_SIZE', 500))
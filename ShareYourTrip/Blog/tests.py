@@ -1,3 +1,1056 @@
-from django.test import TestCase
+import importlib
+import math
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+import unicodedata
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from ckeditor_uploader.utils import storage as ckeditor_storage
+from django.apps import apps as django_apps
+from django.contrib.auth.hashers import make_password
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection, connections
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from Blog import archive, batch, cleanup, counters, geo, hll, moderation, routers, storage, tasks, throttles, trending, views, viewstats
+from Blog.models import (ArchivedGroup, ArchivedGroupMessage, ArchivedJoinRequest, ArchivedPost, Comment, Follow,
+                         Group, GroupMessage, Hashtag, Image, JoinRequest, Like, MediaBlob, Post, Rating, Report, Task,
+                         TrendingBucket, User)
+
+
+def make_user(username, **kwargs):
+    return User.objects.create(username=username, **kwargs)
+
+
+def make_post(user, **kwargs):
+    now = timezone.now()
+    fields = dict(title='Trip', description='', start_time=now, end_time=now + timedelta(days=2),
+                  starting_point='Hà Nội', end_point='Huế')
+    fields.update(kwargs)
+    return Post.objects.create(user=user, **fields)
+
+
+def client_for(user=None):
+    client = APIClient()
+    if user is not None:
+        client.force_authenticate(user)
+    return client
+
+
+MODERATION = {'BLOCKLIST_WORDS': ['ngu'], 'BLOCKLIST_PATTERNS': [], 'RATE_LIMIT': (5, 60), 'QUEUE': 'thread'}
+
+
+@override_settings(COMMENT_MODERATION=MODERATION)
+class ModerationTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner')
+        self.post = make_post(self.owner)
+        moderation.reset()
+        self.addCleanup(moderation.reset)
+        self.addCleanup(trending.events.flush)
+
+    def rule(self, words=(), patterns=()):
+        return moderation.BlocklistRule({'BLOCKLIST_WORDS': list(words), 'BLOCKLIST_PATTERNS': list(patterns)})
+
+    def check(self, rule, content):
+        return rule.check(Comment(content=content))
+
+    def test_blocklist_matches_whole_words_in_any_case_and_accent_form(self):
+        rule = self.rule(words=['ngu', 'đồ ngốc'], patterns=[r'https?://\S+'])
+        self.assertEqual(self.check(rule, 'Ngu thế'), moderation.REJECT)
+        self.assertEqual(self.check(rule, 'ĐỒ NGỐC'), moderation.REJECT)
+        self.assertEqual(self.check(rule, unicodedata.normalize('NFD', 'đồ ngốc')), moderation.REJECT)
+        self.assertEqual(self.check(rule, 'xem http://spam.example'), moderation.REJECT)
+        # Từ khác chỉ trùng phần đầu, hoặc khác dấu, không bị chặn (kể cả khi dấu được gõ rời)
+        self.assertEqual(self.check(rule, 'Nguyễn đi ngủ'), moderation.APPROVE)
+        self.assertEqual(self.check(rule, unicodedata.normalize('NFD', 'đi ngủ sớm')), moderation.APPROVE)
+        self.assertEqual(self.check(self.rule(), 'ngu'), moderation.APPROVE)
+
+    def post_comment(self, content):
+        with mock.patch.object(moderation, '_get_executor') as executor:
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = client_for(self.owner).post(f'/posts/{self.post.pk}/comments/', {'content': content},
+                                                       format='json')
+                # Chưa commit thì chưa có gì được đưa cho worker
+                executor.assert_not_called()
+                self.assertFalse(Task.objects.exists())
+            for callback in callbacks:
+                callback()
+        return response.data['id'], executor
+
+    def test_comment_is_moderated_after_commit_and_hidden_until_confirmed(self):
+        comment_id, executor = self.post_comment('Đẹp quá')
+        executor.return_value.submit.assert_called_once_with(moderation._run_in_worker, comment_id)
+        self.assertEqual(client_for().get(f'/posts/{self.post.pk}/comments/').data['results'], [])
+
+        self.assertEqual(moderation.moderate_comment(comment_id), moderation.APPROVE)
+        [comment] = client_for().get(f'/posts/{self.post.pk}/comments/').data['results']
+        self.assertEqual(comment['id'], comment_id)
+
+    @override_settings(COMMENT_MODERATION=dict(MODERATION, QUEUE='tasks'))
+    def test_task_queue_gets_the_comment_after_commit(self):
+        comment_id, executor = self.post_comment('Ngu')
+        executor.assert_not_called()
+        [job] = Task.objects.all()
+        self.assertEqual((job.name, job.args), ('moderate_comment', [comment_id]))
+        self.assertTrue(tasks.execute(tasks.claim(1, 'worker')[0]))
+        self.assertFalse(Comment.objects.filter(pk=comment_id).exists())
+
+    def test_pending_comments_are_visible_to_staff_only(self):
+        comment = Comment.objects.create(user=self.owner, post=self.post, content='chờ duyệt')
+        Comment.objects.create(user=self.owner, post=self.post, content='ok', parent_comment=comment)
+        url = f'/comments/{comment.id}/'
+        self.assertEqual(client_for(self.owner).get(f'{url}?confirmed=false').status_code, 404)
+        response = client_for(make_user('staff', is_staff=True)).get(f'{url}?confirmed=false')
+        self.assertEqual((response.data['id'], response.data['replies']), (comment.id, []))
+        # Tác giả vẫn sửa được comment đang chờ duyệt
+        response = client_for(self.owner).patch(url, {'content': 'đã sửa'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+
+class GroupMessageTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner')
+        self.group = Group.objects.create(creator=self.owner, post=make_post(self.owner))
+        self.other = Group.objects.create(creator=self.owner, post=make_post(self.owner))
+        self.client = client_for(self.owner)
+
+    def read(self, message_id):
+        return self.client.post(f'/group/{self.group.pk}/messages/read/', {'message_id': message_id}, format='json')
+
+    def test_read_is_clamped_to_messages_of_the_group(self):
+        first = GroupMessage.objects.create(group=self.group, user=self.owner, content='a')
+        foreign = GroupMessage.objects.create(group=self.other, user=self.owner, content='b')
+
+        response = self.read(foreign.id)
+        self.assertEqual(response.data['last_read_id'], first.id)
+        response = self.read(10 ** 12)
+        self.assertEqual(response.data['last_read_id'], first.id)
+
+        # Tin nhắn tới sau vẫn được tính là chưa đọc
+        GroupMessage.objects.create(group=self.group, user=self.owner, content='c')
+        response = self.read(first.id)
+        self.assertEqual(response.data['unread'], 1)
+
+    @override_settings(GROUP_CHAT_POLL_TIMEOUT=30, GROUP_CHAT_POLL_INTERVAL=0.01)
+    def test_poll_returns_at_once_when_all_slots_are_taken(self):
+        taken = 0
+        while views.poll_slots.acquire(blocking=False):
+            taken += 1
+        try:
+            start = time.monotonic()
+            response = self.client.get(f'/group/{self.group.pk}/messages/poll/')
+            self.assertEqual(response.status_code, 200)
+            self.assertLess(time.monotonic() - start, 5)
+        finally:
+            for _ in range(taken):
+                views.poll_slots.release()
+
+
+class JoinRequestTests(TransactionTestCase):
+    def test_concurrent_approvals_do_not_overbook(self):
+        owner = make_user('owner')
+        group = Group.objects.create(creator=owner, post=make_post(owner), capacity=3)
+        requests = [JoinRequest.objects.create(group=group, user=make_user(f'rider{i}')) for i in range(12)]
+        barrier = threading.Barrier(len(requests))
+        results, errors = [], []
+
+        def approve(join_request):
+            try:
+                barrier.wait()
+                results.append(join_request.approve())
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=approve, args=(join_request,)) for join_request in requests]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        group.refresh_from_db()
+        self.assertEqual(results.count(JoinRequest.APPROVED), 3)
+        self.assertEqual(results.count(JoinRequest.FULL), 9)
+        self.assertEqual(group.seats_taken, 3)
+        self.assertEqual(group.members.count(), 3)
+        self.assertEqual(group.join_requests.filter(status=JoinRequest.APPROVED).count(), 3)
+
+
+class GroupSeatTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner')
+        self.group = Group.objects.create(creator=self.owner, post=make_post(self.owner), capacity=2)
+        self.riders = [make_user(f'rider{i}') for i in range(3)]
+        for rider in self.riders[:2]:
+            JoinRequest.objects.create(group=self.group, user=rider).approve()
+
+    def seats(self):
+        self.group.refresh_from_db(fields=['seats_taken'])
+        return self.group.seats_taken
+
+    def test_removing_a_member_frees_a_seat(self):
+        late = JoinRequest.objects.create(group=self.group, user=self.riders[2])
+        self.assertEqual(late.approve(), JoinRequest.FULL)
+        self.group.members.remove(self.riders[0], self.riders[2])
+        self.assertEqual(self.seats(), 1)
+        self.assertEqual(late.approve(), JoinRequest.APPROVED)
+        self.assertEqual(self.seats(), 2)
+
+    def test_clear_reverse_remove_and_user_delete_release_seats(self):
+        self.riders[0].group_members.remove(self.group)
+        self.assertEqual(self.seats(), 1)
+        self.riders[1].delete()
+        self.assertEqual(self.seats(), 0)
+        self.group.members.add(self.riders[2])
+        self.group.members.clear()
+        self.assertEqual(self.seats(), 0)
+
+    def test_migration_fills_seats_from_members(self):
+        migration = importlib.import_module('Blog.migrations.0004_group_capacity_join_requests')
+        Group.objects.filter(pk=self.group.pk).update(seats_taken=0)
+        empty = Group.objects.create(creator=self.owner, post=make_post(self.owner), seats_taken=5)
+        migration.fill_seats_taken(django_apps, None)
+        self.assertEqual(self.seats(), 2)
+        empty.refresh_from_db()
+        self.assertEqual(empty.seats_taken, 0)
+
+
+class GroupCreateTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner')
+        self.stranger = make_user('stranger')
+        self.post = make_post(self.owner)
+
+    def test_anonymous_cannot_create_group(self):
+        response = client_for().post('/group/', {'post': self.post.pk}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_only_post_owner_creates_group_and_becomes_creator(self):
+        response = client_for(self.stranger).post('/group/', {'post': self.post.pk, 'creator': self.stranger.pk},
+                                                  format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = client_for(self.owner).post('/group/', {'post': self.post.pk, 'creator': self.stranger.pk},
+                                               format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Group.objects.get(pk=self.post.pk).creator, self.owner)
+
+    def test_post_and_creator_are_read_only_on_update(self):
+        group = Group.objects.create(creator=self.owner, post=self.post)
+        other_post = make_post(self.owner)
+        response = client_for(self.owner).patch(f'/group/{group.pk}/', {'post': other_post.pk, 'creator': self.stranger.pk,
+                                                                       'capacity': 4}, format='json')
+        self.assertEqual(response.status_code, 200)
+        group.refresh_from_db()
+        self.assertEqual((group.post_id, group.creator_id, group.capacity), (self.post.pk, self.owner.pk, 4))
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner')
+        self.rider = make_user('rider')
+
+    def test_inactive_post_stays_hidden_after_archival(self):
+        post = make_post(self.owner, active=False)
+        self.assertEqual(client_for().get(f'/posts/{post.pk}/').status_code, 404)
+        archive.archive_batch([post.pk])
+        self.assertFalse(ArchivedPost.objects.get(pk=post.pk).active)
+        self.assertEqual(client_for().get(f'/posts/{post.pk}/').status_code, 404)
+
+    def test_archived_post_uses_detail_fields(self):
+        post = make_post(self.owner, description='<p>Sa Pa</p>')
+        Post.objects.filter(pk=post.pk).update(view_count=42)
+        archive.archive_batch([post.pk])
+        response = client_for().get(f'/posts/{post.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['archived'])
+        self.assertEqual(response.data['title'], 'Trip')
+        self.assertNotIn('view_count', response.data)
+
+    def test_group_rows_are_archived_not_destroyed(self):
+        post = make_post(self.owner)
+        group = Group.objects.create(creator=self.owner, post=post)
+        group.members.add(self.rider)
+        message = GroupMessage.objects.create(group=group, user=self.rider, content='Hẹn 6h sáng')
+        JoinRequest.objects.create(group=group, user=self.rider)
+        Like.objects.create(post=post, user=self.rider)
+        archive.archive_batch([post.pk])
+
+        self.assertFalse(Group.objects.filter(pk=post.pk).exists())
+        self.assertEqual(ArchivedGroup.objects.get(pk=post.pk).data['members'], [self.rider.pk])
+        archived_message = ArchivedGroupMessage.objects.get(pk=message.pk)
+        self.assertEqual((archived_message.post_id, archived_message.data['content']), (post.pk, 'Hẹn 6h sáng'))
+        self.assertEqual(ArchivedJoinRequest.objects.filter(post_id=post.pk).count(), 1)
+
+    @override_settings(TASK_SCHEDULE={'archive_posts': 24 * 3600}, ARCHIVE_AFTER_DAYS=30)
+    def test_periodic_task_archives_expired_posts(self):
+        expired = make_post(self.owner, end_time=timezone.now() - timedelta(days=31))
+        current = make_post(self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.enqueue_periodic()
+        [job] = tasks.claim(1, 'worker')
+        self.assertEqual(job.name, 'archive_posts')
+        self.assertTrue(tasks.execute(job))
+        self.assertTrue(ArchivedPost.objects.filter(pk=expired.pk).exists())
+        self.assertEqual(list(Post.all_objects.values_list('pk', flat=True)), [current.pk])
+
+
+class ActiveManagerTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner')
+        self.post = make_post(self.owner)
+
+    def test_unique_checks_see_inactive_rows(self):
+        Hashtag.objects.create(hashtag='dalat', active=False)
+        response = client_for(self.owner).post('/hashtags/', {'hashtag': 'dalat'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        with self.assertRaises(ValidationError):
+            Hashtag(hashtag='dalat').full_clean()
+
+    @override_settings(COUNTER_FLUSH_INTERVAL=0)
+    def test_hidden_rows_are_left_out_of_nested_lists(self):
+        shown, hidden = Hashtag.objects.create(hashtag='hue'), Hashtag.objects.create(hashtag='sapa', active=False)
+        self.post.hashtags.set([shown, hidden])
+        comment = Comment.objects.create(user=self.owner, post=self.post, content='a', confirmed=True)
+        Comment.objects.create(user=self.owner, post=self.post, content='ok', parent_comment=comment, confirmed=True)
+        Comment.objects.create(user=self.owner, post=self.post, content='spam', parent_comment=comment,
+                               confirmed=True, active=False)
+
+        response = client_for().get(f'/posts/{self.post.pk}/')
+        self.assertEqual([tag['hashtag'] for tag in response.data['hashtags_read']], ['hue'])
+        response = client_for().get('/posts/')
+        self.assertEqual([tag['hashtag'] for tag in response.data['results'][0]['hashtags_read']], ['hue'])
+        response = client_for().get(f'/posts/{self.post.pk}/comments/')
+        [top] = response.data['results']
+        self.assertEqual([reply['content'] for reply in top['replies']], ['ok'])
+
+
+class LikeCounterTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner')
+        self.post = make_post(self.owner)
+        self.buffer = counters.CounterBuffer('Blog.Post', 'like_count')
+
+    def like_count(self, post):
+        post.refresh_from_db(fields=['like_count'])
+        return post.like_count
+
+    @override_settings(COUNTER_FLUSH_INTERVAL=0)
+    def test_like_and_unlike_are_idempotent(self):
+        client = client_for(make_user('rider'))
+        for method, expected in [('put', 1), ('put', 1), ('delete', 0), ('delete', 0), ('put', 1)]:
+            response = getattr(client, method)(f'/posts/{self.post.pk}/like/')
+            self.assertEqual(response.data['like_count'], expected)
+            self.assertEqual(self.like_count(self.post), expected)
+
+    @override_settings(COUNTER_FLUSH_INTERVAL=0)
+    def test_migration_backfills_likes_made_before_the_counter(self):
+        migration = importlib.import_module('Blog.migrations.0006_post_like_count')
+        riders = [make_user(f'rider{i}') for i in range(3)]
+        for rider in riders:
+            Like.objects.create(user=rider, post=self.post)
+        Like.objects.filter(user=riders[2]).update(active=False)
+        with mock.patch.object(migration, 'BATCH_SIZE', 1):
+            migration.fill_like_count(django_apps, None)
+        self.assertEqual(self.like_count(self.post), 2)
+        client_for(riders[0]).delete(f'/posts/{self.post.pk}/like/')
+        self.assertEqual(self.like_count(self.post), 1)
+
+    def test_flush_runs_one_update_per_distinct_delta(self):
+        posts = [self.post] + [make_post(self.owner) for _ in range(3)]
+        self.buffer.deltas.update({posts[0].pk: 1, posts[1].pk: 1, posts[2].pk: 2, posts[3].pk: -1})
+        with self.assertNumQueries(3 + 2):  # 3 UPDATE + SAVEPOINT/RELEASE
+            self.assertEqual(self.buffer.flush(), 4)
+        self.assertEqual([self.like_count(post) for post in posts], [1, 1, 2, -1])
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_failed_flush_keeps_deltas_for_the_next_one(self):
+        self.buffer.deltas[self.post.pk] = 2
+        with mock.patch('django.db.models.query.QuerySet.update', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.buffer.flush()
+        self.buffer.deltas[self.post.pk] += 1
+        self.assertEqual(self.buffer.pending(self.post.pk), 3)
+        self.buffer.flush()
+        self.assertEqual(self.like_count(self.post), 3)
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner')
+        self.post = make_post(self.owner, description='<p>Sa Pa</p>')
+        Rating.objects.create(rater=self.owner, post=self.post, stars=5)
+
+    def test_fields_narrow_the_payload_and_the_select(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = client_for().get('/posts/?fields=id,title')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+        [select] = [query['sql'] for query in captured if 'FROM "Blog_post"' in query['sql']
+                    and 'COUNT' not in query['sql']]
+        self.assertIn('"Blog_post"."title"', select)
+        for column in ('description', 'excerpt', 'starting_point', 'Blog_user'):
+            self.assertNotIn(column, select)
+
+    def test_ratings_only_with_expand(self):
+        response = client_for().get('/posts/')
+        self.assertNotIn('ratings', response.data['results'][0])
+        self.assertEqual(response.data['results'][0]['excerpt'], 'Sa Pa')
+        response = client_for().get('/posts/?fields=id&expand=ratings')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'ratings'})
+        self.assertEqual([rating['stars'] for rating in response.data['results'][0]['ratings']], [5])
+
+    def test_excerpt_follows_description(self):
+        self.post.description = '<h1>Hà&nbsp;Giang</h1>\n<p>Đèo  <b>Mã Pí Lèng</b> &amp; sông Nho Quế</p>'
+        self.post.save()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.excerpt, 'Hà Giang Đèo Mã Pí Lèng & sông Nho Quế')
+        self.post.description = '<p>%s</p>' % ('a' * 500)
+        self.post.save()
+        self.assertEqual(len(Post.objects.get(pk=self.post.pk).excerpt), Post.EXCERPT_LENGTH)
+        # Đổi cột khác không tính lại excerpt
+        Post.objects.filter(pk=self.post.pk).update(excerpt='giữ nguyên')
+        post = Post.objects.only('id', 'title').get(pk=self.post.pk)
+        post.title = 'Hà Giang'
+        post.save()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).excerpt, 'giữ nguyên')
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.admin = make_user('admin', is_staff=True, is_superuser=True)
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        for _ in range(count):
+            user = make_user(f'user{User.objects.count()}')
+            post = make_post(user)
+            Comment.objects.create(user=user, post=post, content='a')
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(captured)
+
+    def test_changelists_run_a_constant_number_of_queries(self):
+        urls = ['/admin/Blog/post/', '/admin/Blog/comment/', '/admin/Blog/user/']
+        self.add_rows(5)
+        before = [self.queries(url) for url in urls]
+        self.add_rows(5)
+        self.assertEqual([self.queries(url) for url in urls], before)
+
+
+class ThrottleTests(TestCase):
+    def setUp(self):
+        throttles.get_store().reset()
+
+    def tearDown(self):
+        throttles.get_store().reset()
+
+    def test_registration_has_its_own_scope(self):
+        client = client_for()
+        codes = [client.post('/users/', {'username': f'new{i}', 'password': 'x'}).status_code for i in range(6)]
+        self.assertEqual(codes, [201] * 5 + [429])
+
+    def test_prune_keeps_buckets_of_slower_scopes(self):
+        store = throttles.LocMemBucketStore()
+        store.max_keys = 1
+        # reports: 5/hour, bucket hết token
+        for _ in range(5):
+            store.consume('reports:1', 5, 5 / 3600, now=0)
+        # 61s sau, một request 120/min đẩy store quá max_keys và kích hoạt prune
+        store.consume('anon:2', 120, 2, now=61)
+        allowed, _ = store.consume('reports:1', 5, 5 / 3600, now=61)
+        self.assertFalse(allowed)
+
+    def test_key_spraying_keeps_the_store_bounded(self):
+        store = throttles.LocMemBucketStore()
+        store.max_keys, store.hard_max_keys = 100, 200
+        store.consume('user:1', 5, 5 / 3600, now=0)
+        store.consume('user:1', 5, 5 / 3600, now=0)
+        # Mỗi IP giả một request: bucket chưa đầy lại nên không prune được, chỉ bị bỏ khi vượt hard_max_keys
+        for i in range(5000):
+            store.consume(f'anon:{i}', 120, 2, now=1)
+            self.assertLessEqual(len(store.buckets), 200)
+        self.assertNotIn('user:1', store.buckets)
+        # Bucket cũ nhất đã đầy lại thì bị bỏ ngay khi vượt max_keys
+        store.consume('anon:new', 120, 2, now=1000)
+        self.assertEqual(len(store.buckets), 100)
+
+
+class CompressionTests(TestCase):
+    def test_only_api_responses_are_compressed(self):
+        user = make_user('owner')
+        for i in range(20):
+            make_post(user, title=f'Chuyến đi số {i} từ Hà Nội vào Huế')
+        response = client_for().get('/posts/', HTTP_ACCEPT_ENCODING='gzip', HTTP_ACCEPT='application/json')
+        self.assertIn(response.get('Content-Encoding'), ('gzip', 'br'))
+
+        response = client_for().get('/posts/', HTTP_ACCEPT_ENCODING='gzip', HTTP_ACCEPT='text/html')
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'replica is a copy of the SQLite test database')
+class ReplicaRoutingTests(TransactionTestCase):
+    # Replica là bản sao file DB test chụp trước khi ghi, tức một replica trễ và không bao giờ bắt kịp
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        replica = dict(connections.settings['default'], NAME=os.path.join(self.directory, 'replica.sqlite3'))
+        connection.close()
+        shutil.copyfile(connections.settings['default']['NAME'], replica['NAME'])
+        connections.settings[routers.REPLICA] = replica
+        self.writer = make_user('writer')
+        self.reader = make_user('reader')
+
+    def tearDown(self):
+        connections[routers.REPLICA].close()
+        del connections[routers.REPLICA]
+        del connections.settings[routers.REPLICA]
+        shutil.rmtree(self.directory)
+
+    def hashtags(self, client, **headers):
+        response = client.get('/hashtags/', **headers)
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        return [item['hashtag'] for item in results]
+
+    def test_reads_go_to_replica_except_right_after_own_write(self):
+        writer = client_for(self.writer)
+        response = writer.post('/hashtags/', {'hashtag': 'hagiang'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        # Stickiness đi theo request chứ không nằm trong cache của process đã xử lý lần ghi
+        cache.clear()
+
+        self.assertEqual(self.hashtags(writer), ['hagiang'])
+        self.assertEqual(self.hashtags(client_for(self.reader)), [])
+        self.assertEqual(self.hashtags(client_for()), [])
+        # Client không giữ cookie gửi lại header
+        token = response[routers.STICKY_HEADER]
+        self.assertEqual(self.hashtags(client_for(self.writer), HTTP_X_REPLICA_STICKY=token), ['hagiang'])
+        # Token của user khác không có tác dụng
+        self.assertEqual(self.hashtags(client_for(self.reader), HTTP_X_REPLICA_STICKY=token), [])
+
+    @override_settings(REPLICA_STICKY_SECONDS=1)
+    def test_stickiness_expires(self):
+        writer = client_for(self.writer)
+        writer.post('/hashtags/', {'hashtag': 'hagiang'}, format='json')
+        time.sleep(2.1)
+        self.assertEqual(self.hashtags(writer), [])
+
+
+@tasks.task(name='tests.sleep', max_attempts=2)
+def sleep_task(seconds):
+    time.sleep(seconds)
+
+
+class TaskQueueTests(TestCase):
+    def make_task(self, **kwargs):
+        return Task.objects.create(name='tests.sleep', args=[0], max_attempts=2, run_at=timezone.now(), **kwargs)
+
+    def test_requeue_stale_respects_max_attempts_and_heartbeats(self):
+        now = timezone.now()
+        long_ago = now - timedelta(hours=1)
+        retry = self.make_task(status=Task.RUNNING, attempts=1, started_date=long_ago, heartbeat_date=long_ago)
+        exhausted = self.make_task(status=Task.RUNNING, attempts=2, started_date=long_ago, heartbeat_date=long_ago)
+        # Bắt đầu từ lâu nhưng vẫn gửi heartbeat: worker còn sống
+        alive = self.make_task(status=Task.RUNNING, attempts=1, started_date=long_ago, heartbeat_date=now)
+
+        self.assertEqual(tasks.requeue_stale(now), 1)
+        statuses = dict(Task.objects.values_list('id', 'status'))
+        self.assertEqual(statuses, {retry.id: Task.QUEUED, exhausted.id: Task.FAILED, alive.id: Task.RUNNING})
+
+    def test_worker_that_lost_its_lease_does_not_complete_task(self):
+        job = self.make_task()
+        [first] = tasks.claim(1, 'worker-1')
+        Task.objects.filter(pk=job.pk).update(heartbeat_date=timezone.now() - timedelta(hours=1))
+        tasks.requeue_stale()
+        [second] = tasks.claim(1, 'worker-2')
+
+        self.assertFalse(tasks.execute(first))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), (Task.RUNNING, 'worker-2'))
+        self.assertTrue(tasks.execute(second))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Task.DONE)
+
+
+class TaskHeartbeatTests(TransactionTestCase):
+    @override_settings(TASK_VISIBILITY_TIMEOUT=0.3)
+    def test_long_running_task_keeps_its_lease(self):
+        Task.objects.create(name='tests.sleep', args=[0.6], run_at=timezone.now())
+        [job] = tasks.claim(1, 'worker-1')
+
+        def work():
+            try:
+                tasks.execute(job)
+            finally:
+                connection.close()
+
+        worker = threading.Thread(target=work)
+        worker.start()
+        time.sleep(0.45)
+        # Đã quá visibility timeout tính từ lúc bắt đầu, nhưng heartbeat vẫn mới
+        self.assertEqual(tasks.requeue_stale(), 0)
+        worker.join()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Task.DONE)
+        self.assertGreater(job.heartbeat_date, job.started_date)
+
+
+class PurgeTests(TestCase):
+    expired = 50000
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        Session.objects.bulk_create([Session(session_key=f'expired{i:033d}', session_data='',
+                                             expire_date=now - timedelta(days=1)) for i in range(cls.expired)],
+                                    batch_size=5000)
+        Session.objects.bulk_create([Session(session_key=f'live{i:036d}', session_data='',
+                                             expire_date=now + timedelta(days=1)) for i in range(10)])
+
+    def expired_sessions(self):
+        return Session.objects.filter(expire_date__lt=timezone.now())
+
+    def test_purge_memory_does_not_grow_with_table(self):
+        tracemalloc.start()
+        try:
+            purged = cleanup.purge(self.expired_sessions(), batch_size=500)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(purged, self.expired)
+        self.assertEqual(Session.objects.count(), 10)
+        # Giữ toàn bộ 50k khoá chính (~4MB) trong bộ nhớ sẽ vượt xa giới hạn này
+        self.assertLess(peak, 1024 * 1024)
+
+    def test_dry_run_counts_without_deleting(self):
+        self.assertEqual(cleanup.purge(self.expired_sessions(), batch_size=1000, dry_run=True), self.expired)
+        self.assertEqual(cleanup.purge(self.expired_sessions(), batch_size=1000, dry_run=True, max_batches=3), 3000)
+        self.assertEqual(Session.objects.count(), self.expired + 10)
+
+        out = StringIO()
+        call_command('purge_expired_tokens', '--dry-run', '--batch-size', '5000', stdout=out)
+        self.assertIn(f'{self.expired} would be deleted', ' '.join(out.getvalue().split()))
+        self.assertEqual(Session.objects.count(), self.expired + 10)
+
+
+class RouteSearchTests(TestCase):
+    # Hà Nội -> TP.HCM theo QL1A
+    route = [(21.0285, 105.8542), (18.6796, 105.6813), (16.4637, 107.5909), (16.0544, 108.2022),
+             (13.7820, 109.2190), (12.2388, 109.1967), (10.9289, 108.1021), (10.7769, 106.7009)]
+    corridor = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(7)
+        fine = geo.densify(cls.route, 0.2)
+        user = make_user('owner')
+        now = timezone.now()
+        posts = []
+        for i in range(400):
+            points = []
+            for _ in range(2):
+                lat, lng = rng.choice(fine)
+                lat, lng = lat + rng.uniform(-0.2, 0.2), lng + rng.uniform(-0.2, 0.2)
+                points.append((lat, lng))
+            (start_lat, start_lng), (end_lat, end_lng) = points
+            posts.append(Post(title=f'Trip {i}', user=user, description='', start_time=now,
+                              end_time=now + timedelta(days=2), starting_point='', end_point='',
+                              start_lat=start_lat, start_lng=start_lng, start_geohash=geo.encode(start_lat, start_lng),
+                              end_lat=end_lat, end_lng=end_lng, end_geohash=geo.encode(end_lat, end_lng)))
+        Post.objects.bulk_create(posts)
+
+    def nearest(self, fine, lat, lng):
+        # (khoảng cách tới tuyến, quãng đường dọc tuyến tới hình chiếu) tính bằng haversine trên tuyến densify 500m;
+        # điểm gần nhất lệch hình chiếu thật tối đa 250m, khoảng cách sai chưa tới 0.01 km ở biên hành lang
+        distance, index = min((geo.haversine(lat, lng, *point), i) for i, point in enumerate(fine))
+        return distance, index * 0.5
+
+    def test_along_route_matches_haversine_reference(self):
+        fine = geo.densify(self.route, 0.5)
+        matched, ambiguous = set(), set()
+        for post in Post.objects.all():
+            start_distance, start_along = self.nearest(fine, post.start_lat, post.start_lng)
+            end_distance, end_along = self.nearest(fine, post.end_lat, post.end_lng)
+            # Sát biên hành lang hoặc điểm đi/đến gần như trùng vị trí dọc tuyến: bỏ qua khi so sánh
+            if (any(abs(d - self.corridor) < 0.5 for d in (start_distance, end_distance))
+                    or abs(start_along - end_along) < 2):
+                ambiguous.add(post.id)
+            elif start_distance <= self.corridor and end_distance <= self.corridor and start_along < end_along:
+                matched.add(post.id)
+
+        found = set(geo.along_route(Post.objects.all(), self.route, self.corridor).values_list('id', flat=True))
+        self.assertGreater(len(matched), 20)
+        self.assertEqual(found - ambiguous, matched)
+
+    def test_route_filter_on_list(self):
+        route = ';'.join(f'{lat},{lng}' for lat, lng in self.route)
+        response = client_for().get('/posts/', {'route': route, 'corridor': self.corridor})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], geo.along_route(Post.objects.all(), self.route, self.corridor).count())
+
+        long_route = ';'.join(f'{10 + i * 0.01},106' for i in range(101))
+        self.assertEqual(client_for().get('/posts/', {'route': long_route}).status_code, 400)
+
+
+class DirtyFieldsTests(TestCase):
+    def setUp(self):
+        self.user = make_user('owner', first_name='An')
+        User.objects.filter(pk=self.user.pk).update(avatar='avatars/old.png')
+        self.user = User.objects.get(pk=self.user.pk)
+
+    def test_file_renamed_in_place_is_saved(self):
+        # Sau save() snapshot được chụp khi avatar đã là FieldFile: đổi tên tại chỗ vẫn là cùng object đó
+        self.user.avatar.name
+        self.user.first_name = 'Bình'
+        self.user.save()
+        self.user.avatar.name = 'avatars/new.png'
+        self.assertIn('avatar', self.user.get_dirty_fields())
+        self.user.save()
+        self.assertEqual(User.objects.get(pk=self.user.pk).avatar.name, 'avatars/new.png')
+
+    def test_partial_refresh_keeps_other_changes_dirty(self):
+        self.user.first_name = 'Bình'
+        User.objects.filter(pk=self.user.pk).update(last_name='Trần')
+        self.user.refresh_from_db(fields=['last_name'])
+        self.assertEqual(set(self.user.get_dirty_fields()), {'first_name'})
+        self.user.save()
+        self.assertEqual(User.objects.values_list('first_name', 'last_name').get(pk=self.user.pk), ('Bình', 'Trần'))
+
+    def test_loading_deferred_field_keeps_changes_dirty(self):
+        post = make_post(self.user)
+        post = Post.objects.only('id', 'title').get(pk=post.pk)
+        post.title = 'Đà Lạt'
+        post.description  # nạp cột bị defer bằng refresh_from_db(fields=['description'])
+        self.assertIn('title', post.get_dirty_fields())
+        post.save()
+        self.assertEqual(Post.objects.get(pk=post.pk).title, 'Đà Lạt')
+
+
+class ProfileEditTests(TestCase):
+    def setUp(self):
+        self.user = make_user('owner', first_name='An', last_name='Nguyễn')
+        self.user.set_password('old-password')
+        self.user.save()
+        self.client = client_for(User.objects.get(pk=self.user.pk))
+
+    def patch(self, data, queries):
+        with mock.patch('django.contrib.auth.base_user.make_password', wraps=make_password) as hasher:
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.patch('/users/current-user/', data, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(captured), queries)
+        updates = [query['sql'] for query in captured if query['sql'].startswith('UPDATE')]
+        return response, hasher.call_count, updates
+
+    def test_patch_without_password_keeps_it_and_writes_changed_columns(self):
+        # 1 UPDATE + 4 COUNT của following/followers/report trong response
+        response, hashes, [update] = self.patch({'first_name': 'Bình', 'last_name': 'Nguyễn'}, queries=5)
+        self.assertEqual(hashes, 0)
+        self.assertIn('"first_name"', update)
+        self.assertNotIn('"last_name"', update)
+        self.assertNotIn('"password"', update)
+        self.assertTrue(User.objects.get(pk=self.user.pk).check_password('old-password'))
+
+    def test_patch_with_password_hashes_once_in_one_update(self):
+        response, hashes, [update] = self.patch({'first_name': 'Bình', 'password': 'new-password'}, queries=5)
+        self.assertEqual(hashes, 1)
+        self.assertIn('"password"', update)
+        self.assertIn('"first_name"', update)
+        self.assertNotIn('"email"', update)
+        self.assertNotIn('password', response.data)
+        self.assertTrue(User.objects.get(pk=self.user.pk).check_password('new-password'))
+
+    def test_role_cannot_be_changed_by_the_user(self):
+        response, _, updates = self.patch({'role': 'admin'}, queries=4)
+        self.assertEqual((response.data['role'], updates), ('user', []))
+        self.assertEqual(User.objects.get(pk=self.user.pk).role, 'user')
+
+
+class TrendingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        owner = make_user('owner')
+        self.old, self.new = make_post(owner), make_post(owner)
+        self.bucket = trending.current_bucket()
+
+    def tearDown(self):
+        cache.clear()
+
+    def ranking(self, bucket):
+        return [pk for pk, _ in trending.top(trending.POST, 10, now=bucket * 3600 + 60)]
+
+    def test_top_is_rebuilt_when_the_hour_changes(self):
+        TrendingBucket.objects.create(kind=trending.POST, object_id=self.old.pk, bucket=self.bucket, score=5)
+        self.assertEqual(self.ranking(self.bucket), [self.old.pk])
+
+        # Process khác ghi điểm vào giờ kế tiếp, không cập nhật cache của process này
+        TrendingBucket.objects.create(kind=trending.POST, object_id=self.new.pk, bucket=self.bucket + 1, score=20)
+        self.assertEqual(self.ranking(self.bucket), [self.old.pk])
+        self.assertEqual(self.ranking(self.bucket + 1), [self.new.pk, self.old.pk])
+
+        # Bucket đã ra khỏi cửa sổ thì không còn trong top
+        later = self.bucket + trending.get_config()['WINDOW_HOURS']
+        self.assertEqual(self.ranking(later), [self.new.pk])
+
+    def test_update_top_does_not_merge_into_previous_hour(self):
+        TrendingBucket.objects.create(kind=trending.POST, object_id=self.old.pk, bucket=self.bucket, score=5)
+        cache.set(trending.cache_key(trending.POST), {'bucket': self.bucket - 1, 'items': [(self.new.pk, 100.0)]})
+        top = trending.update_top(trending.POST, [self.old.pk])
+        self.assertEqual(top['bucket'], self.bucket)
+        self.assertEqual([pk for pk, _ in top['items']], [self.old.pk])
+
+    def test_limit_must_be_between_one_and_top_k(self):
+        TrendingBucket.objects.create(kind=trending.POST, object_id=self.old.pk, bucket=self.bucket, score=5)
+        TrendingBucket.objects.create(kind=trending.POST, object_id=self.new.pk, bucket=self.bucket, score=9)
+        top_k = trending.get_config()['TOP_K']
+        for url in ('/posts/trending/', '/hashtags/trending/'):
+            for limit in (-5, 0, top_k + 1, 'x'):
+                self.assertEqual(client_for().get(f'{url}?limit={limit}').status_code, 400)
+        response = client_for().get('/posts/trending/?limit=1')
+        self.assertEqual([post['id'] for post in response.data], [self.new.pk])
+        self.assertEqual(client_for().get(f'/posts/trending/?limit={top_k}').status_code, 200)
+
+
+class BatchUserTests(TestCase):
+    def test_load_users_counts_each_relation_separately(self):
+        user, quiet = make_user('owner'), make_user('quiet')
+        others = [make_user(f'other{i}') for i in range(4)]
+        for other in others[:3]:
+            Follow.objects.create(follower=other, following=user)
+        for other in others:
+            Follow.objects.create(follower=user, following=other)
+        for other in others[:2]:
+            Report.objects.create(reporter=other, reported_user=user, content='spam')
+        Report.objects.create(reporter=user, reported_user=others[3], content='spam')
+
+        with self.assertNumQueries(5):
+            users = {u.id: u for u in batch.load_users([user.id, quiet.id])}
+        names = ['followers_count', 'following_count', 'reported_user_count', 'reporter_count']
+        self.assertEqual([getattr(users[user.id], name) for name in names], [3, 4, 2, 1])
+        self.assertEqual([getattr(users[quiet.id], name) for name in names], [0, 0, 0, 0])
+
+
+class BatchPostsTests(TestCase):
+    def setUp(self):
+        self.viewer = make_user('viewer')
+        self.hashtag = Hashtag.objects.create(hashtag='hue')
+        self.posts = []
+        for i in range(20):
+            author = make_user(f'author{i}')
+            post = make_post(author)
+            post.hashtags.add(self.hashtag)
+            Image.objects.create(post=post, image=f'posts/{i}.jpg')
+            Rating.objects.create(rater=self.viewer, post=post, stars=4)
+            for j in range(3):
+                commenter = make_user(f'commenter{i}-{j}')
+                comment = Comment.objects.create(user=commenter, post=post, content='a', confirmed=True)
+                for k in range(2):
+                    Comment.objects.create(user=author, post=post, content='b', parent_comment=comment,
+                                           confirmed=True)
+            self.posts.append(post)
+
+    def get(self, posts):
+        ids = ','.join(str(post.id) for post in posts)
+        users = ','.join(str(post.user_id) for post in posts)
+        return client_for(self.viewer).get(f'/posts/batch/?ids={ids}&users={users}')
+
+    def test_query_count_does_not_grow_with_the_number_of_posts(self):
+        # posts, hashtags, images, ratings, trang comment, số comment, 2 tầng reply, follower, like, 5 cho users
+        with self.assertNumQueries(15):
+            response = self.get(self.posts)
+        self.assertEqual(len(response.data['posts']), 20)
+        self.assertEqual(len(response.data['posts'][0]['comments']['results'][0]['replies']), 2)
+        with self.assertNumQueries(15):
+            self.get(self.posts[:10])
+
+    def test_without_window_functions_results_are_the_same(self):
+        expected = self.get(self.posts).data
+        with mock.patch.object(connection.features, 'supports_over_clause', False):
+            self.assertEqual(self.get(self.posts).data, expected)
+
+
+class HyperLogLogTests(SimpleTestCase):
+    precision = hll.DEFAULT_PRECISION
+
+    def sketch(self, values):
+        sketch = hll.HyperLogLog(self.precision)
+        for value in values:
+            sketch.add(value)
+        return sketch
+
+    def test_error_within_standard_error_bound(self):
+        for cardinality in (10, 100, 1000, 10000):
+            expected = hll.standard_error(cardinality, self.precision)
+            errors = [abs(self.sketch(f'user:{trial}:{i}' for i in range(cardinality)).count() - cardinality)
+                      / cardinality for trial in range(10)]
+            # Cùng giới hạn với manage.py bench_view_sketch; count() làm tròn nên cộng thêm 1/n
+            self.assertLessEqual(statistics.mean(errors), 1.5 * expected + 1 / cardinality, cardinality)
+            self.assertLessEqual(max(errors), 5 * expected + 1 / cardinality, cardinality)
+
+    def test_daily_sketches_merge_into_weekly_sketch(self):
+        week = self.sketch(f'user:{i}' for i in range(9000))
+        merged = hll.HyperLogLog(self.precision)
+        for day in range(7):
+            daily = self.sketch(f'user:{i}' for i in range(day * 1000, day * 1000 + 3000))
+            merged.merge(hll.HyperLogLog.from_bytes(daily.to_bytes()))
+        self.assertEqual(merged.registers, week.registers)
+
+    def test_reduce_matches_sketch_built_at_lower_precision(self):
+        values = [f'user:{i}' for i in range(5000)]
+        fine = hll.HyperLogLog(self.precision + 1)
+        for value in values:
+            fine.add(value)
+        self.assertEqual(fine.reduce(self.precision).registers, self.sketch(values).registers)
+
+    def test_footprint(self):
+        # Post ít người xem: sketch lưu trong DB chỉ vài chục byte, trong bộ nhớ là dict thưa
+        small = self.sketch(f'user:{i}' for i in range(10))
+        self.assertLess(len(small.to_bytes()), 64)
+        # Sketch đầy đủ không vượt quá 1 byte mỗi register
+        full = self.sketch(f'user:{i}' for i in range(100000))
+        self.assertLessEqual(len(full.to_bytes()), (1 << self.precision) + 1)
+
+        registers = {}
+        for i in range(10):
+            registers = viewstats.add_position(registers, *hll.position(f'user:{i}', self.precision))
+        self.assertIsInstance(registers, dict)
+        for i in range(1000):
+            registers = viewstats.add_position(registers, *hll.position(f'user:{i}', self.precision))
+        self.assertIsInstance(registers, hll.HyperLogLog)
+        self.assertEqual(len(registers.registers), 1 << self.precision)
+
+
+@override_settings(STORAGES={'default': {'BACKEND': 'Blog.storage.LocalMediaStorage'},
+                             'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}},
+                   MEDIA_SENDFILE_HEADER='')
+class LocalMediaStorageTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.enterContext(override_settings(MEDIA_ROOT=self.root))
+        self.storage = storage.LocalMediaStorage()
+
+    def files(self):
+        return sorted(os.path.relpath(os.path.join(directory, name), self.root)
+                      for directory, _, names in os.walk(self.root) for name in names)
+
+    def test_same_bytes_share_one_file_until_the_last_delete(self):
+        first = self.storage.save('posts/sapa.jpg', ContentFile(b'same bytes'))
+        second = self.storage.save('avatars/hue.JPG', ContentFile(b'same bytes'))
+        other = self.storage.save('posts/dalat.jpg', ContentFile(b'other bytes'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(self.files(), sorted([first, other]))
+
+        # Xoá ở một chỗ (vd: FieldFile.delete() của một ảnh) không làm hỏng chỗ còn lại
+        self.storage.delete(first)
+        self.assertTrue(self.storage.exists(first))
+        self.storage.delete(first)
+        self.assertFalse(self.storage.exists(first))
+        self.assertEqual(list(MediaBlob.objects.values_list('name', flat=True)), [other])
+        # Upload lại sau khi đã xoá hết thì file được ghi lại
+        self.assertEqual(self.storage.save('posts/sapa.jpg', ContentFile(b'same bytes')), first)
+        self.assertTrue(self.storage.exists(first))
+
+    def test_serve_media_ranges_and_conditional_get(self):
+        name = self.storage.save('posts/sapa.txt', ContentFile(b'0123456789'))
+        url = f'/media/{name}'
+        response = self.client.get(url)
+        self.assertEqual((response.status_code, b''.join(response.streaming_content)), (200, b'0123456789'))
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_RANGE='bytes=2-4')
+        self.assertEqual((response.status_code, response['Content-Range']), (206, 'bytes 2-4/10'))
+        self.assertEqual(b''.join(response.streaming_content), b'234')
+        response = self.client.get(url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        response = self.client.get(url, HTTP_RANGE='bytes=10-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */10'))
+        # If-Range không khớp: trả cả file
+        response = self.client.get(url, HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        empty = self.storage.save('posts/empty.txt', ContentFile(b''))
+        response = self.client.get(f'/media/{empty}', HTTP_RANGE='bytes=-5')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */0'))
+
+
+def cloudinary_upload(file, public_id, **options):
+    # Kết quả upload của Cloudinary, không gọi mạng
+    return {'resource_type': 'image', 'type': 'upload', 'version': 1716288080, 'public_id': public_id,
+            'format': 'gif'}
+
+
+@mock.patch('cloudinary.uploader.upload', side_effect=cloudinary_upload)
+class CKEditorStorageTests(TestCase):
+    gif = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00,'
+           b'\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(make_user('editor', is_staff=True))
+
+    def upload(self, filename):
+        response = self.client.post('/ckeditor/upload/', {'upload': SimpleUploadedFile(filename, self.gif, 'image/gif')})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_upload_and_browse_through_default_storage(self, upload):
+        self.assertIsInstance(ckeditor_storage, storage.CloudinaryStorage)
+        first = self.upload('Sa Pa.gif')
+        # Cùng nội dung: không upload lại, trả về cùng URL
+        self.assertEqual(self.upload('Đà Lạt.gif')['url'], first['url'])
+        self.assertEqual(upload.call_count, 1)
+        self.assertIn('res.cloudinary.com', first['url'])
+        self.assertIn('/ckeditors/images/', first['url'])
+
+        response = self.client.get('/ckeditor/browse/')
+        self.assertEqual(response.status_code, 200)
+        [browsed] = response.context['files']
+        self.assertTrue(browsed['is_image'])
+        self.assertTrue(browsed['src'].endswith(first['url'].split('/v1716288080/')[1]))
+
+    def test_open_exists_and_delete(self, upload):
+        name = ckeditor_storage.save('ckeditors/images/sapa.gif', SimpleUploadedFile('sapa.gif', self.gif))
+        # listdir trả về đường dẫn theo public_id, các hàm khác của storage đều nhận dạng tên này
+        self.assertEqual(ckeditor_storage.listdir('ckeditors'), (['images'], []))
+        directory = os.path.dirname(ckeditor_storage.public_path(name))
+        [filename] = ckeditor_storage.listdir(directory)[1]
+        path = os.path.join(directory, filename)
+        self.assertTrue(ckeditor_storage.exists(path))
+        self.assertEqual(ckeditor_storage.size(path), len(self.gif))
+
+        with mock.patch('Blog.storage.urlopen', return_value=BytesIO(self.gif)) as urlopen:
+            with ckeditor_storage.open(path) as f:
+                self.assertEqual(f.read(), self.gif)
+        self.assertEqual(urlopen.call_args.args[0], ckeditor_storage.url(path))
+
+        with mock.patch('cloudinary.uploader.destroy') as destroy:
+            ckeditor_storage.delete(name)
+        self.assertEqual(destroy.call_args.args[0], ckeditor_storage.public_path(name).rsplit('.', 1)[0])
+        self.assertFalse(MediaBlob.objects.exists())
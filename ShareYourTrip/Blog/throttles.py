@@ -0,0 +1,152 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LocMemBucketStore:
+    # Token bucket chính xác trong bộ nhớ của process, dùng cho dev và test
+    max_keys = 10000
+    # Quá ngưỡng này thì bỏ bucket cũ nhất kể cả khi chưa nạp đầy, để bộ nhớ có giới hạn khi bị rải key
+    hard_max_keys = 2 * max_keys
+
+    def __init__(self):
+        # Thứ tự theo lần dùng gần nhất (LRU): bucket cũ nhất nằm đầu
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate, now=None):
+        now = time.monotonic() if now is None else now
+        # Mỗi bucket lưu kèm thời gian nạp đầy của chính nó (capacity / refill_rate của scope đó)
+        full_after = capacity / refill_rate
+        with self.lock:
+            tokens, last, _ = self.buckets.pop(key, (capacity, now, full_after))
+            tokens = min(capacity, tokens + (now - last) * refill_rate)
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now, full_after)
+                allowed, wait = True, 0
+            else:
+                self.buckets[key] = (tokens, now, full_after)
+                allowed, wait = False, (1 - tokens) / refill_rate
+            if len(self.buckets) > self.max_keys:
+                self._prune(now)
+        return allowed, wait
+
+    def _prune(self, now):
+        # Chỉ xét từ đầu cũ nhất nên mỗi request tốn O(1) (khấu hao), không quét cả dict. Bucket đã đầy lại thì
+        # không cần giữ, lần sau tạo lại với đủ token. Mỗi bucket dùng thời gian nạp đầy của scope mình, bucket
+        # 5/hour không bị xoá sau 60s chỉ vì request hiện tại là 120/min
+        while len(self.buckets) > self.max_keys:
+            _, last, full_after = next(iter(self.buckets.values()))
+            if now - last < full_after and len(self.buckets) <= self.hard_max_keys:
+                break
+            self.buckets.popitem(last=False)
+
+    def reset(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class CacheBucketStore:
+    # Dùng cho production với cache dùng chung (Redis/Memcached): mỗi request là một lệnh incr nguyên tử.
+    # Bucket được xấp xỉ bằng cửa sổ trượt giữa hai bộ đếm liền kề.
+    def consume(self, key, capacity, refill_rate, now=None):
+        now = time.time() if now is None else now
+        window = capacity / refill_rate
+        index = int(now // window)
+        current_key = f'throttle:{key}:{index}'
+        cache.add(current_key, 0, timeout=int(window * 2) + 1)
+        try:
+            count = cache.incr(current_key)
+        except ValueError:
+            # Key vừa hết hạn giữa add và incr
+            cache.add(current_key, 1, timeout=int(window * 2) + 1)
+            count = 1
+        previous = cache.get(f'throttle:{key}:{index - 1}', 0)
+        elapsed = (now % window) / window
+        estimated = previous * (1 - elapsed) + count
+        if estimated <= capacity:
+            return True, 0
+        return False, window * (1 - elapsed)
+
+    def reset(self):
+        pass
+
+
+_store = None
+_metrics = defaultdict(lambda: {'allowed': 0, 'throttled': 0})
+_metrics_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = import_string(getattr(settings, 'THROTTLE_STORE', 'Blog.throttles.LocMemBucketStore'))()
+    return _store
+
+
+def record(scope, allowed):
+    with _metrics_lock:
+        _metrics[scope]['allowed' if allowed else 'throttled'] += 1
+
+
+def throttle_metrics():
+    with _metrics_lock:
+        return {scope: dict(counts) for scope, counts in _metrics.items()}
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    # Dùng lại cách khai báo rate 'num/period' của DRF: num là dung lượng bucket,
+    # token được nạp lại đều với tốc độ num/period
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        allowed, self._wait = get_store().consume(self.key, self.num_requests, self.num_requests / self.duration)
+        record(self.scope, allowed)
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class AnonTokenBucketThrottle(TokenBucketThrottle):
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class ScopedTokenBucketThrottle(UserTokenBucketThrottle):
+    # Giới hạn theo từng endpoint, scope lấy từ view.throttle_scope
+    scope_attr = 'throttle_scope'
+
+    def __init__(self):
+        pass
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
@@ -0,0 +1,223 @@
+import heapq
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import ExpressionWrapper, F, FloatField, Sum, Value
+from django.db.models.functions import Mod, Power
+
+from Blog import counters
+from Blog.models import Post, TrendingBucket
+
+POST = 'post'
+HASHTAG = 'hashtag'
+KINDS = (POST, HASHTAG)
+
+DEFAULTS = {
+    # Điểm của mỗi loại tương tác
+    'WEIGHTS': {'comment': 3, 'rating': 2, 'like': 1, 'follow': 1},
+    # Sau HALF_LIFE_HOURS giờ điểm của một tương tác còn một nửa
+    'HALF_LIFE_HOURS': 12,
+    # Chỉ tính các bucket trong WINDOW_HOURS giờ gần nhất
+    'WINDOW_HOURS': 72,
+    # Bucket 1 giờ cũ hơn COMPACT_AFTER_HOURS được gộp thành bucket COMPACT_BUCKET_HOURS giờ
+    'COMPACT_AFTER_HOURS': 24,
+    'COMPACT_BUCKET_HOURS': 6,
+    'TOP_K': 100,
+    # Giây giữa hai lần ghi buffer xuống DB, 0: ghi ngay
+    'FLUSH_INTERVAL': 10,
+    # Buffer đủ chừng này post thì ghi ngay, để bộ nhớ luôn bị chặn trên
+    'MAX_PENDING': 10000,
+    # Top-K trong cache được tính lại sau chừng này giây (và khi sang giờ mới). Với cache riêng từng process
+    # (LocMemCache) đây là độ trễ tối đa để thấy tương tác được ghi bởi process khác
+    'CACHE_SECONDS': 300,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'TRENDING', {}))
+    return config
+
+
+def current_bucket(now=None):
+    return int((now or time.time()) // 3600)
+
+
+def cache_key(kind):
+    return f'trending:{kind}'
+
+
+def decayed_score(ref_bucket, half_life):
+    # Tổng điểm các bucket, mỗi bucket nhân 0.5^(tuổi / half_life) với tuổi tính theo ref_bucket
+    age = ExpressionWrapper((Value(ref_bucket) - F('bucket')) / Value(float(half_life)), output_field=FloatField())
+    return Sum(F('score') * Power(Value(0.5), age), output_field=FloatField())
+
+
+def scores(kind, ref_bucket, ids=None, limit=None):
+    config = get_config()
+    queryset = TrendingBucket.objects.filter(kind=kind, bucket__gt=ref_bucket - config['WINDOW_HOURS'])
+    if ids is not None:
+        queryset = queryset.filter(object_id__in=ids)
+    queryset = (queryset.values('object_id')
+                .annotate(trend=decayed_score(ref_bucket, config['HALF_LIFE_HOURS']))
+                .order_by('-trend', 'object_id'))
+    if limit is not None:
+        queryset = queryset[:limit]
+    return [(row['object_id'], row['trend']) for row in queryset]
+
+
+def refresh(kind, now=None):
+    # Tính lại toàn bộ top-K bằng một câu GROUP BY ... ORDER BY ... LIMIT K trong DB
+    config = get_config()
+    ref_bucket = current_bucket(now)
+    top = {'bucket': ref_bucket, 'items': scores(kind, ref_bucket, limit=config['TOP_K'])}
+    cache.set(cache_key(kind), top, config['CACHE_SECONDS'])
+    return top
+
+
+def cached_top(kind, now=None):
+    # Top-K tính theo giờ trước không còn đúng: bucket cũ đã ra khỏi cửa sổ và decay đã đổi
+    top = cache.get(cache_key(kind))
+    if top is None or top['bucket'] != current_bucket(now):
+        return None
+    return top
+
+
+def update_top(kind, ids):
+    # Cập nhật tăng dần: chỉ tính lại điểm của các object vừa có tương tác rồi trộn vào top-K đang cache.
+    # Hệ số decay như nhau với mọi object nên điểm tính theo cùng ref_bucket vẫn so sánh được với nhau
+    top = cached_top(kind)
+    if top is None:
+        return refresh(kind)
+    config = get_config()
+    merged = dict(top['items'])
+    merged.update(scores(kind, top['bucket'], ids=ids))
+    top['items'] = heapq.nlargest(config['TOP_K'], merged.items(), key=lambda item: (item[1], -item[0]))
+    cache.set(cache_key(kind), top, config['CACHE_SECONDS'])
+    return top
+
+
+def top(kind, limit, now=None):
+    data = cached_top(kind, now)
+    if data is None:
+        data = refresh(kind, now)
+    return [(object_id, score) for object_id, score in data['items'] if score > 0][:limit]
+
+
+def _add_to_bucket(kind, bucket, deltas):
+    if not deltas:
+        return
+    # Tạo sẵn các dòng còn thiếu rồi cộng dồn bằng UPDATE, mỗi giá trị delta một câu như CounterBuffer
+    TrendingBucket.objects.bulk_create([TrendingBucket(kind=kind, object_id=object_id, bucket=bucket)
+                                        for object_id in deltas], ignore_conflicts=True)
+    by_delta = defaultdict(list)
+    for object_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(object_id)
+    for delta, ids in by_delta.items():
+        TrendingBucket.objects.filter(kind=kind, bucket=bucket, object_id__in=ids).update(score=F('score') + delta)
+
+
+def write_scores(post_deltas, now=None):
+    bucket = current_bucket(now)
+    hashtag_deltas = defaultdict(float)
+    through = Post.hashtags.through
+    for post_id, hashtag_id in through.objects.filter(post_id__in=list(post_deltas)).values_list('post_id', 'hashtag_id'):
+        hashtag_deltas[hashtag_id] += post_deltas[post_id]
+    with transaction.atomic():
+        _add_to_bucket(POST, bucket, post_deltas)
+        _add_to_bucket(HASHTAG, bucket, hashtag_deltas)
+    return {POST: list(post_deltas), HASHTAG: list(hashtag_deltas)}
+
+
+class EventBuffer:
+    # Gom điểm tương tác theo post trong bộ nhớ, ghi xuống bucket giờ hiện tại theo lô
+    def __init__(self):
+        self.deltas = defaultdict(float)
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def add(self, post_id, score):
+        config = get_config()
+        interval = config['FLUSH_INTERVAL']
+        with self.lock:
+            self.deltas[post_id] += score
+            full = len(self.deltas) >= config['MAX_PENDING']
+            if interval and not full and self.timer is None:
+                self.timer = threading.Timer(interval, self._flush_in_timer)
+                self.timer.daemon = True
+                self.timer.start()
+        if not interval or full:
+            self.flush()
+
+    def _flush_in_timer(self):
+        with self.lock:
+            self.timer = None
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        with self.lock:
+            deltas, self.deltas = self.deltas, defaultdict(float)
+        deltas = {post_id: delta for post_id, delta in deltas.items() if delta}
+        if not deltas:
+            return 0
+        touched = write_scores(deltas)
+        for kind, ids in touched.items():
+            if ids:
+                update_top(kind, ids)
+        return len(deltas)
+
+
+events = counters.register(EventBuffer())
+
+
+def record(event, post_id, count=1):
+    # event: comment, rating, like, follow; count âm khi tương tác bị huỷ (bỏ like)
+    events.add(post_id, get_config()['WEIGHTS'][event] * count)
+
+
+def record_follow(user_id):
+    # Follow tác giả được tính cho bài đăng mới nhất của tác giả
+    post_id = Post.objects.filter(user_id=user_id).order_by('-id').values_list('id', flat=True).first()
+    if post_id is not None:
+        record('follow', post_id)
+
+
+def compact(now=None):
+    config = get_config()
+    now_bucket = current_bucket(now)
+    # Bỏ các bucket đã ra khỏi cửa sổ, xoá theo lô
+    from Blog import cleanup
+
+    expired = cleanup.purge(TrendingBucket.objects.filter(bucket__lte=now_bucket - config['WINDOW_HOURS']))
+
+    # Gộp các bucket 1 giờ đã cũ thành bucket lớn hơn, mỗi bucket lớn một transaction. Điểm được quy về
+    # thời điểm đầu bucket lớn (nhân 2^(lệch / half_life)) để decay sau khi gộp không đổi
+    size = config['COMPACT_BUCKET_HOURS']
+    half_life = float(config['HALF_LIFE_HOURS'])
+    limit = (now_bucket - config['COMPACT_AFTER_HOURS']) // size * size
+    coarse_buckets = (TrendingBucket.objects
+                      .filter(bucket__lt=limit)
+                      .annotate(offset=Mod('bucket', size)).filter(offset__gt=0)
+                      .annotate(coarse=F('bucket') - F('offset'))
+                      .values_list('coarse', flat=True).distinct().order_by('coarse'))
+    merged = 0
+    for coarse in list(coarse_buckets):
+        shift = ExpressionWrapper((F('bucket') - Value(coarse)) / Value(half_life), output_field=FloatField())
+        with transaction.atomic():
+            rows = TrendingBucket.objects.filter(bucket__gte=coarse, bucket__lt=coarse + size)
+            totals = list(rows.values('kind', 'object_id')
+                          .annotate(total=Sum(F('score') * Power(Value(2.0), shift), output_field=FloatField()))
+                          .order_by())
+            merged += rows.delete()[0]
+            TrendingBucket.objects.bulk_create([TrendingBucket(kind=row['kind'], object_id=row['object_id'],
+                                                               bucket=coarse, score=row['total'])
+                                                for row in totals])
+    return expired, merged
@@ -17,4 +17,7 @@ r.register('rating', views.RatingViewSet, 'rating')
 urlpatterns = [
     path('', include(r.urls)),
     path('api/logout', views.logout, name='logout'),
+    path('metrics/throttles/', views.throttle_metrics, name='throttle-metrics'),
+    path('metrics/tasks/', views.task_metrics, name='task-metrics'),
+    path('media/<path:name>', views.serve_media, name='media'),
 ]
\ No newline at end of file
@@ -1,40 +1,244 @@
-from django.db.models import Q
-from django.contrib.auth.hashers import make_password
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+import time
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.views.decorators.http import require_safe
+from django.db.models import Max, Prefetch, Q
 from rest_framework import viewsets, generics, parsers, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from Blog.models import Post, Hashtag, Comment, Rating, User, Like, Follow, Report, Group, Image
-from Blog import serializers, paginators, perms
+from django.db import IntegrityError
+from Blog.models import Post, Hashtag, Comment, Rating, User, Like, Follow, Report, Group, Image, GroupMessage, GroupReadReceipt, JoinRequest, ArchivedPost
+from Blog import serializers, paginators, perms, moderation, throttles, counters, routers, tasks, geo, trending, batch, viewstats
 from django.shortcuts import get_object_or_404
-from rest_framework.exceptions import PermissionDenied
-from rest_framework.decorators import api_view
+from django.http import Http404
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework import status
-from oauth2_provider.models import AccessToken
+from oauth2_provider.models import AccessToken, RefreshToken
+from django.utils import timezone
 from Blog.serializers import CommentSerializer
 
 
+def filter_confirmed(query_set, request):
+    # Đọc công khai chỉ thấy comment đã được duyệt. Staff xem hàng chờ duyệt bằng ?confirmed=false.
+    # Lọc trực tiếp trên index (post, active, confirmed)
+    confirmed = request.query_params.get('confirmed')
+    if confirmed is None or not request.user.is_staff:
+        return query_set.filter(confirmed=True)
+    return query_set.filter(confirmed=confirmed.lower() in ('1', 'true'))
+
+
+def parse_trending_limit(request):
+    # ?limit= trong khoảng 1..TOP_K, None nếu không hợp lệ
+    top_k = trending.get_config()['TOP_K']
+    try:
+        limit = int(request.query_params.get('limit', min(10, top_k)))
+    except ValueError:
+        return None
+    return limit if 1 <= limit <= top_k else None
+
+
+def parse_ids(value):
+    # "1,2,3" -> [1, 2, 3], bỏ trùng nhưng giữ thứ tự
+    if not value:
+        return []
+    return list(dict.fromkeys(int(part) for part in value.split(',') if part.strip()))
+
 
 @api_view(['DELETE'])
 def logout(request):
     try:
         token = request.headers.get('Authorization').split(' ')[1]
         access_token = AccessToken.objects.get(token=token)
+        # Thu hồi refresh token ngay để không thể xin lại access token, phần dọn dẹp còn lại chạy nền
+        RefreshToken.objects.filter(access_token=access_token).update(revoked=timezone.now())
         access_token.delete()
+        if access_token.user_id:
+            tasks.cleanup_user_tokens.delay(access_token.user_id)
         return Response(status=status.HTTP_204_NO_CONTENT)
     except AccessToken.DoesNotExist:
         return Response(status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def throttle_metrics(request):
+    return Response(throttles.throttle_metrics(), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def task_metrics(request):
+    try:
+        window = max(1, int(request.query_params.get('window', 60)))
+    except ValueError:
+        return Response({"detail": "window must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(tasks.task_metrics(window), status=status.HTTP_200_OK)
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    # Chỉ đọc length byte kể từ vị trí hiện tại của file, dùng cho response 206
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    # Một khoảng "bytes=a-b", "bytes=a-" hoặc "bytes=-n". None: header không dùng được, trả cả file;
+    # ValueError: khoảng nằm ngoài file (416)
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        # File rỗng không có byte cuối nào để lấy
+        if int(end) == 0 or size == 0:
+            raise ValueError(header)
+        return max(0, size - int(end)), size - 1
+    start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+@require_safe
+def serve_media(request, name):
+    # File của LocalMediaStorage. Tên file là sha256 nội dung nên file không bao giờ đổi: ETag là digest và
+    # được cache vĩnh viễn. Cả file đi qua wsgi.file_wrapper (sendfile), Range được đọc theo block
+    if not isinstance(default_storage, FileSystemStorage):
+        raise Http404
+    try:
+        path = default_storage.path(name)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(path):
+        raise Http404
+    etag = f'"{posixpath.splitext(posixpath.basename(name))[0]}"'
+    headers = {'ETag': etag, 'Cache-Control': 'public, max-age=31536000, immutable', 'Accept-Ranges': 'bytes'}
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    elif settings.MEDIA_SENDFILE_HEADER:
+        # nginx/Apache tự gửi file và xử lý Range
+        response = HttpResponse(content_type=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        if settings.MEDIA_SENDFILE_HEADER.lower() == 'x-accel-redirect':
+            response[settings.MEDIA_SENDFILE_HEADER] = settings.MEDIA_SENDFILE_PREFIX + name
+        else:
+            response[settings.MEDIA_SENDFILE_HEADER] = path
+    else:
+        response = file_response(request, path, etag)
+    for key, value in headers.items():
+        response[key] = value
+    return response
+
+
+def file_response(request, path, etag):
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    size = os.path.getsize(path)
+    header = request.headers.get('Range')
+    if header and request.headers.get('If-Range', etag) == etag:
+        try:
+            byte_range = parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is not None:
+            start, end = byte_range
+            f = open(path, 'rb')
+            f.seek(start)
+            response = FileResponse(RangeFile(f, end - start + 1), status=status.HTTP_206_PARTIAL_CONTENT,
+                                    content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+            return response
+    return FileResponse(open(path, 'rb'), content_type=content_type)
+
+
+poll_slots = threading.BoundedSemaphore(getattr(settings, 'GROUP_CHAT_MAX_POLLERS', 16))
+
+
+def parse_list_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    return {item.strip() for item in value.split(',') if item.strip()}
+
+
+class ReplicaReadMixin:
+    # list/retrieve đọc từ replica, trừ khi user vừa ghi dữ liệu (read-your-writes)
+    replica_actions = ['list', 'retrieve']
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.replica_actions and not routers.is_sticky(request):
+            self._replica_token = routers.set_use_replica(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            routers.reset_use_replica(token)
+            self._replica_token = None
+        if request.method not in permissions.SAFE_METHODS and response.status_code < 400:
+            routers.mark_sticky(request, response)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class SparseFieldsViewMixin:
+    # Đọc ?fields= và ?expand=, truyền cho serializer và thu hẹp queryset bằng .only()
+    def get_sparse_kwargs(self):
+        if self.request.method != 'GET':
+            return {}
+        return {'fields': parse_list_param(self.request, 'fields'),
+                'expand': parse_list_param(self.request, 'expand')}
+
+    def get_serializer(self, *args, **kwargs):
+        for key, value in self.get_sparse_kwargs().items():
+            kwargs.setdefault(key, value)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_sparse_serializer(self, serializer_class=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        return serializer_class(context=self.get_serializer_context(), **self.get_sparse_kwargs())
+
+    def sparse_columns(self, serializer_class=None):
+        return self.get_sparse_serializer(serializer_class).model_columns()
+
+
+def scoped_throttles(view, scope):
+    view.throttle_scope = scope
+    return [throttles.ScopedTokenBucketThrottle()] + [throttle() for throttle in view.throttle_classes]
+
 # /posts/
 # /posts/?q=
 # /posts/{id}/
 # /post/{id}/comments/ (post)
 
-class PostViewSet(viewsets.ViewSet, generics.ListAPIView, generics.RetrieveAPIView, generics.CreateAPIView):
-    queryset = Post.objects.filter(active=True)
+class PostViewSet(ReplicaReadMixin, SparseFieldsViewMixin, viewsets.ViewSet, generics.ListAPIView, generics.RetrieveAPIView, generics.CreateAPIView):
+    queryset = Post.objects.all()
     serializer_class = serializers.PostSerializer
     pagination_class = paginators.PostPaginator
+    replica_actions = ['list', 'retrieve', 'batch']
 
     def get_serializer_class(self):
         if hasattr(self, 'kwargs') and 'pk' in self.kwargs:
@@ -46,15 +250,89 @@ class PostViewSet(viewsets.ViewSet, generics.ListAPIView, generics.RetrieveAPIVi
 
 
     def get_queryset(self):
-        query_set = self.queryset
+        query_set = self.queryset.all()
         if self.action == 'list':
             q = self.request.query_params.get('q')
             if q:
                 query_set = query_set.filter(Q(title__icontains=q) | Q(description__icontains=q) | Q(starting_point__icontains=q) | Q(end_point__icontains=q))
+            query_set = self.filter_geo(query_set)
         if self.action == 'retrieve':
-            query_set = Post.objects.prefetch_related('hashtags', 'user').filter(active=True)
+            query_set = Post.objects.all()
+        if self.action in ['list', 'retrieve', 'trending']:
+            serializer = self.get_sparse_serializer()
+            columns = serializer.model_columns()
+            query_set = query_set.only(*columns)
+            if 'user' in columns:
+                query_set = query_set.select_related('user')
+            if {'hashtags', 'hashtags_read'} & set(serializer.fields):
+                query_set = query_set.prefetch_related(Prefetch('hashtags', queryset=Hashtag.objects.all()))
+            if 'ratings' in serializer.fields:
+                query_set = query_set.prefetch_related('ratings')
+        return query_set
+
+    def filter_geo(self, query_set):
+        # ?near=lat,lng&radius=km (điểm đi), ?near_end=lat,lng (điểm đến), ?route=lat,lng;lat,lng&corridor=km
+        params = self.request.query_params
+        try:
+            radius = min(float(params.get('radius', settings.GEO_DEFAULT_RADIUS_KM)), settings.GEO_MAX_RADIUS_KM)
+            corridor = min(float(params.get('corridor', settings.GEO_DEFAULT_CORRIDOR_KM)), settings.GEO_MAX_RADIUS_KM)
+            near = geo.parse_point(params['near']) if params.get('near') else None
+            near_end = geo.parse_point(params['near_end']) if params.get('near_end') else None
+            route = geo.parse_route(params['route']) if params.get('route') else None
+        except ValueError:
+            raise ValidationError({"detail": "near and near_end must be lat,lng; route must be lat,lng;lat,lng;..."})
+        if radius <= 0 or corridor <= 0:
+            raise ValidationError({"detail": "radius and corridor must be positive."})
+        if route and len(route) > settings.GEO_MAX_ROUTE_POINTS:
+            raise ValidationError({"detail": f"route must have at most {settings.GEO_MAX_ROUTE_POINTS} points."})
+        ordering = []
+        if near:
+            query_set = geo.within_radius(query_set, 'start', *near, radius)
+            ordering.append('start_distance')
+        if near_end:
+            query_set = geo.within_radius(query_set, 'end', *near_end, radius)
+            ordering.append('end_distance')
+        if route:
+            query_set = geo.along_route(query_set, route, corridor)
+        if ordering:
+            query_set = query_set.order_by(*ordering, 'id')
         return query_set
 
+    def get_throttles(self):
+        if self.action.__eq__('comment_handle') and self.request.method.__eq__('POST'):
+            return scoped_throttles(self, 'comments')
+        return super().get_throttles()
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        posts = page if page is not None else queryset
+        context = self.get_serializer_context()
+        # Một query duy nhất cho "đã like chưa" của cả trang
+        context['liked_post_ids'] = set()
+        if request.user.is_authenticated and 'liked' in self.get_sparse_serializer().fields:
+            context['liked_post_ids'] = set(Like.objects.filter(user=request.user, post_id__in=[p.id for p in posts])
+                                            .values_list('post_id', flat=True))
+        serializer = self.get_serializer_class()(posts, many=True, context=context, **self.get_sparse_kwargs())
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        # Link trực tiếp tới bài đăng đã được archive vẫn đọc được từ bảng archive
+        try:
+            post = self.get_object()
+        except Http404:
+            # Bài đăng bị ẩn trước khi archive vẫn trả 404
+            archived = ArchivedPost.objects.filter(pk=kwargs.get('pk'), active=True).first()
+            if archived is None:
+                raise
+            fields = serializers.PostDetailSerializer(context=self.get_serializer_context()).fields
+            return Response(archived.to_representation(fields), status=status.HTTP_200_OK)
+        # Lượt xem được gom trong bộ nhớ và ghi theo lô (Blog.viewstats), không ghi DB trong request
+        viewstats.record(post, request)
+        return Response(self.get_serializer(post).data)
+
     def perform_create(self, serializer):
         if not self.request.user.is_authenticated:
             raise PermissionDenied()
@@ -80,21 +358,111 @@ class PostViewSet(viewsets.ViewSet, generics.ListAPIView, generics.RetrieveAPIVi
                 content=content,
                 parent_comment=parent_comment
             )
+            moderation.submit(comment)
+            trending.record('comment', comment.post_id)
             return Response(CommentSerializer(comment).data, status=status.HTTP_201_CREATED)
         elif request.method.__eq__('GET'):
-            comments = self.get_object().comment_set.order_by('-id').filter(parent_comment__isnull=True).select_related('user')
+            columns = self.sparse_columns(serializers.CommentSerializer)
+            comments = Comment.objects.filter(post=self.get_object()).order_by('-id').filter(parent_comment__isnull=True).only(*columns)
+            if 'user' in columns:
+                comments = comments.select_related('user')
+            comments = filter_confirmed(comments, request)
             paginator = paginators.CommentPaginator()
             page = paginator.paginate_queryset(comments, request)
             if page is not None:
-                serializer = serializers.CommentSerializer(page, many=True)
+                serializer = serializers.CommentSerializer(page, many=True, **self.get_sparse_kwargs())
                 return paginator.get_paginated_response(serializer.data)
 
-            return Response(serializers.CommentSerializer(comments, many=True).data, status=status.HTTP_200_OK)
+            return Response(serializers.CommentSerializer(comments, many=True, **self.get_sparse_kwargs()).data, status=status.HTTP_200_OK)
+
+    @action(methods=['put', 'delete'], url_path='like', detail=True)
+    def like(self, request, pk):
+        # PUT: like, DELETE: bỏ like. Gọi lại nhiều lần vẫn cho cùng kết quả
+        if not request.user.is_authenticated:
+            raise PermissionDenied()
+        post = self.get_object()
+        if request.method.__eq__('PUT'):
+            changed = Like.like(request.user, post)
+            delta = changed
+        else:
+            changed = Like.unlike(request.user, post)
+            delta = -changed
+        if delta:
+            counters.like_counter.add(post.id, delta)
+            trending.record('like', post.id, delta)
+        # Đọc lại sau khi add: delta có thể đã được flush xuống DB ngay (hoặc bởi timer) trước khi trả lời
+        post.refresh_from_db(fields=['like_count'])
+        like_count = post.like_count + counters.like_counter.pending(post.id)
+        return Response({'liked': request.method.__eq__('PUT'), 'like_count': like_count}, status=status.HTTP_200_OK)
+
+    @action(methods=['get'], detail=False)
+    def trending(self, request):
+        # Top-K đã tính sẵn (Blog.trending), chỉ load các post trong top theo id
+        limit = parse_trending_limit(request)
+        if limit is None:
+            return Response({"detail": f"limit must be an integer between 1 and {trending.get_config()['TOP_K']}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        ranking = trending.top(trending.POST, limit)
+        posts = self.get_queryset().in_bulk([post_id for post_id, _ in ranking])
+        ordered = [posts[post_id] for post_id, _ in ranking if post_id in posts]
+        context = self.get_serializer_context()
+        context['liked_post_ids'] = set()
+        if request.user.is_authenticated and 'liked' in self.get_sparse_serializer().fields:
+            context['liked_post_ids'] = set(Like.objects.filter(user=request.user, post_id__in=list(posts))
+                                            .values_list('post_id', flat=True))
+        data = serializers.PostSerializer(ordered, many=True, context=context, **self.get_sparse_kwargs()).data
+        scores = dict(ranking)
+        for post, rep in zip(ordered, data):
+            rep['trending_score'] = round(scores[post.id], 3)
+        return Response(data, status=status.HTTP_200_OK)
+
+    @action(methods=['get'], detail=False)
+    def batch(self, request):
+        # /posts/batch/?ids=1,2,3&users=4,5: dữ liệu màn chi tiết của nhiều post (ảnh, trang comment đầu,
+        # rating, tác giả) trong một response, nạp bằng các query id__in thay vì gọi từng view
+        try:
+            post_ids = parse_ids(request.query_params.get('ids'))
+            user_ids = parse_ids(request.query_params.get('users'))
+        except ValueError:
+            return Response({"detail": "ids and users must be comma-separated integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(post_ids) > settings.BATCH_MAX_IDS or len(user_ids) > settings.BATCH_MAX_IDS:
+            return Response({"detail": f"At most {settings.BATCH_MAX_IDS} ids per request."}, status=status.HTTP_400_BAD_REQUEST)
+
+        posts, related = batch.load_posts(post_ids, request.user, paginators.CommentPaginator.page_size)
+        context = self.get_serializer_context()
+        context['liked_post_ids'] = related['liked']
+        data = serializers.PostDetailSerializer(posts, many=True, context=context).data
+        for post, rep in zip(posts, data):
+            rating = related['ratings'].get(post.id, {})
+            rep['images'] = serializers.ImageSerializer(post.images.all(), many=True).data
+            rep['comments'] = {
+                'count': related['comment_counts'].get(post.id, 0),
+                'results': serializers.CommentSerializer(related['comments'][post.id], many=True).data,
+            }
+            rep['rating'] = {'average_rating': rating.get('average') or 0, 'count': rating.get('count', 0)}
+        users = serializers.UserSerializer(batch.load_users(user_ids), many=True).data if user_ids else []
+        return Response({'posts': data, 'users': users}, status=status.HTTP_200_OK)
+
+    @action(methods=['get'], detail=True, permission_classes=[perms.OwnerAuthenticated])
+    def stats(self, request, pk):
+        # ?days=30&period=day|week|month, chỉ chủ bài đăng
+        post = self.get_object()
+        period = request.query_params.get('period', 'day')
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            return Response({"detail": "days must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        if period not in viewstats.PERIODS or not 1 <= days <= settings.VIEW_STATS_MAX_DAYS:
+            return Response({"detail": f"period must be one of {', '.join(viewstats.PERIODS)}; "
+                                       f"days must be between 1 and {settings.VIEW_STATS_MAX_DAYS}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(viewstats.stats(post, days, period), status=status.HTTP_200_OK)
 
     @action(methods=['get'], url_path='images', detail=True)
     def images_handle(self, request, pk):
             images = self.get_object().images.order_by('-id')
-            return Response(serializers.ImageSerializer(images, many=True).data, status=status.HTTP_200_OK)
+            images = images.only(*self.sparse_columns(serializers.ImageSerializer))
+            return Response(serializers.ImageSerializer(images, many=True, **self.get_sparse_kwargs()).data, status=status.HTTP_200_OK)
 
     @action(methods=['get'], detail=True, url_path='average_rating')
     def average_rating(self, request, pk=None):
@@ -107,20 +475,31 @@ class PostViewSet(viewsets.ViewSet, generics.ListAPIView, generics.RetrieveAPIVi
 
 # /hashtags/
 # /hashtags/?q=
-class HashtagViewSet(viewsets.ViewSet, generics.ListAPIView, generics.CreateAPIView):
+class HashtagViewSet(ReplicaReadMixin, viewsets.ViewSet, generics.ListAPIView, generics.CreateAPIView):
     queryset = Hashtag.objects.all()
     serializer_class = serializers.HashtagSerializer
 
     def get_queryset(self):
-        query_set = self.queryset
+        query_set = self.queryset.all()
         if self.action == 'list':
             q = self.request.query_params.get('q')
             if q:
                 query_set = query_set.filter(hashtag__icontains=q)
         return query_set
 
+    @action(methods=['get'], detail=False)
+    def trending(self, request):
+        limit = parse_trending_limit(request)
+        if limit is None:
+            return Response({"detail": f"limit must be an integer between 1 and {trending.get_config()['TOP_K']}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        ranking = trending.top(trending.HASHTAG, limit)
+        hashtags = Hashtag.objects.in_bulk([hashtag_id for hashtag_id, _ in ranking])
+        return Response([dict(serializers.HashtagSerializer(hashtags[hashtag_id]).data, trending_score=round(score, 3))
+                         for hashtag_id, score in ranking if hashtag_id in hashtags], status=status.HTTP_200_OK)
+
 
-class UserViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.RetrieveAPIView):
+class UserViewSet(ReplicaReadMixin, SparseFieldsViewMixin, viewsets.ViewSet, generics.CreateAPIView, generics.RetrieveAPIView):
     queryset = User.objects.filter(is_active=True)
     serializer_class = serializers.UserSerializer
     parser_classes = [parsers.MultiPartParser,]
@@ -130,22 +509,20 @@ class UserViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.RetrieveAPI
             return [permissions.IsAuthenticated()]
         else:
             return [permissions.AllowAny()]
-        
-    def get_queryset(self):
-        query_set = self.queryset
-        if self.action.__eq__('retrieve'):
-            query_set = User.objects
-        return query_set
 
+    def get_throttles(self):
+        if self.action.__eq__('create'):
+            return scoped_throttles(self, 'register')
+        return super().get_throttles()
+        
     @action(methods=['get', 'patch'], url_path='current-user', detail=False)
     def current_user(self, request):
         user = request.user
         if request.method.__eq__('PATCH'):
-            for k, v in request.data.items():
-                setattr(user, k, v)
-                user.password = make_password(request.data.get('password'))
-                user.save()
-        return Response(serializers.UserSerializer(user).data)
+            serializer = serializers.UserSerializer(user, data=request.data, partial=True)
+            serializer.is_valid(raise_exception=True)
+            user = serializer.save()
+        return Response(serializers.UserSerializer(user, **self.get_sparse_kwargs()).data)
 
     @action(methods=['post'], detail=True)
     def block_user(self, request, pk=None):
@@ -155,7 +532,7 @@ class UserViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.RetrieveAPI
         return Response({'message': 'User blocked successfully'})
 
 
-class CommentViewSet(viewsets.ViewSet, generics.RetrieveUpdateDestroyAPIView):
+class CommentViewSet(ReplicaReadMixin, SparseFieldsViewMixin, viewsets.ViewSet, generics.RetrieveUpdateDestroyAPIView):
     queryset = Comment.objects.all()
     serializer_class = serializers.CommentSerializer
 
@@ -165,7 +542,10 @@ class CommentViewSet(viewsets.ViewSet, generics.RetrieveUpdateDestroyAPIView):
         post_id = self.request.query_params.get('postId')
         if post_id:
             queryset = queryset.filter(post_id=post_id, parent_comment__isnull=True).order_by('-created_date')
-        return queryset
+        if self.request.method not in permissions.SAFE_METHODS:
+            # Tác giả vẫn sửa/xoá được comment đang chờ duyệt của mình
+            return queryset
+        return filter_confirmed(queryset, self.request)
     
     def get_permissions(self):
         if self.action.__eq__('list'):
@@ -184,45 +564,182 @@ class CommentViewSet(viewsets.ViewSet, generics.RetrieveUpdateDestroyAPIView):
         comment = self.get_object()
         if comment.user == request.user:
             comment.content = request.data.get('content')
+            comment.confirmed = False
             comment.save()
+            moderation.submit(comment)
             return Response(serializers.CommentSerializer(comment).data, status=status.HTTP_201_CREATED)
         else:
             return Response(status=status.HTTP_403_FORBIDDEN)
 
 
-class GroupViewSet(viewsets.ModelViewSet, generics.CreateAPIView, generics.RetrieveAPIView):
+# /group/{id}/messages/ (get, post)
+# /group/{id}/messages/poll/?after=
+# /group/{id}/messages/read/ (post)
+# /group/{id}/join/ (post)
+# /group/{id}/join-requests/?status= (get)
+# /group/{id}/join-requests/bulk/ (post)
+class GroupViewSet(ReplicaReadMixin, viewsets.ModelViewSet, generics.CreateAPIView, generics.RetrieveAPIView):
     queryset = Group.objects.all()
     serializer_class = serializers.GroupSerializer
 
-class ReportViewSet(viewsets.ViewSet,generics.CreateAPIView, generics.ListAPIView):
+    def get_permissions(self):
+        if self.action in ['messages', 'poll_messages', 'read_messages']:
+            return [perms.GroupMember()]
+        if self.action in ['update', 'partial_update', 'destroy', 'join_requests', 'bulk_join_requests']:
+            return [perms.GroupOwner()]
+        if self.action in ['join', 'create']:
+            return [permissions.IsAuthenticated()]
+        return super().get_permissions()
+
+    def perform_create(self, serializer):
+        serializer.save(creator=self.request.user)
+
+    @action(methods=['post'], url_path='join', detail=True)
+    def join(self, request, pk):
+        group = self.get_object()
+        if perms.is_group_member(group, request.user):
+            return Response({"detail": "You are already a member of this group."}, status=status.HTTP_400_BAD_REQUEST)
+        if group.capacity is not None and group.seats_taken >= group.capacity:
+            return Response({"detail": "This trip is full."}, status=status.HTTP_409_CONFLICT)
+        try:
+            join_request = JoinRequest.objects.create(group=group, user=request.user)
+        except IntegrityError:
+            return Response({"detail": "You have already requested to join this group."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializers.JoinRequestSerializer(join_request).data, status=status.HTTP_201_CREATED)
+
+    @action(methods=['get'], url_path='join-requests', detail=True)
+    def join_requests(self, request, pk):
+        join_requests = self.get_object().join_requests.order_by('id')
+        status_filter = request.query_params.get('status')
+        if status_filter:
+            join_requests = join_requests.filter(status=status_filter)
+        return Response(serializers.JoinRequestSerializer(join_requests, many=True).data, status=status.HTTP_200_OK)
+
+    @action(methods=['post'], url_path='join-requests/bulk', detail=True)
+    def bulk_join_requests(self, request, pk):
+        # {"approve": [ids], "reject": [ids]}
+        group = self.get_object()
+        try:
+            approve_ids = {int(i) for i in request.data.get('approve') or []}
+            reject_ids = {int(i) for i in request.data.get('reject') or []}
+        except (TypeError, ValueError):
+            return Response({"detail": "approve and reject must be lists of ids."}, status=status.HTTP_400_BAD_REQUEST)
+        results = {}
+        pending = group.join_requests.filter(id__in=approve_ids | reject_ids, status=JoinRequest.PENDING)
+        for join_request in pending.order_by('id'):
+            join_request.group = group
+            if join_request.id in reject_ids:
+                results[join_request.id] = join_request.reject()
+            else:
+                results[join_request.id] = join_request.approve()
+        group.refresh_from_db(fields=['seats_taken'])
+        return Response({'results': results, 'seats_taken': group.seats_taken, 'capacity': group.capacity},
+                        status=status.HTTP_200_OK)
+
+    @action(methods=['get', 'post'], url_path='messages', detail=True)
+    def messages(self, request, pk):
+        group = self.get_object()
+        if request.method.__eq__('POST'):
+            serializer = serializers.GroupMessageSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            serializer.save(group=group, user=request.user)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        messages = group.messages.all()
+        paginator = paginators.MessagePaginator()
+        page = paginator.paginate_queryset(messages, request)
+        return paginator.get_paginated_response(serializers.GroupMessageSerializer(page, many=True).data)
+
+    @action(methods=['get'], url_path='messages/poll', detail=True)
+    def poll_messages(self, request, pk):
+        # Long-poll: giữ request tới khi có tin nhắn mới hơn ?after= hoặc hết thời gian chờ
+        group = self.get_object()
+        try:
+            after = int(request.query_params.get('after', 0))
+        except ValueError:
+            return Response({"detail": "after must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        interval = getattr(settings, 'GROUP_CHAT_POLL_INTERVAL', 1)
+        # Mỗi request chờ giữ một worker thread: quá GROUP_CHAT_MAX_POLLERS request đang chờ trong process
+        # thì trả kết quả ngay (client poll lại), để long-poll không chiếm hết worker
+        waiting = poll_slots.acquire(blocking=False)
+        try:
+            deadline = time.monotonic() + (getattr(settings, 'GROUP_CHAT_POLL_TIMEOUT', 25) if waiting else 0)
+            while True:
+                messages = list(GroupMessage.objects.filter(group=group, id__gt=after).order_by('id')[:100])
+                if messages or time.monotonic() >= deadline:
+                    break
+                time.sleep(interval)
+        finally:
+            if waiting:
+                poll_slots.release()
+        return Response(serializers.GroupMessageSerializer(messages, many=True).data, status=status.HTTP_200_OK)
+
+    @action(methods=['post'], url_path='messages/read', detail=True)
+    def read_messages(self, request, pk):
+        group = self.get_object()
+        try:
+            message_id = int(request.data.get('message_id'))
+        except (TypeError, ValueError):
+            return Response({"detail": "message_id must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        # Quy về tin nhắn lớn nhất của nhóm không vượt quá message_id: id của nhóm khác hoặc id chưa tồn tại
+        # không được đẩy high-water mark qua các tin nhắn sẽ tới
+        message_id = group.messages.filter(id__lte=message_id).aggregate(last=Max('id'))['last'] or 0
+        receipt, _ = GroupReadReceipt.objects.get_or_create(group=group, user=request.user)
+        # Chỉ tăng high-water mark, không bao giờ lùi lại
+        GroupReadReceipt.objects.filter(pk=receipt.pk, last_read_id__lt=message_id).update(last_read_id=message_id)
+        receipt.refresh_from_db()
+        unread = group.messages.filter(id__gt=receipt.last_read_id).count()
+        return Response({'last_read_id': receipt.last_read_id, 'unread': unread}, status=status.HTTP_200_OK)
+
+class ReportViewSet(ReplicaReadMixin, viewsets.ViewSet,generics.CreateAPIView, generics.ListAPIView):
     queryset = Report.objects.all()
     serializer_class = serializers.ReportSerializer
     permission_classes = [permissions.IsAuthenticated]  # Ensure the user is authenticated
 
+    def get_throttles(self):
+        if self.action.__eq__('create'):
+            return scoped_throttles(self, 'reports')
+        return super().get_throttles()
+
     def perform_create(self, serializer):
         if self.request.user.is_authenticated:
             serializer.save(reporter=self.request.user)
         else:
             raise serializers.ValidationError("You must be logged in to report a user.")
 
-class FollowViewSet(viewsets.ViewSet,generics.CreateAPIView, generics.ListAPIView):
+class FollowViewSet(ReplicaReadMixin, viewsets.ViewSet,generics.CreateAPIView, generics.ListAPIView):
     queryset = Follow.objects.all()
     serializer_class = serializers.FollowSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class ImageViewSet(viewsets.ViewSet,generics.CreateAPIView, generics.ListAPIView):
+    def perform_create(self, serializer):
+        follow = serializer.save()
+        trending.record_follow(follow.following_id)
+
+class ImageViewSet(ReplicaReadMixin, SparseFieldsViewMixin, viewsets.ViewSet,generics.CreateAPIView, generics.ListAPIView):
     queryset = Image.objects.all()
     serializer_class = serializers.ImageSerializer
+
+    def get_queryset(self):
+        query_set = self.queryset.all()
+        if self.action == 'list':
+            query_set = query_set.only(*self.sparse_columns())
+        return query_set
     def perform_create(self, serializer):
         # serializer.save(post=self.request.user.post_set.first())
         postId = self.request.data.get('post')  # Lấy postId từ yêu cầu POST
         post = get_object_or_404(Post, pk=postId)  # Lấy post từ cơ sở dữ liệu
         serializer.save(post=post)  # Gán post cho ảnh
 
-class RatingViewSet(viewsets.ViewSet,generics.CreateAPIView, generics.ListAPIView):
+class RatingViewSet(ReplicaReadMixin, viewsets.ViewSet,generics.CreateAPIView, generics.ListAPIView):
     queryset = Rating.objects.all()
     serializer_class = serializers.RatingSerializer
 
+    def get_throttles(self):
+        if self.action.__eq__('create'):
+            return scoped_throttles(self, 'ratings')
+        return super().get_throttles()
+
     def create(self, request, *args, **kwargs):
         rater = request.user  # Người dùng đang rating
         post_id = request.data.get('post')
@@ -244,6 +761,7 @@ class RatingViewSet(viewsets.ViewSet,generics.CreateAPIView, generics.ListAPIVie
 
             # Tạo rating cho bài đăng
             Rating.objects.create(rater=rater, post=post, stars=stars)
+            trending.record('rating', post.id)
 
             return Response({'message': 'Rating created successfully'}, status=status.HTTP_201_CREATED)
 
@@ -0,0 +1,149 @@
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.throttling import BaseThrottle
+
+from Blog import counters, hll
+from Blog.models import Post, PostViewSketch
+
+PERIODS = ('day', 'week', 'month')
+
+
+def precision():
+    return getattr(settings, 'VIEW_SKETCH_PRECISION', hll.DEFAULT_PRECISION)
+
+
+def viewer_key(request):
+    # User đăng nhập theo id, khách theo IP (đã xét NUM_PROXIES như throttle) và User-Agent
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f'anon:{BaseThrottle().get_ident(request)}:{request.META.get("HTTP_USER_AGENT", "")}'
+
+
+def from_registers(registers):
+    if isinstance(registers, hll.HyperLogLog):
+        return hll.HyperLogLog(registers.precision, registers.registers)
+    sketch = hll.HyperLogLog(precision())
+    for index, rank in registers.items():
+        sketch.set(index, rank)
+    return sketch
+
+
+def add_position(registers, index, rank):
+    # Dạng thưa {index: rank} khi post ít người xem, đổi sang HyperLogLog 2^precision byte
+    # khi dạng thưa bắt đầu tốn bộ nhớ hơn
+    if isinstance(registers, hll.HyperLogLog):
+        registers.set(index, rank)
+        return registers
+    if rank > registers.get(index, 0):
+        registers[index] = rank
+    if len(registers) > (1 << precision()) // 32:
+        return from_registers(registers)
+    return registers
+
+
+class SketchBuffer:
+    # Gom người xem theo (post, ngày) trong bộ nhớ (xem add_position), khi flush mới gộp vào sketch
+    # trong DB: mỗi lần flush vài query thay vì một lần ghi cho mỗi lượt xem
+    def __init__(self):
+        self.pending = defaultdict(dict)
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def add(self, post_id, day, viewer):
+        interval = getattr(settings, 'COUNTER_FLUSH_INTERVAL', 5)
+        index, rank = hll.position(viewer, precision())
+        with self.lock:
+            self.pending[(post_id, day)] = add_position(self.pending[(post_id, day)], index, rank)
+            full = len(self.pending) >= getattr(settings, 'VIEW_SKETCH_MAX_PENDING', 10000)
+            if interval and not full and self.timer is None:
+                self.timer = threading.Timer(interval, self._flush_in_timer)
+                self.timer.daemon = True
+                self.timer.start()
+        if not interval or full:
+            self.flush()
+
+    def sketch(self, post_id, day):
+        # Phần chưa ghi xuống DB, để thống kê của chủ bài đăng không bị trễ một chu kỳ flush
+        with self.lock:
+            return from_registers(self.pending.get((post_id, day), {}))
+
+    def _flush_in_timer(self):
+        with self.lock:
+            self.timer = None
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(dict)
+        if not pending:
+            return 0
+        # Bỏ các post đã bị xoá/archive trong lúc chờ flush
+        existing = set(Post.all_objects.filter(id__in={post_id for post_id, _ in pending}).values_list('id', flat=True))
+        pending = {key: registers for key, registers in pending.items() if key[0] in existing}
+        if not pending:
+            return 0
+        empty = hll.HyperLogLog(precision()).to_bytes()
+        with transaction.atomic():
+            PostViewSketch.objects.bulk_create([PostViewSketch(post_id=post_id, day=day, sketch=empty)
+                                                for post_id, day in pending], ignore_conflicts=True)
+            by_day = defaultdict(list)
+            for post_id, day in pending:
+                by_day[day].append(post_id)
+            condition = reduce(lambda a, b: a | b, (Q(day=day, post_id__in=ids) for day, ids in by_day.items()))
+            # Khoá các dòng để hai process flush cùng lúc không ghi đè register của nhau
+            rows = list(PostViewSketch.objects.select_for_update().filter(condition))
+            for row in rows:
+                sketch = hll.HyperLogLog.from_bytes(row.sketch)
+                sketch.merge(from_registers(pending[(row.post_id, row.day)]))
+                row.sketch = sketch.to_bytes()
+            PostViewSketch.objects.bulk_update(rows, ['sketch'])
+        return len(pending)
+
+
+sketches = counters.register(SketchBuffer())
+
+
+def record(post, request):
+    counters.view_counter.add(post.id)
+    sketches.add(post.id, timezone.localdate(), viewer_key(request))
+
+
+def period_start(day, period):
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def stats(post, days, period):
+    # Lượt xem và người xem khác nhau trong `days` ngày gần nhất, gộp sketch theo ngày/tuần/tháng
+    today = timezone.localdate()
+    since = today - timedelta(days=days - 1)
+    by_period = {}
+    total = hll.HyperLogLog(precision())
+    daily = [(day, hll.HyperLogLog.from_bytes(data))
+             for day, data in post.view_sketches.filter(day__gte=since).values_list('day', 'sketch')]
+    daily.append((today, sketches.sketch(post.id, today)))
+    for day, sketch in daily:
+        total.merge(sketch)
+        start = period_start(day, period)
+        by_period[start] = by_period[start].merge(sketch) if start in by_period else sketch
+    counts = ((start, sketch.count()) for start, sketch in sorted(by_period.items()))
+    return {
+        'view_count': post.view_count + counters.view_counter.pending(post.id),
+        'unique_viewers': total.count(),
+        'period': period,
+        'since': since,
+        'results': [{'start': start, 'unique_viewers': count} for start, count in counts if count],
+    }
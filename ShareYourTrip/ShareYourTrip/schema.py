@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from rest_framework import permissions
+
+_artifacts = {}
+_lock = threading.Lock()
+
+
+def get_api_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title="ShareYourTrip API",
+        default_version='v1',
+        description="APIs for ShareYourTrip",
+        contact=openapi.Contact(email="2151050498truc@ou.edu.vn"),
+        license=openapi.License(name="Nguyễn Thanh Trực@2024"),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_api_schema_view():
+    # drf_yasg chỉ được import và dựng schema view ở request đầu tiên
+    from drf_yasg.views import get_schema_view
+
+    return get_schema_view(
+        get_api_info(),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    # APP_VERSION do bước build đặt; nếu không có thì lấy hash mã nguồn của các module định nghĩa API
+    if settings.APP_VERSION:
+        return settings.APP_VERSION
+    digest = hashlib.sha1()
+    for directory in (settings.BASE_DIR / 'Blog', settings.BASE_DIR / 'ShareYourTrip'):
+        for path in sorted(directory.glob('*.py')):
+            digest.update(path.name.encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:12]
+
+
+def artifact_path(version):
+    return os.path.join(settings.API_SCHEMA_DIR, f'openapi-{version}.json')
+
+
+def generate_schema():
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+    from rest_framework.test import APIRequestFactory
+    from rest_framework.views import APIView
+
+    # Sinh schema không phụ thuộc request thật (giống generate_swagger --mock-request của drf_yasg)
+    request = APIView().initialize_request(APIRequestFactory().get('/swagger.json'))
+    generator = OpenAPISchemaGenerator(get_api_info(), url=settings.API_SCHEMA_BASE_URL or None)
+    schema = generator.get_schema(request=request, public=True)
+    if not settings.API_SCHEMA_BASE_URL:
+        # Không có host cố định thì để client dùng host đang phục vụ schema
+        schema.pop('host', None)
+        schema.pop('schemes', None)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def write_artifact(content, version):
+    os.makedirs(settings.API_SCHEMA_DIR, exist_ok=True)
+    path = artifact_path(version)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_artifact():
+    # Thứ tự: bộ nhớ -> file đã build sẵn -> sinh mới rồi ghi ra file
+    version = code_version()
+    artifact = _artifacts.get(version)
+    if artifact is not None:
+        return artifact
+    with _lock:
+        artifact = _artifacts.get(version)
+        if artifact is not None:
+            return artifact
+        path = artifact_path(version)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                content = f.read()
+        else:
+            content = generate_schema()
+            write_artifact(content, version)
+        artifact = {
+            'json': content,
+            'etag': '"%s-%s"' % (version, hashlib.sha1(content).hexdigest()[:16]),
+        }
+        _artifacts.clear()
+        _artifacts[version] = artifact
+    return artifact
+
+
+def get_yaml(artifact):
+    if 'yaml' not in artifact:
+        from drf_yasg.codecs import yaml_sane_dump
+
+        data = json.loads(artifact['json'], object_pairs_hook=OrderedDict)
+        artifact['yaml'] = yaml_sane_dump(data, binary=True)
+    return artifact['yaml']
+
+
+def schema_view(request, format='.json'):
+    artifact = load_artifact()
+    if request.headers.get('If-None-Match') == artifact['etag']:
+        response = HttpResponseNotModified()
+    elif format == '.yaml':
+        response = HttpResponse(get_yaml(artifact), content_type='application/yaml; charset=utf-8')
+    else:
+        response = HttpResponse(artifact['json'], content_type='application/json; charset=utf-8')
+    response['ETag'] = artifact['etag']
+    patch_cache_control(response, public=True, max_age=settings.API_SCHEMA_MAX_AGE)
+    return response
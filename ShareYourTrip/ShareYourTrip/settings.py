@@ -10,21 +10,37 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
 
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-&af+c18skp3-2tqa_3qhd5k!&byv4+yv&$i^33!+ro8nb02qce'
-
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# Chỉ bật khi đặt DJANGO_DEBUG=1 (máy dev, CI)
+DEBUG = os.environ.get('DJANGO_DEBUG', 'false').lower() in ('1', 'true')
 
-ALLOWED_HOSTS = ['*']
+
+def env(name, dev_default=None):
+    # Giá trị mặc định chỉ dùng cho dev (DEBUG bật) và không phải bí mật thật.
+    # Production thiếu biến môi trường thì dừng ngay lúc khởi động
+    value = os.environ.get(name)
+    if value:
+        return value
+    if DEBUG and dev_default is not None:
+        return dev_default
+    raise ImproperlyConfigured(f'Set the {name} environment variable (required when DJANGO_DEBUG is off).')
+
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = env('DJANGO_SECRET_KEY', 'django-insecure-dev-only-key')
+
+ALLOWED_HOSTS = env('DJANGO_ALLOWED_HOSTS', 'localhost,127.0.0.1,[::1]').split(',')
 
 
 # Application definition
@@ -44,22 +60,167 @@ INSTALLED_APPS = [
     'oauth2_provider',
 ]
 
-import cloudinary
-
-cloudinary.config(
-    cloud_name="dsvodlq5d",
-    api_key="325257939927122",
-    api_secret="hFaOAX00E9c-TzAH66vU80htg1w"
-)
+# Nơi lưu media (avatar, ảnh bài đăng, upload của ckeditor), xem Blog/storage.py: Blog.storage.CloudinaryStorage
+# hoặc Blog.storage.LocalMediaStorage cho staging/CI không có mạng (file trong MEDIA_ROOT, phục vụ ở MEDIA_URL)
+MEDIA_STORAGE = os.environ.get('MEDIA_STORAGE', 'Blog.storage.CloudinaryStorage')
+STORAGES = {
+    'default': {'BACKEND': MEDIA_STORAGE},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', str(BASE_DIR / 'media'))
+MEDIA_URL = '/media/'
+# Giao việc gửi file cho web server (sendfile + range do nginx/Apache xử lý): 'X-Accel-Redirect' hoặc 'X-Sendfile'
+MEDIA_SENDFILE_HEADER = os.environ.get('MEDIA_SENDFILE_HEADER', '')
+# Location internal của nginx trỏ tới MEDIA_ROOT, dùng với X-Accel-Redirect
+MEDIA_SENDFILE_PREFIX = os.environ.get('MEDIA_SENDFILE_PREFIX', '/protected-media/')
+
+# Cloudinary được cấu hình trong Blog.apps.AppConfig.ready() thay vì lúc import settings.
+# Bắt buộc có tài khoản khi lưu media trên Cloudinary, trừ lúc dev
+if MEDIA_STORAGE == 'Blog.storage.CloudinaryStorage':
+    CLOUDINARY = {
+        'cloud_name': env('CLOUDINARY_CLOUD_NAME', 'dev'),
+        'api_key': env('CLOUDINARY_API_KEY', 'dev'),
+        'api_secret': env('CLOUDINARY_API_SECRET', 'dev'),
+    }
+else:
+    CLOUDINARY = {
+        'cloud_name': os.environ.get('CLOUDINARY_CLOUD_NAME', ''),
+        'api_key': os.environ.get('CLOUDINARY_API_KEY', ''),
+        'api_secret': os.environ.get('CLOUDINARY_API_SECRET', ''),
+    }
 
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'Blog.renderers.FastJSONRenderer',
+        'Blog.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'oauth2_provider.contrib.rest_framework.OAuth2Authentication',
-      )
+      ),
+    'DEFAULT_THROTTLE_CLASSES': [
+        'Blog.throttles.AnonTokenBucketThrottle',
+        'Blog.throttles.UserTokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': '120/min',
+        'user': '600/min',
+        'comments': '10/min',
+        'reports': '5/hour',
+        'ratings': '20/min',
+        'register': '5/hour',
+    },
+}
+
+# Schema OpenAPI được sinh một lần cho mỗi phiên bản code và lưu thành file trong API_SCHEMA_DIR
+APP_VERSION = os.environ.get('APP_VERSION', '')
+API_SCHEMA_DIR = os.environ.get('API_SCHEMA_DIR', str(BASE_DIR / 'var' / 'schema'))
+API_SCHEMA_MAX_AGE = 300
+# vd: https://api.shareyourtrip.vn, để trống thì schema không ghi host
+API_SCHEMA_BASE_URL = os.environ.get('API_SCHEMA_BASE_URL', '')
+
+SWAGGER_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+
+REDOC_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
 }
 
+# Blog.throttles.LocMemBucketStore (mỗi process một bộ nhớ riêng)
+# hoặc Blog.throttles.CacheBucketStore (dùng cache chung, vd: Redis)
+THROTTLE_STORE = 'Blog.throttles.LocMemBucketStore'
+
+COMMENT_MODERATION = {
+    'BLOCKLIST_WORDS': [],
+    'BLOCKLIST_PATTERNS': [],
+    'RATE_LIMIT': (5, 60),
+    'WORKERS': 2,
+    # 'thread': kiểm duyệt trong thread pool của web process, 'tasks': đưa vào hàng đợi task (run_tasks)
+    'QUEUE': 'thread',
+}
+
+# Hàng đợi task nền lưu trong DB (Blog/tasks.py), worker chạy bằng `manage.py run_tasks`
+TASK_MODULES = ['Blog.tasks']
+TASK_WORKER_CONCURRENCY = 2
+TASK_POLL_INTERVAL = 1
+TASK_MAX_ATTEMPTS = 3
+TASK_RETRY_BACKOFF = 2
+TASK_RETRY_BACKOFF_MAX = 3600
+TASK_VISIBILITY_TIMEOUT = 300
+TASK_RESULT_TTL = 7 * 24 * 3600
+# Task chạy định kỳ: {tên task: chu kỳ (giây)}
+TASK_SCHEDULE = {
+    'purge_expired_tokens': 3600,
+    'purge_finished_tasks': 24 * 3600,
+    'refresh_trending': 300,
+    'compact_trending': 3600,
+    'archive_posts': 24 * 3600,
+}
+TOKEN_PURGE_BATCH_SIZE = 1000
+
+GROUP_MEMBER_CACHE_TIMEOUT = 300
+GROUP_CHAT_POLL_TIMEOUT = 25
+GROUP_CHAT_POLL_INTERVAL = 1
+# Số request long-poll được chờ cùng lúc trong mỗi process, phần dư trả về ngay. Mỗi request chờ giữ một
+# thread nên cần chạy với worker có thread (vd: gunicorn --threads hoặc gthread) nhiều hơn con số này
+GROUP_CHAT_MAX_POLLERS = 16
+
+# Số giây giữa các lần ghi bộ đếm (like, ...) xuống DB, 0 để ghi ngay
+COUNTER_FLUSH_INTERVAL = 5
+
+# Bảng có từ chừng này dòng trở lên thì changelist admin dùng số dòng ước lượng
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
+# Số ngày sau end_time trước khi bài đăng bị chuyển sang bảng archive
+ARCHIVE_AFTER_DAYS = 30
+# Số bài đăng mỗi transaction của task archive_posts
+ARCHIVE_BATCH_SIZE = 500
+
+# Tìm chuyến đi theo vị trí trên /posts/ (km)
+GEO_DEFAULT_RADIUS_KM = 30
+GEO_DEFAULT_CORRIDOR_KM = 10
+GEO_MAX_RADIUS_KM = 500
+# Số điểm tối đa của ?route=
+GEO_MAX_ROUTE_POINTS = 100
+
+# Người xem khác nhau của bài đăng: HyperLogLog 2^precision register, sai số chuẩn ~1.04 / sqrt(2^precision)
+VIEW_SKETCH_PRECISION = 11
+# Số (post, ngày) tối đa gom trong bộ nhớ trước khi ghi ngay
+VIEW_SKETCH_MAX_PENDING = 10000
+VIEW_STATS_MAX_DAYS = 366
+
+# Số id tối đa cho mỗi loại (ids, users) trên /posts/batch/
+BATCH_MAX_IDS = 50
+
+# Trending post/hashtag, xem DEFAULTS trong Blog/trending.py. Top-K nằm trong cache: chạy nhiều process/máy
+# thì đặt REDIS_URL để mọi process dùng chung một bản
+TRENDING = {
+    'WEIGHTS': {'comment': 3, 'rating': 2, 'like': 1, 'follow': 1},
+    'HALF_LIFE_HOURS': 12,
+    'WINDOW_HOURS': 72,
+    'TOP_K': 100,
+    'FLUSH_INTERVAL': 10,
+    'CACHE_SECONDS': 300,
+}
+
+# Cache dùng chung (trending, Blog.throttles.CacheBucketStore). Không có REDIS_URL thì dùng LocMemCache
+# mặc định của Django: mỗi process một bản riêng
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+
+# Chỉ nén response có kích thước từ ngưỡng này trở lên (byte)
+RESPONSE_COMPRESSION_MIN_SIZE = 1024
+BROTLI_QUALITY = 5
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'Blog.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -91,23 +252,49 @@ WSGI_APPLICATION = 'ShareYourTrip.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-import pymysql
-
-pymysql.install_as_MySQLdb()
-
 CKEDITOR_UPLOAD_PATH = "ckeditors/images/"
 
+DB_ENGINE = os.environ.get('DB_ENGINE', 'django.db.backends.mysql')
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'shareyourtrip',
+        'ENGINE': DB_ENGINE,
+        # SQLite: NAME là đường dẫn file, mặc định nằm cạnh manage.py
+        'NAME': os.environ.get('DB_NAME', str(BASE_DIR / 'db.sqlite3')
+                               if DB_ENGINE == 'django.db.backends.sqlite3' else 'shareyourtrip'),
         # 'NAME': 'new_schema4',
-        'USER': 'root',
-        'PASSWORD': 'ThanhTruc2708',
-        'HOST': ''  # mặc định localhost
+        'USER': os.environ.get('DB_USER', 'root'),
+        'PASSWORD': '' if DB_ENGINE == 'django.db.backends.sqlite3' else env('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', ''),  # mặc định localhost
+        'PORT': os.environ.get('DB_PORT', ''),
+        # Giữ connection giữa các request, kiểm tra connection còn sống trước khi dùng lại
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# SQLite: DB test nằm trong file thay vì bộ nhớ, để các test nhiều thread ghi vào cùng một DB
+if DB_ENGINE == 'django.db.backends.sqlite3':
+    DATABASES['default']['TEST'] = {'NAME': os.environ.get('DB_TEST_NAME', str(BASE_DIR / 'test_db.sqlite3'))}
+
+# Replica chỉ đọc, bật khi có DB_REPLICA_HOST
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# pymysql chỉ cần khi dùng MySQL
+if DB_ENGINE == 'django.db.backends.mysql':
+    import pymysql
+
+    pymysql.install_as_MySQLdb()
+
+DATABASE_ROUTERS = ['Blog.routers.ReadReplicaRouter']
+
+# Số giây user đọc từ primary sau khi ghi dữ liệu
+REPLICA_STICKY_SECONDS = 5
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
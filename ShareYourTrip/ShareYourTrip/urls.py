@@ -14,23 +14,23 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('Blog/', include('Blog.urls'))
 """
+from functools import lru_cache
+
 from django.contrib import admin
 from django.urls import path, re_path, include
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
+from ShareYourTrip.schema import get_api_schema_view, schema_view
+
+
+def lazy_schema_view(renderer):
+    # Giao diện swagger/redoc lấy schema từ /swagger.json (đã được cache), xem SWAGGER_SETTINGS
+    @lru_cache(maxsize=None)
+    def get_view():
+        return get_api_schema_view().with_ui(renderer, cache_timeout=0)
+
+    def view(request, *args, **kwargs):
+        return get_view()(request, *args, **kwargs)
+    return view
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="ShareYourTrip API",
-        default_version='v1',
-        description="APIs for ShareYourTrip",
-        contact=openapi.Contact(email="2151050498truc@ou.edu.vn"),
-        license=openapi.License(name="Nguyễn Thanh Trực@2024"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
 
 urlpatterns = [
     path('', include('Blog.urls')),
@@ -38,12 +38,12 @@ urlpatterns = [
     path('o/', include('oauth2_provider.urls', namespace='oauth2_provider')),
     re_path(r'^ckeditor/', include('ckeditor_uploader.urls')),
     re_path(r'^swagger(?P<format>\.json|\.yaml)$',
-            schema_view.without_ui(cache_timeout=0),
+            schema_view,
             name='schema-json'),
     re_path(r'^swagger/$',
-            schema_view.with_ui('swagger', cache_timeout=0),
+            lazy_schema_view('swagger'),
             name='schema-swagger-ui'),
     re_path(r'^redoc/$',
-            schema_view.with_ui('redoc', cache_timeout=0),
+            lazy_schema_view('redoc'),
             name='schema-redoc'),
 ]